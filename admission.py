@@ -0,0 +1,145 @@
+"""
+Admission control
+Token buckets per route and per client IP for write-heavy routes, and a cap on
+in-flight AWS calls, so surges are shed fast instead of slowing every request
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+
+class Overloaded(Exception):
+    """Raised when no AWS call slot frees up in time"""
+
+    def __init__(self, message, retry_after=1):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class TokenBucket:
+    """`rate` tokens per second, holding at most `burst`"""
+
+    def __init__(self, rate, burst):
+        self.rate = float(rate)
+        self.burst = float(burst)
+        self._tokens = self.burst
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def try_acquire(self, tokens=1):
+        """Take tokens if available; returns (ok, seconds until they would be)"""
+        with self._lock:
+            self._refill(time.monotonic())
+            if self._tokens >= tokens:
+                self._tokens -= tokens
+                return True, 0.0
+            return False, (tokens - self._tokens) / self.rate if self.rate else float('inf')
+
+    def acquire(self, tokens=1):
+        """Block until tokens are available (for background senders)"""
+        tokens = min(tokens, self.burst)
+        while True:
+            ok, wait = self.try_acquire(tokens)
+            if ok:
+                return
+            time.sleep(min(wait, 1.0))
+
+
+def parse_rate(spec):
+    """'5:20' -> (5.0, 20.0) tokens per second and burst; '' or a zero rate -> None"""
+    rate, _, burst = (spec or '').partition(':')
+    if not rate.strip() or float(rate) <= 0:
+        return None
+    return float(rate), float(burst or rate)
+
+
+def parse_limits(text):
+    """'signup=5:20,order=10:40' -> {'signup': (5.0, 20.0), 'order': (10.0, 40.0)}"""
+    limits = {}
+    for part in (text or '').split(','):
+        name, _, spec = part.partition('=')
+        limit = parse_rate(spec)
+        if name.strip() and limit:
+            limits[name.strip()] = limit
+    return limits
+
+
+class RateLimiter:
+    """Per-route token buckets plus a per-(route, client IP) bucket kept in a bounded LRU"""
+
+    def __init__(self, route_limits, client_limit=None, max_clients=10000):
+        self.routes = {name: TokenBucket(rate, burst) for name, (rate, burst) in route_limits.items()}
+        self.client_limit = client_limit
+        self.max_clients = max_clients
+        self._clients = OrderedDict()
+        self._lock = threading.Lock()
+
+    def limits(self, route):
+        """True if the route is rate limited"""
+        return route in self.routes
+
+    def _client_bucket(self, route, client):
+        key = (route, client)
+        with self._lock:
+            bucket = self._clients.get(key)
+            if bucket is None:
+                bucket = self._clients[key] = TokenBucket(*self.client_limit)
+                while len(self._clients) > self.max_clients:
+                    self._clients.popitem(last=False)
+            else:
+                self._clients.move_to_end(key)
+            return bucket
+
+    def check(self, route, client):
+        """(None, 0) if admitted, else (reason, retry_after seconds)"""
+        bucket = self.routes.get(route)
+        if bucket is None:
+            return None, 0.0
+        if self.client_limit and client:
+            ok, wait = self._client_bucket(route, client).try_acquire()
+            if not ok:
+                return 'client_rate', wait
+        ok, wait = bucket.try_acquire()
+        if not ok:
+            return 'route_rate', wait
+        return None, 0.0
+
+
+class ConcurrencyLimiter:
+    """Caps concurrent AWS calls in this process; callers wait up to `wait` seconds for a slot"""
+
+    def __init__(self, limit, wait=0.25, on_timeout=None):
+        self.limit = limit
+        self.wait = wait
+        self.on_timeout = on_timeout
+        self._slots = threading.BoundedSemaphore(limit)
+        self._in_flight = 0
+        self._lock = threading.Lock()
+
+    @property
+    def in_flight(self):
+        return self._in_flight
+
+    def saturated(self):
+        """True when every slot is taken"""
+        return self._in_flight >= self.limit
+
+    def __enter__(self):
+        if not self._slots.acquire(timeout=self.wait):
+            if self.on_timeout is not None:
+                self.on_timeout()
+            raise Overloaded(f'All {self.limit} AWS call slots busy', retry_after=1)
+        with self._lock:
+            self._in_flight += 1
+        return self
+
+    def __exit__(self, *exc):
+        with self._lock:
+            self._in_flight -= 1
+        self._slots.release()
+        return False
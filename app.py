@@ -1,12 +1,47 @@
-from flask import Flask, request, render_template, redirect, url_for, session, flash, jsonify
-import boto3
+# Time every startup phase from the very first import (see /startup)
+import startup
+boot = startup.StartupTimer()
+
+from flask import Flask, request, render_template, redirect, url_for, session, flash, jsonify, Response, stream_with_context, g
+from flask import before_render_template, template_rendered
 import uuid
 import os
 import hashlib
+import hmac
+import base64
+import json
+import math
+import random
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
 from datetime import datetime
-from functools import wraps
+from decimal import Decimal
+from functools import wraps, lru_cache
+from boto3.dynamodb.conditions import Key
 from botocore.exceptions import ClientError
 from dotenv import load_dotenv
+from werkzeug.middleware.proxy_fix import ProxyFix
+from jinja2 import FileSystemBytecodeCache
+import aws_clients
+from notifications import NotificationDispatcher, AdminDigest, BULK_BATCH_SIZE
+import email_templates
+from health import HealthMonitor
+from user_cache import UserCache
+from catalog import CATEGORIES, Catalog
+from cart_store import CartStore, CartConflict, MAX_QUANTITY
+import idempotency
+import order_export
+import order_archive
+import sales_aggregates
+from page_cache import PageCache
+import image_pipeline
+import static_assets
+import metrics
+import profiling
+import admission
+from outbox import Outbox, DONE, DUPLICATE
+boot.mark('imports')
 
 # Load environment variables
 load_dotenv()
@@ -14,20 +49,249 @@ load_dotenv()
 app = Flask(__name__)
 app.secret_key = os.environ.get('SECRET_KEY', 'pickle-secret-key-2025')
 
+# Behind nginx, trust its X-Forwarded-For/Proto so request.remote_addr is the real client
+PROXY_COUNT = int(os.environ.get('PROXY_COUNT', 0))
+if PROXY_COUNT:
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=PROXY_COUNT, x_proto=PROXY_COUNT)
+
 # AWS Configuration
 AWS_REGION = os.environ.get('AWS_REGION', 'us-east-1')
 SNS_TOPIC_ARN = os.environ.get('SNS_TOPIC_ARN', '')
 ADMIN_EMAIL = os.environ.get('ADMIN_EMAIL', 'admin@pickles.com')
+ADMIN_TOKEN = os.environ.get('ADMIN_TOKEN', '')
 
-# AWS clients
-dynamodb = boto3.resource('dynamodb', region_name=AWS_REGION)
-sns = boto3.client('sns', region_name=AWS_REGION)
-ses = boto3.client('ses', region_name=AWS_REGION)
+# AWS clients (shared, tuned via AWS_* settings and rebuilt per worker process)
+sns = aws_clients.client('sns')
+ses = aws_clients.client('ses')
 
 # DynamoDB tables
-order_table = dynamodb.Table('PickleOrders')
-user_table = dynamodb.Table('PickleUsers')
-contact_table = dynamodb.Table('PickleContacts')
+order_table = aws_clients.table('PickleOrders')
+user_table = aws_clients.table('PickleUsers')
+contact_table = aws_clients.table('PickleContacts')
+cart_table = aws_clients.table('PickleCarts')
+aggregates_table = aws_clients.table(sales_aggregates.AGGREGATES_TABLE)
+# Orders by the account that placed them (user_email), not the contact email typed into the form
+ORDERS_BY_USER_INDEX = 'user_email-timestamp-index'
+# Contact inquiries expire from PickleContacts (DynamoDB TTL on expires_at); 0 keeps them
+CONTACT_TTL_DAYS = int(os.environ.get('CONTACT_TTL_DAYS', 365))
+# Old orders moved out of PickleOrders by order_archive.py
+ARCHIVE_DIR = os.environ.get('ARCHIVE_DIR', 'archive/orders')
+boot.mark('config')
+
+# Product catalog, indexed in memory and reloaded when catalog.json changes
+catalog = Catalog(
+    os.environ.get('CATALOG_PATH', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'catalog.json')),
+    reload_interval=float(os.environ.get('CATALOG_RELOAD_INTERVAL', 5))
+)
+
+# Fingerprinted static assets built by static_assets.py (skipped in debug so edits show up)
+asset_manifest = {} if os.environ.get('DEBUG', 'False').lower() == 'true' else static_assets.load_manifest()
+
+@app.url_defaults
+def fingerprint_static_url(endpoint, values):
+    """Point url_for('static', ...) at the content-hashed copy of the file"""
+    if endpoint == 'static' and 'filename' in values:
+        values['filename'] = asset_manifest.get(values['filename'], values['filename'])
+boot.mark('catalog_and_assets')
+
+@app.after_request
+def immutable_static_assets(response):
+    """Fingerprinted files never change, so let browsers and CDNs keep them forever"""
+    if request.path.startswith('/static/dist/') and response.status_code == 200:
+        response.headers['Cache-Control'] = 'public, max-age=31536000, immutable'
+    return response
+
+# Request, template and AWS call timing, exported at /metrics
+metrics.instrument_aws(aws_clients.on_event)
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+    metrics.REQUESTS_IN_FLIGHT.inc()
+
+@app.after_request
+def record_request_latency(response):
+    started = g.get('request_started')
+    if started is not None:
+        metrics.REQUEST_LATENCY.labels(
+            request.method, request.endpoint or 'unmatched', str(response.status_code)
+        ).observe(time.perf_counter() - started)
+    return response
+
+@app.teardown_request
+def finish_request_timer(exc):
+    if g.pop('request_started', None) is not None:
+        metrics.REQUESTS_IN_FLIGHT.dec()
+
+def start_template_timer(sender, template, context, **extra):
+    g.setdefault('template_starts', []).append(time.perf_counter())
+
+def record_template_latency(sender, template, context, **extra):
+    starts = g.get('template_starts')
+    if starts:
+        metrics.TEMPLATE_LATENCY.labels(template.name or 'inline').observe(time.perf_counter() - starts.pop())
+
+before_render_template.connect(start_template_timer, app)
+template_rendered.connect(record_template_latency, app)
+
+# Admission control: token buckets per write route and per client IP, and a cap on
+# in-flight AWS calls; limits are per worker process
+ADMISSION_ENABLED = os.environ.get('ADMISSION_ENABLED', 'True').lower() == 'true'
+rate_limiter = admission.RateLimiter(
+    admission.parse_limits(os.environ.get('ADMISSION_ROUTE_LIMITS', 'signup=5:20,contact=5:20,order=10:40,checkout=10:40')),
+    client_limit=admission.parse_rate(os.environ.get('ADMISSION_CLIENT_LIMIT', '0.5:5'))
+)
+aws_limiter = admission.ConcurrencyLimiter(
+    int(os.environ.get('AWS_MAX_IN_FLIGHT', 32)),
+    wait=float(os.environ.get('AWS_SLOT_WAIT', 0.25)),
+    on_timeout=metrics.AWS_SLOT_TIMEOUTS.inc
+)
+if ADMISSION_ENABLED:
+    aws_clients.set_call_limiter(aws_limiter)
+
+def reject_request(reason, retry_after):
+    """Fast 429 (rate limited) or 503 (AWS saturated) with Retry-After"""
+    metrics.ADMISSION_REJECTIONS.labels(request.endpoint or 'unmatched', reason).inc()
+    status = 429 if reason in ('client_rate', 'route_rate') else 503
+    message = 'Too many requests, please try again shortly' if status == 429 else 'Server busy, please try again shortly'
+    if request.path.startswith('/api/') or request.accept_mimetypes.best == 'application/json':
+        response = jsonify({'error': message, 'reason': reason})
+    else:
+        response = Response(message, mimetype='text/plain')
+    response.status_code = status
+    response.headers['Retry-After'] = str(max(1, math.ceil(retry_after)))
+    return response
+
+@app.before_request
+def admit_request():
+    """Shed write requests before they reach DynamoDB/SES/SNS"""
+    if not ADMISSION_ENABLED or request.method in ('GET', 'HEAD', 'OPTIONS'):
+        return None
+    if not rate_limiter.limits(request.endpoint):
+        return None
+    reason, retry_after = rate_limiter.check(request.endpoint, request.remote_addr)
+    if reason is None and aws_limiter.saturated():
+        reason, retry_after = 'aws_busy', 1
+    return reject_request(reason, retry_after) if reason else None
+
+@app.errorhandler(admission.Overloaded)
+def aws_overloaded(error):
+    return reject_request('aws_slot_timeout', error.retry_after)
+
+# Stack-sampling profiler: per request on demand (admin X-Profile: 1 header or a
+# sampled share of requests), plus an optional always-on aggregate of hot frames
+PROFILE_DIR = os.environ.get('PROFILE_DIR', '/tmp/pickles-profiles')
+PROFILE_SAMPLE_RATE = float(os.environ.get('PROFILE_SAMPLE_RATE', 0))
+PROFILE_KEEP = int(os.environ.get('PROFILE_KEEP', 50))
+request_profiler = profiling.StackSampler(interval=float(os.environ.get('PROFILE_INTERVAL_MS', 1)) / 1000)
+hot_frame_sampler = profiling.StackSampler(
+    interval=float(os.environ.get('PROFILE_ALWAYS_ON_INTERVAL_MS', 10)) / 1000,
+    keep_totals=True
+) if os.environ.get('PROFILE_ALWAYS_ON', 'False').lower() == 'true' else None
+
+@app.before_request
+def start_profiling():
+    thread_id = threading.get_ident()
+    if hot_frame_sampler is not None:
+        hot_frame_sampler.add(thread_id)
+    requested = request.headers.get('X-Profile') == '1' and is_admin()
+    if requested or (PROFILE_SAMPLE_RATE and random.random() < PROFILE_SAMPLE_RATE):
+        g.profile_requested = requested
+        request_profiler.add(thread_id)
+
+@app.after_request
+def write_request_profile(response):
+    if 'profile_requested' in g:
+        counts = request_profiler.remove(threading.get_ident())
+        if counts:
+            try:
+                profile_id = profiling.write_profile(PROFILE_DIR, request.endpoint, counts,
+                                                     request_profiler.interval, keep=PROFILE_KEEP)
+                if g.profile_requested:
+                    response.headers['X-Profile-Id'] = f'{request.endpoint}/{profile_id}'
+            except OSError as e:
+                app.logger.warning('Could not write profile: %s', e)
+    return response
+
+@app.teardown_request
+def stop_profiling(exc):
+    thread_id = threading.get_ident()
+    if g.pop('profile_requested', None) is not None:
+        request_profiler.remove(thread_id)
+    if hot_frame_sampler is not None:
+        hot_frame_sampler.remove(thread_id)
+
+boot.mark('middleware')
+
+# Responsive <picture>/srcset markup for images built by image_pipeline.py
+app.jinja_env.globals['responsive_image'] = image_pipeline.make_responsive_image(
+    image_pipeline.load_manifest(),
+    lambda path: url_for('static', filename=path)
+)
+
+# Rendered pages for routes whose output only changes on deploy (or catalog reload)
+page_cache = PageCache(
+    max_age=int(os.environ.get('PAGE_CACHE_MAX_AGE', 300)),
+    enabled=os.environ.get('PAGE_CACHE', 'True').lower() == 'true'
+        and os.environ.get('DEBUG', 'False').lower() != 'true'
+)
+
+# Server-side carts, one {sku: quantity} item per user
+cart_store = CartStore(cart_table, ttl_days=int(os.environ.get('CART_TTL_DAYS', 30)))
+
+# Recently completed order IDs, so replayed form submissions skip DynamoDB and SES
+dedup_cache = idempotency.DedupCache(ttl=float(os.environ.get('IDEMPOTENCY_TTL', 600)))
+
+# Read-through cache for PickleUsers lookups
+user_cache = UserCache(
+    lambda email: user_table.get_item(Key={'email': email}).get('Item'),
+    max_size=int(os.environ.get('USER_CACHE_SIZE', 1024)),
+    ttl=float(os.environ.get('USER_CACHE_TTL', 60)),
+    negative_ttl=float(os.environ.get('USER_CACHE_NEGATIVE_TTL', 10))
+)
+
+# Background notification dispatcher
+notifier = NotificationDispatcher(
+    sns, ses,
+    source=ADMIN_EMAIL,
+    topic_arn=SNS_TOPIC_ARN,
+    workers=int(os.environ.get('NOTIFY_WORKERS', 2)),
+    max_queue_size=int(os.environ.get('NOTIFY_QUEUE_SIZE', 1000)),
+    max_retries=int(os.environ.get('NOTIFY_MAX_RETRIES', 3)),
+    ses_send_rate=float(os.environ.get('NOTIFY_SES_SEND_RATE', 0))
+)
+notifier.register_shutdown()
+
+# Admin notifications are coalesced into periodic digests (window 0 disables)
+admin_digest = AdminDigest(
+    notifier, ADMIN_EMAIL,
+    window=float(os.environ.get('ADMIN_DIGEST_WINDOW', 60)),
+    max_items=int(os.environ.get('ADMIN_DIGEST_SIZE', 20))
+)
+admin_digest.register_shutdown()
+
+# Dependency health, refreshed in the background for /health probes
+health_monitor = HealthMonitor(
+    interval=float(os.environ.get('HEALTH_CHECK_INTERVAL', 15)),
+    stale_after=float(os.environ.get('HEALTH_STALE_AFTER', 60))
+)
+health_monitor.add_check('dynamodb', lambda: aws_clients.get_client('dynamodb').describe_table(TableName='PickleUsers'))
+if os.environ.get('HEALTH_CHECK_SNS', 'False').lower() == 'true' and SNS_TOPIC_ARN:
+    health_monitor.add_check('sns', lambda: sns.get_topic_attributes(TopicArn=SNS_TOPIC_ARN), required=False)
+if os.environ.get('HEALTH_CHECK_SES', 'False').lower() == 'true':
+    health_monitor.add_check('ses', lambda: ses.get_send_quota(), required=False)
+
+# Orders, contact inquiries and their emails are committed to a local SQLite outbox
+# during the request and pushed to DynamoDB/SES by a background drainer per worker
+outbox = Outbox(
+    os.environ.get('OUTBOX_PATH') or os.path.join(os.path.dirname(os.path.abspath(__file__)), 'outbox.db'),
+    batch_size=int(os.environ.get('OUTBOX_BATCH_SIZE', 50)),
+    drainers=int(os.environ.get('OUTBOX_DRAINERS', 4)),
+    concurrency=int(os.environ.get('OUTBOX_CONCURRENCY', 8)),
+    poll_interval=float(os.environ.get('OUTBOX_POLL_INTERVAL', 0.5)),
+    max_backoff=float(os.environ.get('OUTBOX_MAX_BACKOFF', 300)),
+    max_attempts=int(os.environ.get('OUTBOX_MAX_ATTEMPTS', 8))
+)
 
 def hash_password(password):
     """Hash password for secure storage"""
@@ -36,31 +300,103 @@ def hash_password(password):
 def send_email_notification(to_email, subject, message):
     """Send email via SNS and SES"""
     try:
-        # Send via SNS
-        if SNS_TOPIC_ARN:
-            sns.publish(TopicArn=SNS_TOPIC_ARN, Message=message, Subject=subject)
-        
-        # Send via SES for direct email
-        ses.send_email(
-            Source=ADMIN_EMAIL,
-            Destination={'ToAddresses': [to_email]},
-            Message={
-                'Subject': {'Data': subject},
-                'Body': {'Text': {'Data': message}}
-            }
-        )
+        notifier.deliver(to_email, subject, message)
         return True
     except ClientError:
         return False
 
+def queue_templated_email(to_email, template, **data):
+    """Queue a customer email rendered by a pre-registered SES template"""
+    return notifier.enqueue_templated(to_email, template, data)
+
+def notify_admin(subject, message):
+    """Add an admin notification to the digest"""
+    return admin_digest.add(subject, message)
+
+# A failed metadata lookup is retried after this many seconds rather than on every call
+INSTANCE_INFO_RETRY = 60
+_instance_info = {'id': None, 'retry_at': 0.0}
+
 def get_instance_info():
-    """Get EC2 instance metadata"""
+    """Get the EC2 instance ID, memoized once it resolves ('local' until it does)"""
+    if _instance_info['id'] is None and time.monotonic() >= _instance_info['retry_at']:
+        try:
+            import urllib.request
+            response = urllib.request.urlopen('http://169.254.169.254/latest/meta-data/instance-id', timeout=2)
+            _instance_info['id'] = response.read().decode('utf-8')
+        except Exception:
+            _instance_info['retry_at'] = time.monotonic() + INSTANCE_INFO_RETRY
+    return _instance_info['id'] or 'local'
+
+_caller_identity = None
+
+def get_caller_identity():
+    """Get the STS caller identity, memoized once it resolves"""
+    global _caller_identity
+    if _caller_identity is None:
+        sts = aws_clients.get_client('sts')
+        _caller_identity = sts.get_caller_identity()
+    return _caller_identity
+
+# Connectivity probes for /aws-info, run concurrently and cached briefly
+AWS_INFO_CACHE_TTL = float(os.environ.get('AWS_INFO_CACHE_TTL', 30))
+AWS_PROBE_TIMEOUT = float(os.environ.get('AWS_PROBE_TIMEOUT', 2))
+boot.mark('services')
+
+_probe_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix='aws-probe')
+_aws_info_cache = {'expires': 0.0, 'info': None}
+_aws_info_lock = threading.Lock()
+
+def _probe_identity():
+    try:
+        identity = get_caller_identity()
+        return {'account_id': identity['Account'], 'role_arn': identity.get('Arn', 'No role attached')}
+    except:
+        return {'account_id': 'Unknown', 'role_arn': 'No role attached'}
+
+def _probe_dynamodb():
     try:
-        import urllib.request
-        response = urllib.request.urlopen('http://169.254.169.254/latest/meta-data/instance-id', timeout=2)
-        return response.read().decode('utf-8')
+        aws_clients.get_client('dynamodb').describe_table(TableName='PickleUsers')
+        return {'dynamodb_status': 'Connected'}
     except:
-        return 'local'
+        return {'dynamodb_status': 'Error'}
+
+def _probe_sns():
+    try:
+        if SNS_TOPIC_ARN:
+            sns.get_topic_attributes(TopicArn=SNS_TOPIC_ARN)
+            return {'sns_status': 'Connected'}
+        return {'sns_status': 'Not Configured'}
+    except:
+        return {'sns_status': 'Error'}
+
+_AWS_PROBES = {
+    _probe_identity: {'account_id': 'Unknown', 'role_arn': 'No role attached'},
+    _probe_dynamodb: {'dynamodb_status': 'Timeout'},
+    _probe_sns: {'sns_status': 'Timeout'},
+}
+
+def collect_aws_info():
+    """Run the AWS probes concurrently, reusing results for AWS_INFO_CACHE_TTL seconds"""
+    with _aws_info_lock:
+        if _aws_info_cache['info'] is not None and time.monotonic() < _aws_info_cache['expires']:
+            return _aws_info_cache['info']
+        futures = {_probe_executor.submit(probe): fallback for probe, fallback in _AWS_PROBES.items()}
+        futures[_probe_executor.submit(get_instance_info)] = None
+        wait(futures, timeout=AWS_PROBE_TIMEOUT)
+        info = {}
+        for future, fallback in futures.items():
+            if fallback is None:
+                info['instance_id'] = future.result() if future.done() else 'local'
+            else:
+                info.update(future.result() if future.done() else fallback)
+        info.update({
+            'region': AWS_REGION,
+            'tables': ['PickleUsers', 'PickleOrders', 'PickleContacts', 'PickleCarts', 'PickleAggregates']
+        })
+        _aws_info_cache['info'] = info
+        _aws_info_cache['expires'] = time.monotonic() + AWS_INFO_CACHE_TTL
+        return info
 
 # Authentication decorator
 def login_required(f):
@@ -72,11 +408,141 @@ def login_required(f):
         return f(*args, **kwargs)
     return decorated_function
 
+def is_admin():
+    """A matching X-Admin-Token header, or a login whose PickleUsers item has is_admin = true"""
+    token = request.headers.get('X-Admin-Token', '')
+    if ADMIN_TOKEN and token and hmac.compare_digest(token, ADMIN_TOKEN):
+        return True
+    # Set at login from the user record, never from the (unverified) email address
+    return session.get('is_admin') is True
+
+def admin_required(f):
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        if not is_admin():
+            return jsonify({'error': 'Admin access required'}), 403
+        return f(*args, **kwargs)
+    return decorated_function
+
+def api_login_required(f):
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        if 'user_email' not in session:
+            return jsonify({'error': 'Login required'}), 401
+        return f(*args, **kwargs)
+    return decorated_function
+
+def cart_summary(items):
+    """Price a {sku: quantity} cart against the catalog"""
+    lines = []
+    for sku, quantity in items.items():
+        product = catalog.get(sku)
+        if product is None:
+            continue
+        lines.append({
+            'sku': sku,
+            'name': product['name'],
+            'price': product['price'],
+            'quantity': quantity,
+            'subtotal': product['price'] * quantity
+        })
+    return {
+        'items': lines,
+        'count': sum(line['quantity'] for line in lines),
+        'total': sum(line['subtotal'] for line in lines)
+    }
+
+def put_new_order(item):
+    """Write an order unless one with the same ID already exists; False on a replay"""
+    try:
+        order_table.put_item(Item=item, ConditionExpression='attribute_not_exists(order_id)',
+                             ReturnValuesOnConditionCheckFailure='ALL_OLD')
+        return True
+    except ClientError as e:
+        if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+            raise
+        # The stored item may be this very write, accepted by an attempt that then timed out;
+        # a replayed submission carries a different write_token
+        stored = e.response.get('Item', {}).get('write_token', {}).get('S')
+        return stored is not None and stored == item.get('write_token')
+
+def drain_order(item):
+    """Outbox handler: conditional put (a replayed order drops its follow-ups)"""
+    return DONE if put_new_order(item) else DUPLICATE
+
+def drain_sales(entry):
+    """Outbox handler: apply an order's sales aggregate increments, at most once per order"""
+    sales_aggregates.apply_order_once(aws_clients.get_client('dynamodb'), entry['order_id'], entry['contributions'])
+
+def drain_contacts(items):
+    """Outbox handler: batch-write contact inquiries (puts by contact_id are safe to repeat)"""
+    with contact_table.batch_writer(overwrite_by_pkeys=['contact_id']) as batch:
+        for item in items:
+            batch.put_item(Item=item)
+    return [DONE] * len(items)
+
+def drain_emails(emails):
+    """Outbox handler: send templated emails in SES bulk batches, one per template"""
+    by_template = {}
+    for index, email in enumerate(emails):
+        by_template.setdefault(email['template'], []).append(index)
+    outcomes = [DONE] * len(emails)
+    for template, indexes in by_template.items():
+        for start in range(0, len(indexes), BULK_BATCH_SIZE):
+            chunk = indexes[start:start + BULK_BATCH_SIZE]
+            try:
+                notifier.send_bulk_templated(template, [(emails[i]['to'], emails[i]['data']) for i in chunk])
+            except Exception as e:
+                for i in chunk:
+                    outcomes[i] = e
+    return outcomes
+
+def drain_admin_notices(notices):
+    """Outbox handler: hand admin notices to the digest"""
+    for notice in notices:
+        notify_admin(notice['subject'], notice['message'])
+    return [DONE] * len(notices)
+
+def drain_cart_checkout(checkout):
+    """Outbox handler: take a checkout's lines out of the cart when the request couldn't"""
+    cart_store.check_out(checkout['cart_id'], checkout['quantities'], checkout['order_id'])
+
+# Writes are retried until they land; notifications give up after OUTBOX_MAX_ATTEMPTS
+outbox.register_each('order', drain_order)
+outbox.register_each('sales', drain_sales)
+outbox.register('contact', drain_contacts)
+outbox.register('email', drain_emails, durable=False)
+outbox.register('admin', drain_admin_notices, durable=False)
+outbox.register_each('cart_checkout', drain_cart_checkout, durable=False)
+
+@app.before_request
+def start_outbox():
+    outbox.start()
+
+def order_entries(order_item):
+    """Outbox follow-ups that add an order to the sales aggregates"""
+    # One entry per order; its counters land with the order's marker, so a retry is not counted twice
+    return [('sales', {'order_id': order_item['order_id'], 'contributions': sales_aggregates.order_contributions(order_item)})]
+
+def email_entry(to_email, template, **data):
+    """Outbox follow-up that sends a templated email"""
+    return ('email', {'to': to_email, 'template': template, 'data': data})
+
+def admin_entry(subject, message):
+    """Outbox follow-up that adds an admin notification to the digest"""
+    return ('admin', {'subject': subject, 'message': message})
+
+def show_order(order_id):
+    """Record order_id as completed and send the user to the success page"""
+    dedup_cache.add(order_id)
+    session['last_order_id'] = order_id
+    return redirect(url_for('order_success'))
+
 @app.route('/')
 def index():
     if 'user_email' in session:
         return redirect(url_for('home'))
-    return render_template('index.html')
+    return page_cache.render('index.html')
 
 @app.route('/home')
 @login_required
@@ -85,7 +551,7 @@ def home():
 
 @app.route('/about')
 def about():
-    return render_template('about.html')
+    return page_cache.render('about.html')
 
 @app.route('/contact', methods=['GET', 'POST'])
 def contact():
@@ -97,23 +563,23 @@ def contact():
             contact_id = str(uuid.uuid4())
             timestamp = datetime.utcnow().isoformat()
 
-            # Save contact inquiry to DynamoDB
-            contact_table.put_item(Item={
+            # Queue the inquiry for DynamoDB, with its notifications once it is saved
+            admin_message = f"New Contact Inquiry\n\nFrom: {name}\nEmail: {email}\nMessage: {message}"
+            inquiry = {
                 'contact_id': contact_id,
                 'name': name,
                 'email': email,
                 'message': message,
                 'timestamp': timestamp,
                 'status': 'new'
-            })
+            }
+            if CONTACT_TTL_DAYS:
+                inquiry['expires_at'] = int(time.time()) + CONTACT_TTL_DAYS * 86400
+            outbox.add('contact', inquiry, children=[
+                admin_entry('New Contact Inquiry', admin_message),
+                email_entry(email, email_templates.CONTACT_RECEIVED, name=name, message=message)
+            ])
 
-            # Send email notifications
-            admin_message = f"New Contact Inquiry\n\nFrom: {name}\nEmail: {email}\nMessage: {message}"
-            customer_message = f"Dear {name},\n\nThank you for contacting us! We have received your message and will get back to you soon.\n\nYour Message: {message}\n\nBest regards,\nHomemade Pickles & Snacks Team"
-            
-            send_email_notification(ADMIN_EMAIL, 'New Contact Inquiry', admin_message)
-            send_email_notification(email, 'Thank you for contacting us', customer_message)
-            
             flash('Thank you for contacting us! We will get back to you soon.', 'success')
             return redirect(url_for('contact'))
         except Exception as e:
@@ -128,16 +594,19 @@ def login():
             password = request.form['password']
             hashed_password = hash_password(password)
 
-            # Check user in DynamoDB
-            response = user_table.get_item(Key={'email': email})
-            if 'Item' in response:
-                stored_password = response['Item'].get('password')
+            # Check user in DynamoDB (via cache; never trust a cached "not found" here)
+            user = user_cache.get(email, use_negative=False)
+            if user is not None:
+                stored_password = user.get('password')
                 if stored_password == hashed_password:
                     session['user_email'] = email
-                    session['user_name'] = response['Item'].get('name')
+                    session['user_name'] = user.get('name')
+                    session['is_admin'] = user.get('is_admin') is True
                     return redirect(url_for('home'))
             
             flash('Invalid email or password', 'error')
+        except admission.Overloaded:
+            raise
         except Exception as e:
             flash(f'Login failed: {str(e)}', 'error')
     return render_template('login.html')
@@ -153,6 +622,7 @@ def create_test_user():
             'created_at': datetime.utcnow().isoformat(),
             'status': 'active'
         })
+        user_cache.invalidate('test@test.com')
         return 'Test user created: email=test@test.com, password=test123'
     except ClientError as e:
         return f'Error: {e}'
@@ -173,27 +643,35 @@ def signup():
             hashed_password = hash_password(password)
             timestamp = datetime.utcnow().isoformat()
 
-            # Check if user already exists
-            response = user_table.get_item(Key={'email': email})
-            if 'Item' in response:
+            # Check if user already exists (cheap early exit; the conditional put below decides)
+            if user_cache.get(email) is not None:
                 flash('User already exists', 'error')
                 return render_template('signup.html')
 
-            # Save user to DynamoDB
-            user_table.put_item(Item={
-                'email': email,
-                'name': name,
-                'password': hashed_password,
-                'created_at': timestamp,
-                'status': 'active'
-            })
+            # Save user to DynamoDB, never overwriting an account a stale cache entry missed
+            try:
+                user_table.put_item(Item={
+                    'email': email,
+                    'name': name,
+                    'password': hashed_password,
+                    'created_at': timestamp,
+                    'status': 'active'
+                }, ConditionExpression='attribute_not_exists(email)')
+            except ClientError as e:
+                if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+                    raise
+                user_cache.invalidate(email)
+                flash('User already exists', 'error')
+                return render_template('signup.html')
+            user_cache.invalidate(email)
 
             # Send welcome email
-            welcome_message = f"Dear {name},\n\nWelcome to Homemade Pickles & Snacks!\n\nYour account has been created successfully. You can now login and start ordering our delicious homemade pickles and snacks.\n\nThank you for joining us!\n\nBest regards,\nHomemade Pickles & Snacks Team"
-            send_email_notification(email, 'Welcome to Homemade Pickles & Snacks!', welcome_message)
+            queue_templated_email(email, email_templates.WELCOME, name=name)
             
             flash('Account created successfully! Please login.', 'success')
             return redirect(url_for('login'))
+        except admission.Overloaded:
+            raise
         except Exception as e:
             flash(f'Signup failed: {str(e)}', 'error')
     return render_template('signup.html')
@@ -208,6 +686,83 @@ def order_success():
 def cart():
     return render_template('cart.html')
 
+@app.route('/api/cart', methods=['GET'])
+@api_login_required
+def api_cart():
+    """Current cart with catalog prices"""
+    try:
+        return jsonify(cart_summary(cart_store.get(session['user_email'])))
+    except admission.Overloaded:
+        raise
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/cart/items', methods=['POST'])
+@api_login_required
+def api_cart_add():
+    """Add an item: {"sku": ..., "quantity": 1}"""
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict) or not isinstance(data.get('sku'), str):
+        return jsonify({'error': 'Expected {"sku": "...", "quantity": n}'}), 400
+    product = catalog.get(data['sku'])
+    try:
+        quantity = int(data.get('quantity', 1))
+    except (TypeError, ValueError, OverflowError):
+        quantity = 0
+    if product is None or quantity < 1:
+        return jsonify({'error': 'Unknown item or invalid quantity'}), 400
+    try:
+        items = cart_store.add(session['user_email'], product['sku'], quantity)
+        return jsonify(cart_summary(items))
+    except CartConflict as e:
+        return jsonify({'error': str(e)}), 409
+    except admission.Overloaded:
+        raise
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/cart/items/<sku>', methods=['DELETE'])
+@api_login_required
+def api_cart_remove(sku):
+    """Remove an item from the cart"""
+    try:
+        items = cart_store.remove(session['user_email'], sku)
+        return jsonify(cart_summary(items))
+    except CartConflict as e:
+        return jsonify({'error': str(e)}), 409
+    except admission.Overloaded:
+        raise
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/cart', methods=['PATCH'])
+@api_login_required
+def api_cart_update():
+    """Set several quantities at once: {"items": {"<sku or name>": quantity}}; 0 removes"""
+    data = request.get_json(silent=True)
+    items = data.get('items') if isinstance(data, dict) else None
+    if not isinstance(items, dict):
+        return jsonify({'error': 'Expected {"items": {"<sku or name>": quantity}}'}), 400
+    quantities = {}
+    for key, quantity in items.items():
+        product = catalog.get(key) if isinstance(key, str) else None
+        try:
+            quantity = int(quantity)
+        except (TypeError, ValueError, OverflowError):
+            quantity = -1
+        if product is None or quantity < 0:
+            return jsonify({'error': f'Unknown item or invalid quantity: {key}'}), 400
+        quantities[product['sku']] = quantity
+    try:
+        items = cart_store.set_quantities(session['user_email'], quantities)
+        return jsonify(cart_summary(items))
+    except CartConflict as e:
+        return jsonify({'error': str(e)}), 409
+    except admission.Overloaded:
+        raise
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
 @app.route('/checkout', methods=['GET', 'POST'])
 @login_required
 def checkout():
@@ -218,31 +773,208 @@ def checkout():
             phone = request.form['phone']
             address = request.form['address']
             notes = request.form.get('notes', '')
-            order_id = str(uuid.uuid4())
+            order_id, keyed = idempotency.order_id_for(session['user_email'], request.form.get('idempotency_key'))
+            if keyed and dedup_cache.seen(order_id):
+                return show_order(order_id)
+            cart_items = cart_summary(cart_store.get(session['user_email']))
+            if not cart_items['items']:
+                flash('Your cart is empty', 'error')
+                return render_template('checkout.html', idempotency_key=idempotency.new_key())
             timestamp = datetime.utcnow().isoformat()
 
-            # Save checkout details to DynamoDB
-            order_table.put_item(Item={
+            # Queue checkout details for DynamoDB (a replayed key finds the order already queued or written)
+            order_item = {
                 'order_id': order_id,
+                'write_token': uuid.uuid4().hex,
+                'user_email': session['user_email'],
                 'name': name,
                 'email': email,
                 'phone': phone,
                 'address': address,
                 'notes': notes,
+                'items': [
+                    {'sku': line['sku'], 'name': line['name'], 'quantity': line['quantity'], 'unit_price': line['price']}
+                    for line in cart_items['items']
+                ],
+                'total_amount': cart_items['total'],
                 'timestamp': timestamp,
                 'status': 'checkout_completed',
                 'source': 'checkout'
-            })
-
-            # Send confirmation emails
-            customer_message = f"Dear {name},\n\nYour checkout is complete!\n\nOrder ID: {order_id}\nWe'll process your order and contact you soon.\n\nThank you!"
-            send_email_notification(email, 'Checkout Confirmation', customer_message)
-            
-            session['last_order_id'] = order_id
-            return redirect(url_for('order_success'))
+            }
+            # The confirmation is sent once the order is written
+            queued = outbox.add('order', order_item, dedup_key=f'order:{order_id}', children=order_entries(order_item) + [
+                email_entry(email, email_templates.CHECKOUT_CONFIRMATION, name=name, order_id=order_id)
+            ])
+            if queued is not None:
+                # Take the bought lines out of the cart now, so they can't be checked out twice;
+                # lines added meanwhile stay. If DynamoDB is unavailable the outbox retries it.
+                checkout_lines = {
+                    'cart_id': session['user_email'],
+                    'quantities': {line['sku']: line['quantity'] for line in cart_items['items']},
+                    'order_id': order_id
+                }
+                try:
+                    cart_store.check_out(**checkout_lines)
+                except Exception:
+                    app.logger.exception('Cart checkout for order %s deferred to the outbox', order_id)
+                    outbox.add('cart_checkout', checkout_lines)
+            return show_order(order_id)
+        except admission.Overloaded:
+            raise
         except Exception as e:
             flash(f'Checkout failed: {str(e)}', 'error')
-    return render_template('checkout.html')
+            return render_template('checkout.html', idempotency_key=request.form.get('idempotency_key') or idempotency.new_key())
+    return render_template('checkout.html', idempotency_key=idempotency.new_key())
+
+def plain(value):
+    """Convert DynamoDB Decimals (recursively) to ints/floats for JSON"""
+    if isinstance(value, Decimal):
+        return int(value) if value == value.to_integral_value() else float(value)
+    if isinstance(value, dict):
+        return {k: plain(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [plain(v) for v in value]
+    return value
+
+def encode_cursor(last_evaluated_key):
+    """Opaque pagination cursor from a DynamoDB LastEvaluatedKey"""
+    raw = json.dumps(plain(last_evaluated_key), separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+def decode_cursor(cursor):
+    """ExclusiveStartKey from a cursor produced by encode_cursor"""
+    padded = cursor + '=' * (-len(cursor) % 4)
+    return json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+
+@app.route('/my-orders')
+@login_required
+def my_orders():
+    """The logged-in user's orders, newest first, paginated with ?cursor="""
+    try:
+        limit = min(max(int(request.args.get('limit', 20)), 1), 100)
+        query = {
+            'IndexName': ORDERS_BY_USER_INDEX,
+            'KeyConditionExpression': Key('user_email').eq(session['user_email']),
+            'ScanIndexForward': False,
+            'Limit': limit
+        }
+        cursor = request.args.get('cursor')
+        archived_from = None
+        if cursor:
+            start_key = decode_cursor(cursor)
+            if start_key.get('user_email') != session['user_email']:
+                raise ValueError('cursor belongs to another user')
+            if 'archived' in start_key:
+                archived_from = int(start_key['archived'])
+            else:
+                query['ExclusiveStartKey'] = start_key
+    except (ValueError, TypeError, AttributeError) as e:
+        return jsonify({'error': f'Invalid request: {e}'}), 400
+    try:
+        orders, last_key = [], None
+        if archived_from is None:
+            response = order_table.query(**query)
+            orders = response.get('Items', [])
+            last_key = response.get('LastEvaluatedKey')
+            archived_from = 0
+        if last_key is None:
+            # Past the end of the table: carry on into orders moved to the archive
+            wanted = limit - len(orders)
+            # One extra row tells whether another page follows
+            archived = get_order_archive().for_user(session['user_email'], archived_from, wanted + 1)
+            orders = orders + archived[:wanted]
+            if len(archived) > wanted:
+                last_key = {'user_email': session['user_email'], 'archived': archived_from + wanted}
+        return jsonify({
+            'orders': plain([order_export.public(order) for order in orders]),
+            'next_cursor': encode_cursor(last_key) if last_key else None
+        })
+    except admission.Overloaded:
+        raise
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/admin/orders/export')
+@admin_required
+def export_orders():
+    """Stream every order as NDJSON (default) or CSV: ?format=csv&fields=order_id,total_amount&segments=8"""
+    file_format = 'csv' if request.args.get('format') == 'csv' else 'ndjson'
+    fields = [f.strip() for f in request.args.get('fields', '').split(',') if f.strip()] or None
+    try:
+        segments = min(max(int(request.args.get('segments', 8)), 1), 32)
+    except ValueError:
+        return jsonify({'error': 'segments must be an integer'}), 400
+    chunks = order_export.export_orders(aws_clients.get_client('dynamodb'), 'PickleOrders', file_format, segments, fields)
+    filename = f"orders-{datetime.utcnow().strftime('%Y%m%d-%H%M%S')}.{'csv' if file_format == 'csv' else 'ndjson'}"
+    return Response(
+        stream_with_context(chunks),
+        mimetype='text/csv' if file_format == 'csv' else 'application/x-ndjson',
+        headers={'Content-Disposition': f'attachment; filename={filename}'}
+    )
+
+@lru_cache(maxsize=1)
+def get_order_archive():
+    """The order archive written by order_archive.py (opened once per process)"""
+    return order_archive.OrderArchive(ARCHIVE_DIR)
+
+@app.route('/admin/orders/archive')
+@admin_required
+def archived_orders():
+    """Archived orders: ?order_id= for one, else NDJSON for ?from=YYYY-MM-DD&to=YYYY-MM-DD&email="""
+    order_id = request.args.get('order_id')
+    if order_id:
+        order = get_order_archive().get(order_id)
+        if order is None:
+            return jsonify({'error': 'Order not found in archive'}), 404
+        return jsonify(plain(order_export.public(order)))
+    start, end = request.args.get('from'), request.args.get('to')
+    try:
+        for day in (start, end):
+            if day:
+                datetime.strptime(day, '%Y-%m-%d')
+    except ValueError:
+        return jsonify({'error': 'from and to must be YYYY-MM-DD dates'}), 400
+    orders = get_order_archive().query(start, end, request.args.get('email'))
+    return Response(stream_with_context(order_export.to_ndjson(orders)), mimetype='application/x-ndjson')
+
+@app.route('/admin/stats')
+@admin_required
+def admin_stats():
+    """Pre-aggregated sales counters: ?dimension=item|city|pincode|day (default: all)"""
+    dimension = request.args.get('dimension')
+    if dimension and dimension not in sales_aggregates.DIMENSIONS:
+        return jsonify({'error': f'dimension must be one of {", ".join(sales_aggregates.DIMENSIONS)}'}), 400
+    try:
+        dimensions = [dimension] if dimension else sales_aggregates.DIMENSIONS
+        stats = {}
+        for name in dimensions:
+            buckets = sales_aggregates.read_dimension(aggregates_table, name)
+            stats[name] = {
+                bucket['bucket']: {k: bucket.get(k, 0) for k in ('orders', 'quantity', 'revenue')}
+                for bucket in buckets
+            }
+        return jsonify(plain(stats))
+    except admission.Overloaded:
+        raise
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/admin/outbox')
+@admin_required
+def outbox_status():
+    """Writes and notifications waiting in the local outbox, by kind"""
+    return jsonify(outbox.stats())
+
+@app.route('/admin/profile')
+@admin_required
+def hot_frames():
+    """Hottest frames across requests from the always-on sampler: ?limit=25, ?format=collapsed"""
+    if hot_frame_sampler is None:
+        return jsonify({'error': 'Always-on profiling is off (set PROFILE_ALWAYS_ON=True)'}), 404
+    if request.args.get('format') == 'collapsed':
+        return Response(profiling.to_collapsed(hot_frame_sampler.snapshot()), mimetype='text/plain')
+    limit = min(max(request.args.get('limit', 25, type=int), 1), 200)
+    return jsonify(hot_frame_sampler.hot_frames(limit))
 
 @app.route('/order', methods=['GET', 'POST'])
 @login_required
@@ -258,12 +990,22 @@ def order():
             item = request.form['item']
             quantity = int(request.form['quantity'])
             notes = request.form.get('notes', '')
-            order_id = str(uuid.uuid4())
+            product = catalog.get(item)
+            if product is None:
+                raise ValueError(f'Unknown item: {item}')
+            if not 1 <= quantity <= MAX_QUANTITY:
+                raise ValueError(f'Quantity must be between 1 and {MAX_QUANTITY}')
+            item = product['name']
+            order_id, keyed = idempotency.order_id_for(session['user_email'], request.form.get('idempotency_key'))
+            if keyed and dedup_cache.seen(order_id):
+                return show_order(order_id)
             timestamp = datetime.utcnow().isoformat()
 
-            # Save to DynamoDB with full order details
-            order_table.put_item(Item={
+            # Queue for DynamoDB with full order details (a replayed key finds the order already queued or written)
+            order_item = {
                 'order_id': order_id,
+                'write_token': uuid.uuid4().hex,
+                'user_email': session['user_email'],
                 'name': name,
                 'email': email,
                 'phone': phone,
@@ -271,32 +1013,38 @@ def order():
                 'city': city,
                 'pincode': pincode,
                 'item': item,
+                'sku': product['sku'],
                 'quantity': quantity,
+                'unit_price': product['price'],
                 'notes': notes,
                 'timestamp': timestamp,
                 'status': 'pending',
-                'total_amount': quantity * 100,  # Sample pricing
+                'total_amount': product['price'] * quantity,
                 'source': 'order_form'
-            })
-
-            # Send email notifications
-            customer_message = f"Dear {name},\n\nYour order has been placed successfully!\n\nOrder ID: {order_id}\nItem: {item}\nQuantity: {quantity}\n\nWe'll contact you soon for delivery details.\n\nThank you for choosing Homemade Pickles & Snacks!"
+            }
+            # Notifications go out once the order is written
             admin_message = f"New Order Received!\n\nOrder ID: {order_id}\nCustomer: {name}\nEmail: {email}\nPhone: {phone}\nItem: {item}\nQuantity: {quantity}\nAddress: {address}, {city} - {pincode}\nNotes: {notes}"
-            
-            send_email_notification(email, 'Order Confirmation - Homemade Pickles & Snacks', customer_message)
-            send_email_notification(ADMIN_EMAIL, f'New Order - {order_id}', admin_message)
-
-            session['last_order_id'] = order_id
-            return redirect(url_for('order_success'))
+            outbox.add('order', order_item, dedup_key=f'order:{order_id}', children=order_entries(order_item) + [
+                email_entry(email, email_templates.ORDER_CONFIRMATION,
+                            name=name, order_id=order_id, item=item, quantity=quantity),
+                admin_entry(f'New Order - {order_id}', admin_message)
+            ])
+            return show_order(order_id)
         except Exception as e:
             flash(f'Order processing failed: {str(e)}', 'error')
-            return render_template('order.html')
-    return render_template('order.html')
+            return render_order_form(request.form.get('idempotency_key') or idempotency.new_key())
+    return render_order_form(idempotency.new_key())
+
+def render_order_form(idempotency_key):
+    """The order page, with a quick-order form for every catalog product"""
+    categories = {category: catalog.by_category(category) for category in CATEGORIES}
+    return render_template('order.html', idempotency_key=idempotency_key, categories=categories)
 
 @app.route('/snackes')
 @login_required
 def snackes():
-    return render_template('snackes.html')
+    return page_cache.render('snackes.html', key=catalog.version(), private=True,
+                             products=catalog.by_category('snacks'))
 
 @app.route('/notify')
 def notify():
@@ -313,58 +1061,29 @@ def notify():
 def aws_info():
     """Display AWS service information"""
     try:
-        # Get EC2 instance info
-        instance_id = get_instance_info()
-        
-        # Get IAM role info
-        try:
-            sts = boto3.client('sts', region_name=AWS_REGION)
-            identity = sts.get_caller_identity()
-            account_id = identity['Account']
-            role_arn = identity.get('Arn', 'No role attached')
-        except:
-            account_id = 'Unknown'
-            role_arn = 'No role attached'
-        
-        # Test DynamoDB connectivity
-        try:
-            user_table.describe_table()
-            dynamodb_status = 'Connected'
-        except:
-            dynamodb_status = 'Error'
-            
-        # Test SNS connectivity
-        try:
-            if SNS_TOPIC_ARN:
-                sns.get_topic_attributes(TopicArn=SNS_TOPIC_ARN)
-                sns_status = 'Connected'
-            else:
-                sns_status = 'Not Configured'
-        except:
-            sns_status = 'Error'
-        
-        info = {
-            'instance_id': instance_id,
-            'account_id': account_id,
-            'role_arn': role_arn,
-            'region': AWS_REGION,
-            'dynamodb_status': dynamodb_status,
-            'sns_status': sns_status,
-            'tables': ['PickleUsers', 'PickleOrders', 'PickleContacts']
-        }
+        info = collect_aws_info()
         return jsonify(info)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 @app.route('/health')
 def health_check():
-    """Health check endpoint for load balancer"""
-    try:
-        # Test database connectivity
-        user_table.describe_table()
-        return jsonify({'status': 'healthy', 'timestamp': datetime.utcnow().isoformat()})
-    except Exception as e:
-        return jsonify({'status': 'unhealthy', 'error': str(e)}), 500
+    """Health check endpoint for load balancer (cached dependency snapshot)"""
+    health_monitor.start()
+    snapshot = health_monitor.snapshot()
+    return jsonify(snapshot), 200 if snapshot['status'] != 'unhealthy' else 500
+
+@app.route('/health/live')
+def liveness():
+    """Liveness probe: the process is up and serving requests"""
+    return jsonify({'status': 'alive', 'timestamp': datetime.utcnow().isoformat()})
+
+@app.route('/health/ready')
+def readiness():
+    """Readiness probe: required dependencies passed their last fresh check"""
+    health_monitor.start()
+    snapshot = health_monitor.snapshot()
+    return jsonify(snapshot), 200 if snapshot['ready'] else 503
 
 @app.route('/test-email')
 def test_email():
@@ -376,23 +1095,69 @@ def test_email():
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/notification-stats')
+def notification_stats():
+    """Notification queue depth and send latency"""
+    return jsonify(notifier.stats())
+
+@app.route('/metrics')
+def prometheus_metrics():
+    """Prometheus scrape endpoint (request, template and AWS call latency)"""
+    body, content_type = metrics.render()
+    return Response(body, content_type=content_type)
+
+@app.route('/cache-stats')
+def cache_stats():
+    """In-process cache hit/miss counters"""
+    return jsonify({'users': user_cache.stats(), 'pages': page_cache.stats()})
+
 @app.errorhandler(404)
 def not_found(error):
-    return render_template('404.html'), 404
+    return page_cache.render_error('404.html', 404)
 
 @app.errorhandler(500)
 def internal_error(error):
-    return render_template('500.html'), 500
+    return page_cache.render_error('500.html', 500)
 
 @app.route('/veg_pickles')
 @login_required
 def veg_pickles():
-    return render_template('veg_pickles.html')
+    return page_cache.render('veg_pickles.html', key=catalog.version(), private=True,
+                             products=catalog.by_category('veg_pickles'))
 
 @app.route('/non_veg_pickles')
 @login_required
 def non_veg_pickles():
-    return render_template('non_veg_pickles.html')
+    return page_cache.render('non_veg_pickles.html', key=catalog.version(), private=True,
+                             products=catalog.by_category('non_veg_pickles'))
+
+@app.route('/startup')
+def startup_report():
+    """Import and worker boot timings for the process that served this request"""
+    return jsonify(boot.report())
+
+@app.after_request
+def record_first_request(response):
+    if 'first_request' not in boot.worker and g.get('request_started') is not None:
+        boot.first_request((time.perf_counter() - g.request_started) * 1000)
+    return response
+
+# Compile every template up front (cached on disk across restarts) so no request pays
+# for it; under serve.py's preload this happens once in the master before forking
+JINJA_CACHE_DIR = os.environ.get('JINJA_CACHE_DIR', '/tmp/pickles-jinja-cache')
+if JINJA_CACHE_DIR:
+    os.makedirs(JINJA_CACHE_DIR, exist_ok=True)
+    app.jinja_env.bytecode_cache = FileSystemBytecodeCache(JINJA_CACHE_DIR)
+
+def precompile_templates():
+    """Load (compile) every template into the Jinja environment's cache"""
+    for name in app.jinja_env.list_templates():
+        app.jinja_env.get_template(name)
+
+if os.environ.get('JINJA_PRECOMPILE', 'True').lower() == 'true':
+    precompile_templates()
+boot.mark('routes_and_templates')
+boot.finish()
 
 if __name__ == '__main__':
     port = int(os.environ.get('PORT', 5000))
@@ -0,0 +1,222 @@
+"""
+Shared AWS clients
+Every boto3 client/resource is built from one tunable botocore Config, shared by
+all threads in a process and rebuilt automatically in a forked worker
+"""
+
+import functools
+import os
+import random
+import threading
+import time
+
+import boto3
+import botocore.session
+from botocore.config import Config
+from botocore.exceptions import ClientError
+
+_lock = threading.RLock()
+_state = {'pid': None, 'session': None, 'clients': {}, 'resources': {}, 'tables': {}}
+_event_handlers = []
+# botocore data loader (parsed service model JSON) shared by every session; it holds no
+# sockets or locks in use, so a forked worker can keep the one warmed in the master
+_loader = None
+_call_limiter = None
+# Handle attributes that build helpers rather than call AWS
+_UNLIMITED = frozenset(['batch_writer', 'can_paginate', 'get_paginator', 'get_waiter', 'Table'])
+# DynamoDB errors that mean "slow down", retried by write_batch
+THROTTLE_ERRORS = ('ProvisionedThroughputExceededException', 'ThrottlingException', 'RequestLimitExceeded')
+
+
+def build_config():
+    """botocore Config from AWS_* environment settings"""
+    options = {
+        'region_name': os.environ.get('AWS_REGION', 'us-east-1'),
+        'max_pool_connections': int(os.environ.get('AWS_MAX_POOL_CONNECTIONS', 50)),
+        'connect_timeout': float(os.environ.get('AWS_CONNECT_TIMEOUT', 2)),
+        'read_timeout': float(os.environ.get('AWS_READ_TIMEOUT', 5)),
+        'retries': {
+            'mode': os.environ.get('AWS_RETRY_MODE', 'adaptive'),
+            'max_attempts': int(os.environ.get('AWS_MAX_ATTEMPTS', 3))
+        }
+    }
+    try:
+        return Config(tcp_keepalive=True, **options)
+    except TypeError:
+        # botocore < 1.27.84 has no tcp_keepalive option
+        return Config(**options)
+
+
+def _current():
+    """Per-process state; a forked child starts over instead of sharing sockets with its parent"""
+    pid = os.getpid()
+    if _state['pid'] != pid:
+        with _lock:
+            if _state['pid'] != pid:
+                _state.update(pid=pid, session=None, clients={}, resources={}, tables={})
+    return _state
+
+
+def _after_fork():
+    # The child has one thread; the parent's lock may have been held mid-fork
+    global _lock
+    _lock = threading.RLock()
+    _state.update(pid=None, session=None, clients={}, resources={}, tables={})
+
+
+def _new_session():
+    global _loader
+    core = botocore.session.get_session()
+    if _loader is not None:
+        core.register_component('data_loader', _loader)
+    session = boto3.session.Session(botocore_session=core)
+    _loader = core.get_component('data_loader')
+    # boto3 appends its data path to the loader on every new session
+    _loader.search_paths[:] = list(dict.fromkeys(_loader.search_paths))
+    for event_name, handler in _event_handlers:
+        session.events.register(event_name, handler)
+    return session
+
+
+def _session(state):
+    if state['session'] is None:
+        state['session'] = _new_session()
+    return state['session']
+
+
+def warm(services):
+    """Parse the service models for `services` now (call before forking workers)"""
+    with _lock:
+        session = _new_session()
+        for service in services:
+            session.client(service, config=build_config())
+        if 'dynamodb' in services:
+            session.resource('dynamodb', config=build_config())
+
+
+def write_batch(client, table_name, requests, max_retries=8):
+    """One BatchWriteItem (puts/deletes), retrying UnprocessedItems and throttling with exponential backoff"""
+    attempt = 0
+    while requests:
+        try:
+            response = client.batch_write_item(RequestItems={table_name: requests})
+            requests = response.get('UnprocessedItems', {}).get(table_name, [])
+        except ClientError as e:
+            if e.response['Error']['Code'] not in THROTTLE_ERRORS:
+                raise
+        if requests:
+            if attempt >= max_retries:
+                raise RuntimeError(f"{len(requests)} requests still unprocessed after {max_retries} retries")
+            time.sleep(min(0.05 * 2 ** attempt, 5) * random.uniform(0.5, 1.5))
+            attempt += 1
+
+
+def on_event(event_name, handler):
+    """Register a botocore event handler on every client built afterwards (e.g. 'after-call.*.*')"""
+    with _lock:
+        _event_handlers.append((event_name, handler))
+        state = _current()
+        if state['session'] is not None:
+            state['session'].events.register(event_name, handler)
+
+
+def get_client(service):
+    """The process-wide client for a service"""
+    state = _current()
+    client = state['clients'].get(service)
+    if client is None:
+        with _lock:
+            client = state['clients'].get(service)
+            if client is None:
+                client = _session(state).client(service, config=build_config())
+                state['clients'][service] = client
+    return client
+
+
+def get_resource(service):
+    """The process-wide resource for a service"""
+    state = _current()
+    resource = state['resources'].get(service)
+    if resource is None:
+        with _lock:
+            resource = state['resources'].get(service)
+            if resource is None:
+                resource = _session(state).resource(service, config=build_config())
+                state['resources'][service] = resource
+    return resource
+
+
+def get_table(name):
+    """The process-wide DynamoDB Table handle"""
+    state = _current()
+    table = state['tables'].get(name)
+    if table is None:
+        with _lock:
+            table = state['tables'].get(name)
+            if table is None:
+                table = get_resource('dynamodb').Table(name)
+                state['tables'][name] = table
+    return table
+
+
+def install(clients=None, resources=None, tables=None):
+    """Serve the given objects instead of real AWS ones in this process (local stand-ins)"""
+    state = _current()
+    with _lock:
+        state['clients'].update(clients or {})
+        state['resources'].update(resources or {})
+        state['tables'].update(tables or {})
+
+
+def set_call_limiter(limiter):
+    """Run every AWS call made through a handle inside `limiter` (a context manager); None disables"""
+    global _call_limiter
+    _call_limiter = limiter
+
+
+def reset():
+    """Drop every cached client (the next call rebuilds them)"""
+    with _lock:
+        _state['pid'] = None
+
+
+class _Handle:
+    """Stands in for a client/resource/table and resolves it for the calling process"""
+
+    def __init__(self, resolve, name):
+        self._resolve = resolve
+        self._name = name
+
+    def __getattr__(self, attr):
+        value = getattr(self._resolve(self._name), attr)
+        limiter = _call_limiter
+        if limiter is None or attr in _UNLIMITED or not callable(value):
+            return value
+
+        @functools.wraps(value)
+        def limited(*args, **kwargs):
+            with limiter:
+                return value(*args, **kwargs)
+        return limited
+
+    def __repr__(self):
+        return f'<aws handle {self._resolve.__name__}({self._name!r})>'
+
+
+def client(service):
+    """Fork-safe handle to the shared client for a service"""
+    return _Handle(get_client, service)
+
+
+def resource(service):
+    """Fork-safe handle to the shared resource for a service"""
+    return _Handle(get_resource, service)
+
+
+def table(name):
+    """Fork-safe handle to a DynamoDB table"""
+    return _Handle(get_table, name)
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_after_fork)
@@ -0,0 +1,263 @@
+#!/usr/bin/env python3
+"""
+Latency benchmark
+Drives a weighted mix of the app's routes at a given concurrency against local
+AWS stand-ins and writes throughput plus p50/p95/p99 per route to JSON
+"""
+
+import argparse
+import json
+import os
+import random
+import subprocess
+import tempfile
+import sys
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime
+
+from local_aws import LocalAWS
+
+# scenario=weight; a scenario may issue several requests (checkout fills the cart first)
+DEFAULT_MIX = 'home=3,products=3,login=2,order=2,checkout=1,contact=1,signup=1'
+PASSWORD = 'bench-pass'
+
+
+def parse_mix(text):
+    """'login=2,order=1' -> {'login': 2.0, 'order': 1.0}"""
+    mix = {}
+    for part in text.split(','):
+        name, _, weight = part.partition('=')
+        name = name.strip()
+        if name not in SCENARIOS:
+            raise ValueError(f"Unknown scenario '{name}' (choose from {', '.join(SCENARIOS)})")
+        mix[name] = float(weight or 1)
+    return mix
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, int(round(pct / 100.0 * len(sorted_values))))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+class Recorder:
+    """Per-route latency samples and error counts, shared by all virtual users"""
+
+    def __init__(self):
+        self.samples = defaultdict(list)
+        self.errors = defaultdict(int)
+        self._lock = threading.Lock()
+
+    def request(self, client, method, path, label=None, **kwargs):
+        start = time.perf_counter()
+        response = client.open(path, method=method, **kwargs)
+        elapsed_ms = (time.perf_counter() - start) * 1000.0
+        label = label or f'{method} {path}'
+        with self._lock:
+            self.samples[label].append(elapsed_ms)
+            if response.status_code >= 400:
+                self.errors[label] += 1
+        return response
+
+    def summary(self, elapsed):
+        routes = {}
+        for label in sorted(self.samples):
+            values = sorted(self.samples[label])
+            routes[label] = {
+                'count': len(values),
+                'errors': self.errors[label],
+                'throughput_rps': round(len(values) / elapsed, 2),
+                'mean_ms': round(sum(values) / len(values), 3),
+                'p50_ms': round(percentile(values, 50), 3),
+                'p95_ms': round(percentile(values, 95), 3),
+                'p99_ms': round(percentile(values, 99), 3),
+                'max_ms': round(values[-1], 3)
+            }
+        return routes
+
+
+# Scenarios ----------------------------------------------------------------
+
+def scenario_home(client, user, recorder, catalog=None):
+    recorder.request(client, 'GET', '/')
+
+
+def scenario_products(client, user, recorder, catalog=None):
+    recorder.request(client, 'GET', random.choice(['/veg_pickles', '/non_veg_pickles', '/snackes']),
+                     label='GET /<category>')
+
+
+def scenario_login(client, user, recorder, catalog=None):
+    recorder.request(client, 'POST', '/login', data={'username': user['email'], 'password': PASSWORD})
+
+
+def scenario_order(client, user, recorder, catalog):
+    product = random.choice(catalog)
+    recorder.request(client, 'POST', '/order', data={
+        'name': user['name'], 'email': user['email'], 'phone': '9999999999',
+        'address': '1 Bench Street', 'city': random.choice(['Hyderabad', 'Vijayawada', 'Guntur']),
+        'pincode': '500001', 'item': product['sku'], 'quantity': random.randint(1, 3),
+        'idempotency_key': os.urandom(16).hex()
+    })
+
+
+def scenario_checkout(client, user, recorder, catalog):
+    recorder.request(client, 'POST', '/api/cart/items', json={'sku': random.choice(catalog)['sku'], 'quantity': 1})
+    recorder.request(client, 'POST', '/checkout', data={
+        'fullName': user['name'], 'email': user['email'], 'phone': '9999999999',
+        'address': '1 Bench Street', 'idempotency_key': os.urandom(16).hex()
+    })
+
+
+def scenario_contact(client, user, recorder, catalog=None):
+    recorder.request(client, 'POST', '/contact', data={
+        'name': user['name'], 'email': user['email'], 'message': 'Benchmark message'
+    })
+
+
+def scenario_signup(client, user, recorder, catalog=None):
+    recorder.request(client, 'POST', '/signup', data={
+        'fullname': 'Bench Signup', 'email': f'signup-{os.urandom(6).hex()}@bench.local', 'password': PASSWORD
+    })
+
+
+SCENARIOS = {
+    'home': scenario_home,
+    'products': scenario_products,
+    'login': scenario_login,
+    'order': scenario_order,
+    'checkout': scenario_checkout,
+    'contact': scenario_contact,
+    'signup': scenario_signup
+}
+
+
+# Runner -------------------------------------------------------------------
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def run(args):
+    """Run the benchmark and return the report dict"""
+    # Admission control would shed most of a closed-loop benchmark unless asked for
+    os.environ.setdefault('ADMISSION_ENABLED', 'True' if args.admission else 'False')
+    # A fresh outbox per run, so writes left over from earlier runs aren't drained into this one
+    os.environ.setdefault('OUTBOX_PATH', os.path.join(tempfile.mkdtemp(prefix='pickles-bench-'), 'outbox.db'))
+    aws = LocalAWS(dynamodb_ms=args.dynamodb_ms, ses_ms=args.ses_ms, sns_ms=args.sns_ms,
+                   jitter=args.jitter).install()
+    import app as webapp
+
+    users = [
+        {'email': f'user{i}@bench.local', 'name': f'Bench User {i}', 'ip': f'10.0.{i // 250}.{i % 250 + 1}'}
+        for i in range(args.concurrency)
+    ]
+    for user in users:
+        aws.tables['PickleUsers'].put_item(Item={
+            'email': user['email'], 'name': user['name'],
+            'password': webapp.hash_password(PASSWORD), 'status': 'active'
+        })
+    catalog = [product for category in ('veg_pickles', 'non_veg_pickles', 'snacks')
+               for product in webapp.catalog.by_category(category)]
+    mix = parse_mix(args.mix)
+    names, weights = list(mix), list(mix.values())
+
+    started_at = datetime.utcnow().isoformat()
+    recorder = Recorder()
+    deadline = time.monotonic() + args.warmup + args.duration
+    measure_from = time.monotonic() + args.warmup
+    warm = Recorder()
+
+    def virtual_user(user):
+        client = webapp.app.test_client()
+        client.environ_base['REMOTE_ADDR'] = user['ip']
+        scenario_login(client, user, warm)
+        while time.monotonic() < deadline:
+            name = random.choices(names, weights)[0]
+            target = recorder if time.monotonic() >= measure_from else warm
+            SCENARIOS[name](client, user, target, catalog)
+
+    print(f"🏁 {args.concurrency} users, {args.duration}s (+{args.warmup}s warm-up), mix {args.mix}")
+    threads = [threading.Thread(target=virtual_user, args=(user,), daemon=True) for user in users]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    webapp.outbox.flush()
+    webapp.notifier.flush()
+
+    routes = recorder.summary(args.duration)
+    return {
+        'commit': git_commit(),
+        'started_at': started_at,
+        'python': sys.version.split()[0],
+        'config': {
+            'concurrency': args.concurrency, 'duration_s': args.duration, 'warmup_s': args.warmup,
+            'mix': mix, 'dynamodb_ms': args.dynamodb_ms, 'ses_ms': args.ses_ms,
+            'sns_ms': args.sns_ms, 'jitter': args.jitter, 'admission': args.admission
+        },
+        'requests': sum(route['count'] for route in routes.values()),
+        'errors': sum(route['errors'] for route in routes.values()),
+        'throughput_rps': round(sum(route['count'] for route in routes.values()) / args.duration, 2),
+        'routes': routes,
+        'aws_calls': dict(sorted(aws.calls.items())),
+        'notifications': webapp.notifier.stats(),
+        'outbox': webapp.outbox.stats()
+    }
+
+
+def compare(report, baseline_path):
+    """Print p50/p99 changes against an earlier report"""
+    with open(baseline_path, encoding='utf-8') as f:
+        baseline = json.load(f)
+    print(f"\n📈 vs {baseline.get('commit') or baseline_path}:")
+    for label, route in report['routes'].items():
+        before = baseline.get('routes', {}).get(label)
+        if not before:
+            continue
+        deltas = []
+        for key in ('p50_ms', 'p99_ms'):
+            change = (route[key] - before[key]) / before[key] * 100 if before[key] else 0.0
+            deltas.append(f"{key[:-3]} {before[key]:.1f} → {route[key]:.1f} ms ({change:+.0f}%)")
+        print(f"   {label:<24} " + ', '.join(deltas))
+
+
+def main():
+    """Main function"""
+    parser = argparse.ArgumentParser(description='Benchmark route latency against local AWS stand-ins')
+    parser.add_argument('--concurrency', type=int, default=8, help='virtual users (default: 8)')
+    parser.add_argument('--duration', type=float, default=20, help='measured seconds (default: 20)')
+    parser.add_argument('--warmup', type=float, default=3, help='unmeasured seconds first (default: 3)')
+    parser.add_argument('--mix', default=DEFAULT_MIX, help=f'scenario weights (default: {DEFAULT_MIX})')
+    parser.add_argument('--dynamodb-ms', type=float, default=8, help='simulated DynamoDB latency (default: 8)')
+    parser.add_argument('--ses-ms', type=float, default=60, help='simulated SES latency (default: 60)')
+    parser.add_argument('--sns-ms', type=float, default=30, help='simulated SNS latency (default: 30)')
+    parser.add_argument('--jitter', type=float, default=0.25, help='latency jitter as a fraction (default: 0.25)')
+    parser.add_argument('--admission', action='store_true', help='keep admission control on (429/503s count as errors)')
+    parser.add_argument('--output', default='benchmark.json', help='report file (default: benchmark.json)')
+    parser.add_argument('--baseline', help='earlier report to compare against')
+    args = parser.parse_args()
+
+    report = run(args)
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+
+    print(f"\n📊 {report['requests']:,} requests, {report['throughput_rps']} req/s, {report['errors']} errors")
+    for label, route in report['routes'].items():
+        print(f"   {label:<24} n={route['count']:<6} p50={route['p50_ms']:.1f} "
+              f"p95={route['p95_ms']:.1f} p99={route['p99_ms']:.1f} ms")
+    if args.baseline:
+        compare(report, args.baseline)
+    print(f"\n✅ Report written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""
+Server-side cart store
+Carts are compact {sku: quantity} maps in the PickleCarts table, one item per user
+"""
+
+import time
+
+from botocore.exceptions import ClientError
+
+MAX_QUANTITY = 99
+
+
+class CartConflict(Exception):
+    """The cart kept changing underneath an update"""
+
+
+class CartStore:
+    """Read/modify/write access to carts with optimistic versioning"""
+
+    def __init__(self, table, ttl_days=30, max_attempts=3):
+        self.table = table
+        self.ttl_seconds = ttl_days * 86400
+        self.max_attempts = max_attempts
+
+    def _load(self, cart_id):
+        item = self.table.get_item(Key={'cart_id': cart_id}, ConsistentRead=True).get('Item')
+        if item is None:
+            return {}, 0, None
+        items = {sku: int(quantity) for sku, quantity in item.get('items', {}).items()}
+        return items, int(item.get('version', 0)), item.get('checked_out')
+
+    def get(self, cart_id):
+        """Current {sku: quantity} for a cart"""
+        return self._load(cart_id)[0]
+
+    def update(self, cart_id, mutate, checkout_id=None):
+        """Apply mutate(items) to the cart, retrying if a concurrent write wins
+
+        With checkout_id, the update is applied at most once: it is skipped if the
+        cart already records that checkout.
+        """
+        for _ in range(self.max_attempts):
+            items, version, checked_out = self._load(cart_id)
+            if checkout_id is not None and checked_out == checkout_id:
+                return items
+            mutate(items)
+            items = {sku: min(q, MAX_QUANTITY) for sku, q in items.items() if q > 0}
+            item = {
+                'cart_id': cart_id,
+                'items': items,
+                'version': version + 1,
+                'updated_at': int(time.time()),
+                'expires_at': int(time.time()) + self.ttl_seconds
+            }
+            # The last checkout applied stays recorded until the next one
+            if checkout_id is not None or checked_out is not None:
+                item['checked_out'] = checkout_id or checked_out
+            try:
+                self.table.put_item(
+                    Item=item,
+                    ConditionExpression='attribute_not_exists(cart_id) OR version = :v',
+                    ExpressionAttributeValues={':v': version}
+                )
+                return items
+            except ClientError as e:
+                if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+                    raise
+        raise CartConflict(f'Cart {cart_id} changed during update')
+
+    def add(self, cart_id, sku, quantity=1):
+        """Add quantity units of sku"""
+        def mutate(items):
+            items[sku] = items.get(sku, 0) + quantity
+        return self.update(cart_id, mutate)
+
+    def remove(self, cart_id, sku):
+        """Remove sku from the cart"""
+        return self.update(cart_id, lambda items: items.pop(sku, None))
+
+    def set_quantities(self, cart_id, quantities):
+        """Set several quantities at once; 0 removes the line"""
+        return self.update(cart_id, lambda items: items.update(quantities))
+
+    def check_out(self, cart_id, quantities, order_id):
+        """Remove the quantities bought in order_id, keeping anything added since (safe to repeat)"""
+        def mutate(items):
+            for sku, quantity in quantities.items():
+                items[sku] = items.get(sku, 0) - quantity
+        return self.update(cart_id, mutate, checkout_id=order_id)
+
+    def clear(self, cart_id):
+        """Empty the cart"""
+        self.table.delete_item(Key={'cart_id': cart_id})
@@ -0,0 +1,81 @@
+"""
+Product catalog
+Loads catalog.json once into in-memory indexes and reloads it when the file changes
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+CATEGORIES = ('veg_pickles', 'non_veg_pickles', 'snacks')
+
+
+class Catalog:
+    """Products indexed by SKU, name and category"""
+
+    def __init__(self, path, reload_interval=5):
+        self.path = path
+        self.reload_interval = reload_interval
+        self._by_sku = {}
+        self._by_name = {}
+        self._by_category = {}
+        self._mtime = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+        self.load()
+
+    def load(self):
+        """Read the catalog file and rebuild the indexes"""
+        mtime = os.path.getmtime(self.path)
+        with open(self.path, encoding='utf-8') as f:
+            products = json.load(f)['products']
+        by_sku, by_name, by_category = {}, {}, {category: [] for category in CATEGORIES}
+        for product in products:
+            product['price'] = int(product['price'])
+            by_sku[product['sku']] = product
+            by_name[product['name'].strip().lower()] = product
+            by_category.setdefault(product['category'], []).append(product)
+        # Swap in complete indexes so readers never see a partial catalog
+        self._by_sku, self._by_name, self._by_category = by_sku, by_name, by_category
+        self._mtime = mtime
+        self._checked_at = time.monotonic()
+        return len(by_sku)
+
+    def maybe_reload(self):
+        """Reload if the file changed, checking at most every reload_interval seconds"""
+        if time.monotonic() - self._checked_at < self.reload_interval:
+            return False
+        with self._lock:
+            if time.monotonic() - self._checked_at < self.reload_interval:
+                return False
+            self._checked_at = time.monotonic()
+            try:
+                if os.path.getmtime(self.path) == self._mtime:
+                    return False
+                count = self.load()
+            except (OSError, ValueError, KeyError) as e:
+                logger.error('Catalog reload failed, keeping previous catalog: %s', e)
+                return False
+        logger.info('Catalog reloaded: %d products', count)
+        return True
+
+    def get(self, key):
+        """Look up a product by SKU or (case-insensitive) name"""
+        self.maybe_reload()
+        if key in self._by_sku:
+            return self._by_sku[key]
+        return self._by_name.get(str(key).strip().lower())
+
+    def by_category(self, category):
+        """Products in a category, in catalog order"""
+        self.maybe_reload()
+        return self._by_category.get(category, [])
+
+    def version(self):
+        """Changes whenever the catalog is reloaded"""
+        self.maybe_reload()
+        return self._mtime
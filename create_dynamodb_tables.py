@@ -1,12 +1,20 @@
 #!/usr/bin/env python3
 """
 DynamoDB table creation script
-Creates all required tables for the application
+Creates all required tables for the application and bulk-loads data into them
 """
 
-import boto3
+import argparse
+import csv
+import json
+import threading
+import time
 import os
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal, InvalidOperation
+from boto3.dynamodb.types import TypeSerializer
 from dotenv import load_dotenv
+import aws_clients
 from botocore.exceptions import ClientError
 
 # Load environment variables
@@ -14,16 +22,22 @@ load_dotenv()
 
 # AWS Configuration
 AWS_REGION = os.environ.get('AWS_REGION', 'us-east-1')
-dynamodb = boto3.resource('dynamodb', region_name=AWS_REGION)
+dynamodb = aws_clients.get_resource('dynamodb')
 
-def create_table(table_name, key_schema, attribute_definitions, billing_mode='PAY_PER_REQUEST'):
+# BatchWriteItem accepts at most 25 put requests per call
+BATCH_SIZE = 25
+
+def create_table(table_name, key_schema, attribute_definitions, billing_mode='PAY_PER_REQUEST',
+                 global_secondary_indexes=None):
     """Create a DynamoDB table"""
     try:
+        extra = {'GlobalSecondaryIndexes': global_secondary_indexes} if global_secondary_indexes else {}
         table = dynamodb.create_table(
             TableName=table_name,
             KeySchema=key_schema,
             AttributeDefinitions=attribute_definitions,
-            BillingMode=billing_mode
+            BillingMode=billing_mode,
+            **extra
         )
         
         print(f"Creating table {table_name}...")
@@ -39,6 +53,41 @@ def create_table(table_name, key_schema, attribute_definitions, billing_mode='PA
             print(f"❌ Error creating table {table_name}: {e}")
             return False
 
+def ensure_global_secondary_indexes(table_name, attribute_definitions, global_secondary_indexes):
+    """Add any missing GSIs to an existing table"""
+    try:
+        existing = dynamodb.meta.client.describe_table(TableName=table_name)['Table']
+        present = {index['IndexName'] for index in existing.get('GlobalSecondaryIndexes', [])}
+        for index in global_secondary_indexes:
+            if index['IndexName'] in present:
+                continue
+            dynamodb.meta.client.update_table(
+                TableName=table_name,
+                AttributeDefinitions=attribute_definitions,
+                GlobalSecondaryIndexUpdates=[{'Create': index}]
+            )
+            print(f"🔧 Adding index {index['IndexName']} to {table_name} (backfills in the background)")
+        return True
+    except ClientError as e:
+        print(f"❌ Error adding indexes to {table_name}: {e}")
+        return False
+
+def enable_ttl(table_name, attribute_name):
+    """Enable DynamoDB TTL expiry on a table attribute"""
+    try:
+        dynamodb.meta.client.update_time_to_live(
+            TableName=table_name,
+            TimeToLiveSpecification={'Enabled': True, 'AttributeName': attribute_name}
+        )
+        print(f"⏳ TTL enabled on {table_name}.{attribute_name}")
+        return True
+    except ClientError as e:
+        if 'already enabled' in str(e):
+            print(f"⚠️  TTL already enabled on {table_name}")
+            return True
+        print(f"❌ Error enabling TTL on {table_name}: {e}")
+        return False
+
 def create_all_tables():
     """Create all required DynamoDB tables"""
     print("🗄️  Creating DynamoDB Tables...")
@@ -53,12 +102,46 @@ def create_all_tables():
         {
             'name': 'PickleOrders',
             'key_schema': [{'AttributeName': 'order_id', 'KeyType': 'HASH'}],
-            'attributes': [{'AttributeName': 'order_id', 'AttributeType': 'S'}]
+            'attributes': [
+                {'AttributeName': 'order_id', 'AttributeType': 'S'},
+                {'AttributeName': 'user_email', 'AttributeType': 'S'},
+                {'AttributeName': 'timestamp', 'AttributeType': 'S'}
+            ],
+            'global_secondary_indexes': [
+                {
+                    'IndexName': 'user_email-timestamp-index',
+                    'KeySchema': [
+                        {'AttributeName': 'user_email', 'KeyType': 'HASH'},
+                        {'AttributeName': 'timestamp', 'KeyType': 'RANGE'}
+                    ],
+                    'Projection': {'ProjectionType': 'ALL'}
+                }
+            ]
         },
         {
             'name': 'PickleContacts',
             'key_schema': [{'AttributeName': 'contact_id', 'KeyType': 'HASH'}],
-            'attributes': [{'AttributeName': 'contact_id', 'AttributeType': 'S'}]
+            'attributes': [{'AttributeName': 'contact_id', 'AttributeType': 'S'}],
+            'ttl_attribute': 'expires_at'
+        },
+        {
+            'name': 'PickleCarts',
+            'key_schema': [{'AttributeName': 'cart_id', 'KeyType': 'HASH'}],
+            'attributes': [{'AttributeName': 'cart_id', 'AttributeType': 'S'}],
+            'ttl_attribute': 'expires_at'
+        },
+        {
+            'name': 'PickleAggregates',
+            'key_schema': [
+                {'AttributeName': 'dimension', 'KeyType': 'HASH'},
+                {'AttributeName': 'bucket', 'KeyType': 'RANGE'}
+            ],
+            'attributes': [
+                {'AttributeName': 'dimension', 'AttributeType': 'S'},
+                {'AttributeName': 'bucket', 'AttributeType': 'S'}
+            ],
+            # Expires the applied-order markers; counters never carry the attribute
+            'ttl_attribute': 'expires_at'
         }
     ]
     
@@ -67,8 +150,17 @@ def create_all_tables():
         result = create_table(
             table_config['name'],
             table_config['key_schema'],
-            table_config['attributes']
+            table_config['attributes'],
+            global_secondary_indexes=table_config.get('global_secondary_indexes')
         )
+        if result and table_config.get('global_secondary_indexes'):
+            result = ensure_global_secondary_indexes(
+                table_config['name'],
+                table_config['attributes'],
+                table_config['global_secondary_indexes']
+            )
+        if result and table_config.get('ttl_attribute'):
+            result = enable_ttl(table_config['name'], table_config['ttl_attribute'])
         results.append(result)
     
     print("\n" + "=" * 50)
@@ -78,21 +170,104 @@ def create_all_tables():
         for table_config in tables:
             print(f"📋 {table_config['name']}")
             print(f"   Primary Key: {table_config['key_schema'][0]['AttributeName']}")
+            for index in table_config.get('global_secondary_indexes', []):
+                print(f"   Index: {index['IndexName']}")
     else:
         print("⚠️  Some tables failed to create. Check AWS credentials and permissions.")
     
     return all(results)
 
+def read_items(path, file_format=None, numeric=()):
+    """Stream items from a JSONL or CSV file without loading it into memory
+
+    CSV values are strings except in the `numeric` columns, which load as numbers.
+    """
+    file_format = file_format or ('csv' if path.lower().endswith('.csv') else 'jsonl')
+    numeric = set(numeric)
+    with open(path, newline='', encoding='utf-8') as f:
+        if file_format == 'csv':
+            reader = csv.DictReader(f)
+            for row in reader:
+                item = {key: value for key, value in row.items() if value not in ('', None)}
+                for column in numeric & item.keys():
+                    try:
+                        value = Decimal(item[column].strip())
+                    except InvalidOperation:
+                        value = None
+                    if value is None or not value.is_finite():
+                        raise ValueError(f"Line {reader.line_num}: {column}={item[column]!r} is not a number")
+                    item[column] = value
+                yield item
+        else:
+            for line in f:
+                line = line.strip()
+                if line:
+                    yield json.loads(line, parse_float=Decimal)
+
+def bulk_load(table_name, path, file_format=None, workers=8, report_every=10000, numeric=()):
+    """Load a JSONL/CSV file into a table with parallel BatchWriteItem calls"""
+    if workers < 1:
+        raise ValueError('workers must be at least 1')
+    print(f"📥 Loading {path} into {table_name} with {workers} workers...")
+    client = dynamodb.meta.client
+    serializer = TypeSerializer()
+    key_names = [key['AttributeName'] for key in client.describe_table(TableName=table_name)['Table']['KeySchema']]
+    # Bound the batches waiting on the pool so memory stays flat for huge files
+    slots = threading.BoundedSemaphore(workers * 2)
+    lock = threading.Lock()
+    stats = {'written': 0, 'failed': 0}
+    started = time.time()
+
+    def report():
+        elapsed = time.time() - started
+        rate = stats['written'] / elapsed if elapsed else 0
+        print(f"   {stats['written']:,} items written, {stats['failed']:,} failed ({rate:,.0f} items/sec)")
+
+    def run(batch):
+        try:
+            aws_clients.write_batch(client, table_name, batch)
+            with lock:
+                before = stats['written']
+                stats['written'] += len(batch)
+                if stats['written'] // report_every != before // report_every:
+                    report()
+        except Exception as e:
+            with lock:
+                stats['failed'] += len(batch)
+            print(f"❌ Batch failed: {e}")
+        finally:
+            slots.release()
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        # BatchWriteItem rejects a batch that repeats a key; a later row replaces the earlier one
+        batch = {}
+        for item in read_items(path, file_format, numeric):
+            key = tuple(str(item.get(name)) for name in key_names)
+            batch[key] = {'PutRequest': {'Item': {k: serializer.serialize(v) for k, v in item.items()}}}
+            if len(batch) == BATCH_SIZE:
+                slots.acquire()
+                pool.submit(run, list(batch.values()))
+                batch = {}
+        if batch:
+            slots.acquire()
+            pool.submit(run, list(batch.values()))
+
+    report()
+    if stats['failed']:
+        print(f"⚠️  {stats['failed']:,} items failed to load")
+    else:
+        print(f"✅ Loaded {stats['written']:,} items into {table_name} in {time.time() - started:.1f}s")
+    return stats
+
 def verify_tables():
     """Verify all tables exist and are active"""
     print("\n🔍 Verifying Tables...")
     
-    table_names = ['PickleUsers', 'PickleOrders', 'PickleContacts']
+    table_names = ['PickleUsers', 'PickleOrders', 'PickleContacts', 'PickleCarts', 'PickleAggregates']
     
     for table_name in table_names:
         try:
-            table = dynamodb.Table(table_name)
-            response = table.describe_table()
+            response = dynamodb.meta.client.describe_table(TableName=table_name)
             status = response['Table']['TableStatus']
             print(f"✅ {table_name}: {status}")
         except ClientError as e:
@@ -100,12 +275,28 @@ def verify_tables():
 
 def main():
     """Main function"""
+    parser = argparse.ArgumentParser(description='Create DynamoDB tables or bulk-load data into them')
+    parser.add_argument('--load', nargs=2, metavar=('TABLE', 'FILE'), help='bulk-load a JSONL or CSV file into TABLE')
+    parser.add_argument('--format', choices=['jsonl', 'csv'], help='input format (default: from file extension)')
+    parser.add_argument('--workers', type=int, default=8, help='parallel BatchWriteItem workers (default: 8)')
+    parser.add_argument('--numeric', default='', metavar='COLUMNS',
+                        help='comma-separated CSV columns to load as numbers (e.g. price,quantity)')
+    args = parser.parse_args()
+    if args.workers < 1:
+        parser.error('--workers must be at least 1')
+
+    if args.load:
+        table_name, path = args.load
+        numeric = [column.strip() for column in args.numeric.split(',') if column.strip()]
+        bulk_load(table_name, path, args.format, args.workers, numeric=numeric)
+        return
+
     print("🚀 DynamoDB Table Setup")
     print("=" * 50)
     
     # Check AWS credentials
     try:
-        sts = boto3.client('sts', region_name=AWS_REGION)
+        sts = aws_clients.get_client('sts')
         identity = sts.get_caller_identity()
         print(f"AWS Account: {identity['Account']}")
         print(f"Region: {AWS_REGION}")
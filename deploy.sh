@@ -15,25 +15,65 @@ sudo yum install -y python3 python3-pip git nginx
 # cd homemade-pickles
 
 # Install Python dependencies
-pip3 install -r requirements.txt
+pip3 install --user -r home/requirements.txt || { echo "Dependency install failed"; exit 1; }
+
+# Build responsive image variants (requires Pillow)
+python3 home/image_pipeline.py
+
+# Fingerprint and precompress static assets
+python3 home/static_assets.py
 
 # Create systemd service file
 sudo tee /etc/systemd/system/pickles-app.service > /dev/null <<EOF
 [Unit]
-Description=Homemade Pickles Flask App
+Description=Homemade Pickles Flask App (gunicorn)
 After=network.target
 
 [Service]
 User=ec2-user
 WorkingDirectory=/home/ec2-user/homemade-pickles
 Environment=PATH=/home/ec2-user/.local/bin
-ExecStart=/usr/bin/python3 home/app.py
+Environment=PROXY_COUNT=1
+ExecStart=/usr/bin/python3 home/serve.py
+# systemctl reload pickles-app: gunicorn re-reads its config and replaces workers gracefully.
+# The app is preloaded in the master, so new workers fork the code already loaded there;
+# deploying new code needs systemctl restart pickles-app
+ExecReload=/bin/kill -s HUP \$MAINPID
+KillMode=mixed
+TimeoutStopSec=40
 Restart=always
 
 [Install]
 WantedBy=multi-user.target
 EOF
 
+# Archive old terminal orders out of PickleOrders nightly (order_archive.py).
+# Every instance reads the archive (/my-orders, /admin/orders/archive), so ARCHIVE_DIR
+# must be a shared mount (e.g. EFS) on all of them, and exactly one instance writes it:
+# run this script with ARCHIVE_HOST=1 on that instance only to enable the timer there.
+sudo tee /etc/systemd/system/pickles-archive.service > /dev/null <<EOF
+[Unit]
+Description=Archive old Homemade Pickles orders
+
+[Service]
+Type=oneshot
+User=ec2-user
+WorkingDirectory=/home/ec2-user/homemade-pickles
+ExecStart=/usr/bin/python3 home/order_archive.py
+EOF
+
+sudo tee /etc/systemd/system/pickles-archive.timer > /dev/null <<EOF
+[Unit]
+Description=Nightly order archival
+
+[Timer]
+OnCalendar=*-*-* 03:30:00
+Persistent=true
+
+[Install]
+WantedBy=timers.target
+EOF
+
 # Configure nginx
 sudo tee /etc/nginx/conf.d/pickles.conf > /dev/null <<EOF
 server {
@@ -46,11 +86,28 @@ server {
         proxy_set_header X-Real-IP \$remote_addr;
         proxy_set_header X-Forwarded-For \$proxy_add_x_forwarded_for;
         proxy_set_header X-Forwarded-Proto \$scheme;
+        proxy_connect_timeout 5s;
+        proxy_read_timeout 35s;
+    }
+
+    # Prometheus scrapes from the instance itself only
+    location = /metrics {
+        allow 127.0.0.1;
+        deny all;
+        proxy_pass http://127.0.0.1:5000;
+    }
+
+    # Content-hashed copies from static_assets.py, served precompressed
+    location /static/dist {
+        alias /home/ec2-user/homemade-pickles/home/static/dist;
+        gzip_static on;
+        # brotli_static on;  (requires ngx_brotli)
+        add_header Cache-Control "public, max-age=31536000, immutable";
     }
 
     location /static {
         alias /home/ec2-user/homemade-pickles/home/static;
-        expires 30d;
+        expires 1h;
     }
 }
 EOF
@@ -59,6 +116,9 @@ EOF
 sudo systemctl daemon-reload
 sudo systemctl enable pickles-app
 sudo systemctl start pickles-app
+if [ "${ARCHIVE_HOST:-0}" = "1" ]; then
+    sudo systemctl enable --now pickles-archive.timer
+fi
 sudo systemctl enable nginx
 sudo systemctl start nginx
 
@@ -21,7 +21,15 @@ echo "📥 Cloning repository..."
 
 # Install Python dependencies
 echo "📦 Installing Python dependencies..."
-pip3 install --user flask boto3 python-dotenv requests
+pip3 install --user flask boto3 python-dotenv requests Pillow brotli gunicorn prometheus_client
+
+# Build responsive image variants
+echo "🖼️  Building image variants..."
+python3 home/image_pipeline.py
+
+# Fingerprint and precompress static assets
+echo "📦 Fingerprinting static assets..."
+python3 home/static_assets.py
 
 # Set environment variables
 echo "🔧 Setting environment variables..."
@@ -35,7 +43,7 @@ export DEBUG="False"
 echo "⚙️  Creating systemd service..."
 sudo tee /etc/systemd/system/pickles-app.service > /dev/null <<EOF
 [Unit]
-Description=Homemade Pickles Flask App
+Description=Homemade Pickles Flask App (gunicorn)
 After=network.target
 
 [Service]
@@ -48,7 +56,13 @@ Environment=AWS_REGION=us-east-1
 Environment=ADMIN_EMAIL=admin@pickles.com
 Environment=PORT=5000
 Environment=DEBUG=False
-ExecStart=/usr/bin/python3 home/app.py
+Environment=WEB_THREADS=4
+Environment=WEB_TIMEOUT=30
+ExecStart=/usr/bin/python3 home/serve.py
+# systemctl reload pickles-app: gunicorn starts new workers and retires old ones gracefully
+ExecReload=/bin/kill -s HUP \$MAINPID
+KillMode=mixed
+TimeoutStopSec=40
 Restart=always
 RestartSec=3
 
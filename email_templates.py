@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+SES email templates
+Customer confirmation emails registered once with SES and sent by name
+"""
+
+import re
+from dotenv import load_dotenv
+from botocore.exceptions import ClientError
+
+import aws_clients
+
+WELCOME = 'PickleWelcome'
+CONTACT_RECEIVED = 'PickleContactReceived'
+CHECKOUT_CONFIRMATION = 'PickleCheckoutConfirmation'
+ORDER_CONFIRMATION = 'PickleOrderConfirmation'
+
+TEMPLATES = {
+    WELCOME: {
+        'subject': 'Welcome to Homemade Pickles & Snacks!',
+        'text': "Dear {{name}},\n\nWelcome to Homemade Pickles & Snacks!\n\nYour account has been created successfully. You can now login and start ordering our delicious homemade pickles and snacks.\n\nThank you for joining us!\n\nBest regards,\nHomemade Pickles & Snacks Team"
+    },
+    CONTACT_RECEIVED: {
+        'subject': 'Thank you for contacting us',
+        'text': "Dear {{name}},\n\nThank you for contacting us! We have received your message and will get back to you soon.\n\nYour Message: {{message}}\n\nBest regards,\nHomemade Pickles & Snacks Team"
+    },
+    CHECKOUT_CONFIRMATION: {
+        'subject': 'Checkout Confirmation',
+        'text': "Dear {{name}},\n\nYour checkout is complete!\n\nOrder ID: {{order_id}}\nWe'll process your order and contact you soon.\n\nThank you!"
+    },
+    ORDER_CONFIRMATION: {
+        'subject': 'Order Confirmation - Homemade Pickles & Snacks',
+        'text': "Dear {{name}},\n\nYour order has been placed successfully!\n\nOrder ID: {{order_id}}\nItem: {{item}}\nQuantity: {{quantity}}\n\nWe'll contact you soon for delivery details.\n\nThank you for choosing Homemade Pickles & Snacks!"
+    }
+}
+
+_PLACEHOLDER = re.compile(r'{{\s*(\w+)\s*}}')
+
+def render(name, data):
+    """Render a template locally, returning (subject, text)"""
+    template = TEMPLATES[name]
+    replace = lambda match: str(data.get(match.group(1), ''))
+    return _PLACEHOLDER.sub(replace, template['subject']), _PLACEHOLDER.sub(replace, template['text'])
+
+def register_templates(ses):
+    """Create or update every template in SES"""
+    results = []
+    for name, template in TEMPLATES.items():
+        definition = {
+            'TemplateName': name,
+            'SubjectPart': template['subject'],
+            'TextPart': template['text']
+        }
+        try:
+            try:
+                ses.create_template(Template=definition)
+                print(f"✅ Template {name} created")
+            except ClientError as e:
+                if e.response['Error']['Code'] != 'AlreadyExists':
+                    raise
+                ses.update_template(Template=definition)
+                print(f"✅ Template {name} updated")
+            results.append(True)
+        except ClientError as e:
+            print(f"❌ Error registering template {name}: {e}")
+            results.append(False)
+    return all(results)
+
+def main():
+    """Main function"""
+    load_dotenv()
+    print("📧 SES Template Setup")
+    print("=" * 50)
+    ses = aws_clients.get_client('ses')
+    if register_templates(ses):
+        print("\n🎉 All email templates registered!")
+    else:
+        print("\n⚠️  Some templates failed to register. Check AWS credentials and permissions.")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""
+Dependency health monitor
+Refreshes dependency checks in the background so probes read a cached snapshot
+"""
+
+import logging
+import threading
+import time
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+
+class HealthMonitor:
+    """Runs named dependency checks on an interval and keeps the latest results"""
+
+    def __init__(self, interval=15, stale_after=None):
+        self.interval = interval
+        self.stale_after = stale_after if stale_after is not None else interval * 3
+        self._checks = {}
+        self._results = {}
+        self._started_at = time.time()
+        self._thread = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+
+    def add_check(self, name, func, required=True):
+        """Register a check; func raises on failure, required checks gate readiness"""
+        self._checks[name] = (func, required)
+
+    def refresh(self):
+        """Run every check once and store the results"""
+        for name, (func, required) in self._checks.items():
+            started = time.perf_counter()
+            try:
+                func()
+                result = {'status': 'ok'}
+            except Exception as e:
+                result = {'status': 'error', 'error': str(e)}
+            result.update({
+                'required': required,
+                'latency_ms': round((time.perf_counter() - started) * 1000, 2),
+                'checked_at': time.time()
+            })
+            with self._lock:
+                self._results[name] = result
+
+    def start(self):
+        """Start the background refresher if it is not already running"""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name='health-monitor', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        """Stop the background refresher"""
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.refresh()
+            except Exception:
+                logger.exception('Health refresh failed')
+            self._stop.wait(self.interval)
+
+    def snapshot(self):
+        """Latest check results with age and staleness"""
+        now = time.time()
+        with self._lock:
+            results = {name: dict(result) for name, result in self._results.items()}
+        checks = {}
+        ready = bool(results) and len(results) == len(self._checks)
+        for name, result in results.items():
+            age = now - result.pop('checked_at')
+            result['age_seconds'] = round(age, 1)
+            result['stale'] = age > self.stale_after
+            if result['required'] and (result['status'] != 'ok' or result['stale']):
+                ready = False
+            checks[name] = result
+        if not results:
+            status = 'starting'
+        else:
+            status = 'healthy' if ready else 'unhealthy'
+        return {
+            'status': status,
+            'ready': ready,
+            'checks': checks,
+            'uptime_seconds': round(now - self._started_at, 1),
+            'timestamp': datetime.utcnow().isoformat()
+        }
@@ -0,0 +1,54 @@
+"""
+Idempotent form submissions
+Forms carry a one-time key; replays of the same key map to the same order
+"""
+
+import re
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+_KEY_PATTERN = re.compile(r'^[0-9a-f]{32}$')
+_ORDER_NAMESPACE = uuid.UUID('6f1c2a52-4d3e-4b8e-9a57-0c1f6e3d8b21')
+
+
+def new_key():
+    """A fresh idempotency key to embed in a rendered form"""
+    return uuid.uuid4().hex
+
+
+def order_id_for(scope, key):
+    """Deterministic order ID for a submitted key, or a random one if the key is missing/invalid"""
+    if not key or not _KEY_PATTERN.match(key):
+        return str(uuid.uuid4()), False
+    return str(uuid.uuid5(_ORDER_NAMESPACE, f'{scope}:{key}')), True
+
+
+class DedupCache:
+    """Short-lived record of order IDs already written by this process"""
+
+    def __init__(self, ttl=600, max_size=10000):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def seen(self, order_id):
+        """True if order_id was completed within the TTL"""
+        with self._lock:
+            expires = self._entries.get(order_id)
+            if expires is None:
+                return False
+            if time.monotonic() >= expires:
+                del self._entries[order_id]
+                return False
+            return True
+
+    def add(self, order_id):
+        """Remember a completed order_id"""
+        with self._lock:
+            self._entries[order_id] = time.monotonic() + self.ttl
+            self._entries.move_to_end(order_id)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+"""
+Responsive image build step
+Dedupes static/images by content hash, writes resized JPEG/WebP/AVIF variants
+to static/images/build and a manifest used by the responsive_image() template helper
+"""
+
+import hashlib
+import json
+import os
+import sys
+
+from markupsafe import Markup, escape
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+STATIC_DIR = os.path.join(BASE_DIR, 'static')
+SOURCE_DIR = os.path.join(STATIC_DIR, 'images')
+BUILD_DIR = os.path.join(SOURCE_DIR, 'build')
+MANIFEST_PATH = os.path.join(BUILD_DIR, 'manifest.json')
+
+WIDTHS = (320, 640, 960)
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png')
+QUALITY = {'jpeg': 80, 'webp': 78, 'avif': 55}
+MIME_TYPES = {'jpeg': 'image/jpeg', 'webp': 'image/webp', 'avif': 'image/avif'}
+EXTENSIONS = {'jpeg': 'jpg', 'webp': 'webp', 'avif': 'avif'}
+DEFAULT_SIZES = '(max-width: 600px) 100vw, 250px'
+
+
+def file_hash(path):
+    """SHA-256 of a file's contents"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(65536), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def supported_formats():
+    """Output formats this Pillow build can encode"""
+    from PIL import features
+    formats = ['jpeg', 'webp'] if features.check('webp') else ['jpeg']
+    try:
+        import pillow_avif  # noqa: F401  (registers the AVIF plugin on older Pillow)
+    except ImportError:
+        pass
+    from PIL import Image
+    if 'AVIF' in Image.SAVE:
+        formats.append('avif')
+    return formats
+
+
+def build_variants(source, digest, formats):
+    """Write resized variants of one image; returns {format: [[width, path], ...]}"""
+    from PIL import Image, ImageOps
+    variants = {fmt: [] for fmt in formats}
+    with Image.open(source) as original:
+        image = ImageOps.exif_transpose(original).convert('RGB')
+        widths = [w for w in WIDTHS if w < image.width] or [image.width]
+        for width in widths:
+            height = round(image.height * width / image.width)
+            resized = image.resize((width, height), Image.LANCZOS)
+            for fmt in formats:
+                name = f'{digest[:12]}-{width}.{EXTENSIONS[fmt]}'
+                path = os.path.join(BUILD_DIR, name)
+                if not os.path.exists(path):
+                    resized.save(path, fmt.upper(), quality=QUALITY[fmt], optimize=True)
+                variants[fmt].append([width, f'images/build/{name}'])
+    return variants
+
+
+def build(formats=None):
+    """Build every variant and write the manifest"""
+    formats = formats or supported_formats()
+    os.makedirs(BUILD_DIR, exist_ok=True)
+    by_hash = {}
+    manifest = {'formats': formats, 'images': {}}
+    saved = 0
+    for name in sorted(os.listdir(SOURCE_DIR)):
+        source = os.path.join(SOURCE_DIR, name)
+        if not os.path.isfile(source) or not name.lower().endswith(IMAGE_EXTENSIONS):
+            continue
+        digest = file_hash(source)
+        if digest in by_hash:
+            saved += os.path.getsize(source)
+            print(f"♻️  {name}: duplicate of {by_hash[digest]['canonical']}")
+        else:
+            print(f"🖼️  {name}: building {', '.join(formats)} variants")
+            by_hash[digest] = {
+                'canonical': name,
+                'hash': digest,
+                'variants': build_variants(source, digest, formats)
+            }
+        manifest['images'][f'images/{name}'] = by_hash[digest]
+    with open(MANIFEST_PATH, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2)
+    print(f"\n✅ {len(by_hash)} unique images from {len(manifest['images'])} files "
+          f"({saved // 1024} KB of duplicates)")
+    return manifest
+
+
+def load_manifest(path=MANIFEST_PATH):
+    """Load the image manifest, or an empty one if the build step hasn't run"""
+    try:
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {'formats': [], 'images': {}}
+
+
+def make_responsive_image(manifest, static_url):
+    """Build the responsive_image(filename, alt, sizes) template helper"""
+    def srcset(variants):
+        return ', '.join(f'{static_url(path)} {width}w' for width, path in variants)
+
+    def responsive_image(filename, alt='', sizes=DEFAULT_SIZES, **attrs):
+        extra = ''.join(f' {escape(k)}="{escape(v)}"' for k, v in attrs.items())
+        entry = manifest['images'].get(filename)
+        if entry is None:
+            return Markup(f'<img src="{escape(static_url(filename))}" alt="{escape(alt)}" loading="lazy"{extra}>')
+        variants = entry['variants']
+        sources = ''.join(
+            f'<source type="{MIME_TYPES[fmt]}" srcset="{escape(srcset(variants[fmt]))}" sizes="{escape(sizes)}">'
+            for fmt in ('avif', 'webp') if variants.get(fmt)
+        )
+        fallback = variants['jpeg']
+        return Markup(
+            f'<picture>{sources}'
+            f'<img src="{escape(static_url(fallback[0][1]))}" srcset="{escape(srcset(fallback))}" '
+            f'sizes="{escape(sizes)}" alt="{escape(alt)}" loading="lazy"{extra}>'
+            f'</picture>'
+        )
+    return responsive_image
+
+
+def main():
+    """Main function"""
+    print("🖼️  Responsive Image Build")
+    print("=" * 50)
+    try:
+        build()
+    except ImportError:
+        print("❌ Pillow is required: pip3 install Pillow")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
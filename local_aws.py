@@ -0,0 +1,366 @@
+"""
+Local AWS stand-ins
+In-process DynamoDB tables and SES/SNS/STS clients with injectable latency,
+covering the calls the app makes, so it can run and be load-tested offline
+"""
+
+import copy
+import random
+import threading
+import time
+import uuid
+from collections import Counter
+from decimal import Decimal
+
+from boto3.dynamodb.types import TypeDeserializer, TypeSerializer
+from botocore.exceptions import ClientError
+
+import aws_clients
+
+# (hash key, range key) for each table, and its global secondary indexes
+TABLE_KEYS = {
+    'PickleUsers': ('email', None),
+    'PickleOrders': ('order_id', None),
+    'PickleContacts': ('contact_id', None),
+    'PickleCarts': ('cart_id', None),
+    'PickleAggregates': ('dimension', 'bucket')
+}
+TABLE_INDEXES = {
+    'PickleOrders': {'user_email-timestamp-index': ('user_email', 'timestamp')}
+}
+
+
+class Latency:
+    """Sleeps for about `ms` milliseconds (+/- `jitter` as a fraction) per simulated call"""
+
+    def __init__(self, ms=0.0, jitter=0.25):
+        self.ms = ms
+        self.jitter = jitter
+
+    def wait(self):
+        if self.ms > 0:
+            spread = self.ms * self.jitter
+            time.sleep(max(0.0, random.uniform(self.ms - spread, self.ms + spread)) / 1000.0)
+
+
+class CallCounter(Counter):
+    """Counter of simulated AWS calls, safe to bump from many threads"""
+
+    def __init__(self):
+        super().__init__()
+        self._lock = threading.Lock()
+
+    def add(self, name, amount=1):
+        with self._lock:
+            self[name] += amount
+
+
+_serializer = TypeSerializer()
+_deserializer = TypeDeserializer()
+
+
+def _error(code, message, operation):
+    return ClientError({'Error': {'Code': code, 'Message': message}}, operation)
+
+
+def _to_dynamo(value):
+    """Store numbers as Decimal, like the real resource returns them"""
+    if isinstance(value, bool) or value is None:
+        return value
+    if isinstance(value, (int, float)):
+        return Decimal(str(value))
+    if isinstance(value, dict):
+        return {k: _to_dynamo(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_to_dynamo(v) for v in value]
+    return value
+
+
+def _key_values(condition):
+    """{attribute: value} from a boto3 Key(...).eq(...) [& ...] condition"""
+    expression = condition.get_expression()
+    if expression['operator'] == 'AND':
+        values = {}
+        for part in expression['values']:
+            values.update(_key_values(part))
+        return values
+    if expression['operator'] != '=':
+        raise NotImplementedError(f"Key condition {expression['operator']} is not supported locally")
+    key, value = expression['values']
+    return {key.name: value}
+
+
+class _LocalBatchWriter:
+    """Context manager returned by LocalTable.batch_writer"""
+
+    def __init__(self, table):
+        self.table = table
+        self.items = []
+
+    def put_item(self, Item):
+        self.items.append(Item)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        if self.items and exc[0] is None:
+            self.table.batch_write(self.items)
+        return False
+
+
+class LocalTable:
+    """Thread-safe dict-backed stand-in for a boto3 DynamoDB Table"""
+
+    def __init__(self, name, hash_key, range_key=None, indexes=None, latency=None, calls=None):
+        self.name = name
+        self.hash_key = hash_key
+        self.range_key = range_key
+        self.indexes = indexes or {}
+        self.latency = latency or Latency()
+        self.calls = calls if calls is not None else CallCounter()
+        self._items = {}
+        self._lock = threading.Lock()
+
+    def _call(self, operation):
+        self.calls.add(f'{self.name}.{operation}')
+        self.latency.wait()
+
+    def _key(self, item):
+        return (item[self.hash_key], item.get(self.range_key) if self.range_key else None)
+
+    def _check(self, current, condition, values, operation):
+        # Supports the conditions the app writes: attribute_[not_]exists(a) and a = :v, joined by OR
+        if not condition:
+            return
+        for clause in condition.split(' OR '):
+            clause = clause.strip()
+            if clause.startswith('attribute_not_exists('):
+                if current is None or clause[21:-1] not in current:
+                    return
+            elif clause.startswith('attribute_exists('):
+                if current is not None and clause[17:-1] in current:
+                    return
+            else:
+                attribute, placeholder = [part.strip() for part in clause.split('=')]
+                if current is not None and current.get(attribute) == _to_dynamo((values or {})[placeholder]):
+                    return
+        raise _error('ConditionalCheckFailedException', 'The conditional request failed', operation)
+
+    def get_item(self, Key, **kwargs):
+        self._call('get_item')
+        with self._lock:
+            item = self._items.get(self._key(Key))
+            return {'Item': copy.deepcopy(item)} if item is not None else {}
+
+    def put_item(self, Item, ConditionExpression=None, ExpressionAttributeValues=None,
+                 ReturnValuesOnConditionCheckFailure=None, **kwargs):
+        self._call('put_item')
+        with self._lock:
+            key = self._key(Item)
+            current = self._items.get(key)
+            try:
+                self._check(current, ConditionExpression, ExpressionAttributeValues, 'PutItem')
+            except ClientError as e:
+                # Like DynamoDB, the old item comes back in wire format, even through a Table
+                if ReturnValuesOnConditionCheckFailure == 'ALL_OLD' and current is not None:
+                    e.response['Item'] = {k: _serializer.serialize(v) for k, v in current.items()}
+                raise
+            self._items[key] = _to_dynamo(copy.deepcopy(Item))
+        return {}
+
+    def batch_writer(self, overwrite_by_pkeys=None):
+        """Puts buffered and written as one BatchWriteItem call on exit"""
+        return _LocalBatchWriter(self)
+
+    def batch_write(self, items):
+        self._call('batch_write_item')
+        with self._lock:
+            for item in items:
+                self._items[self._key(item)] = _to_dynamo(copy.deepcopy(item))
+
+    def delete_item(self, Key, **kwargs):
+        self._call('delete_item')
+        with self._lock:
+            self._items.pop(self._key(Key), None)
+        return {}
+
+    def update_item(self, Key, UpdateExpression, ExpressionAttributeNames=None,
+                    ExpressionAttributeValues=None, **kwargs):
+        self._call('update_item')
+        names = ExpressionAttributeNames or {}
+        values = ExpressionAttributeValues or {}
+        action, _, assignments = UpdateExpression.partition(' ')
+        if action not in ('ADD', 'SET'):
+            raise NotImplementedError(f'{action} updates are not supported locally')
+        with self._lock:
+            item = self._items.setdefault(self._key(Key), _to_dynamo(dict(Key)))
+            for assignment in assignments.split(','):
+                if action == 'ADD':
+                    attribute, placeholder = assignment.split()
+                else:
+                    attribute, placeholder = [part.strip() for part in assignment.split('=')]
+                attribute = names.get(attribute, attribute)
+                value = _to_dynamo(values[placeholder])
+                item[attribute] = item.get(attribute, 0) + value if action == 'ADD' else value
+        return {}
+
+    def query(self, KeyConditionExpression, IndexName=None, ScanIndexForward=True,
+              Limit=None, ExclusiveStartKey=None, **kwargs):
+        self._call('query')
+        hash_key, range_key = self.indexes[IndexName] if IndexName else (self.hash_key, self.range_key)
+        wanted = _key_values(KeyConditionExpression)
+        with self._lock:
+            matches = [
+                copy.deepcopy(item) for item in self._items.values()
+                if all(item.get(k) == v for k, v in wanted.items())
+            ]
+        if range_key:
+            matches.sort(key=lambda item: item.get(range_key, ''), reverse=not ScanIndexForward)
+        if ExclusiveStartKey:
+            start = next((i for i, item in enumerate(matches)
+                          if all(item.get(k) == v for k, v in ExclusiveStartKey.items())), None)
+            matches = matches[start + 1:] if start is not None else matches
+        response = {'Items': matches[:Limit] if Limit else matches}
+        if Limit and len(matches) > Limit:
+            last = response['Items'][-1]
+            key_names = {self.hash_key, self.range_key, hash_key, range_key} - {None}
+            response['LastEvaluatedKey'] = {k: last[k] for k in key_names if k in last}
+        response['Count'] = len(response['Items'])
+        return response
+
+    def count(self):
+        """Number of stored items"""
+        with self._lock:
+            return len(self._items)
+
+
+class LocalDynamoDBClient:
+    """The few low-level DynamoDB client calls the app makes (health checks, sales increments)"""
+
+    def __init__(self, tables, latency=None, calls=None):
+        self.tables = tables
+        self.latency = latency or Latency()
+        self.calls = calls if calls is not None else CallCounter()
+        self._transaction_lock = threading.Lock()
+
+    def transact_write_items(self, TransactItems, **kwargs):
+        """Conditional Puts and Updates, all applied or (on a failed condition) none"""
+        self.calls.add('dynamodb.transact_write_items')
+        self.latency.wait()
+
+        def plain(values):
+            return {k: _deserializer.deserialize(v) for k, v in (values or {}).items()}
+
+        with self._transaction_lock:
+            reasons, failed = [], False
+            for action in TransactItems:
+                (kind, request), = action.items()
+                table = self.tables[request['TableName']]
+                key = request['Item'] if kind == 'Put' else request['Key']
+                with table._lock:
+                    current = table._items.get(table._key(plain(key)))
+                try:
+                    table._check(current, request.get('ConditionExpression'),
+                                 plain(request.get('ExpressionAttributeValues')), 'TransactWriteItems')
+                    reasons.append({'Code': 'None'})
+                except ClientError:
+                    reasons.append({'Code': 'ConditionalCheckFailed', 'Message': 'The conditional request failed'})
+                    failed = True
+            if failed:
+                error = _error('TransactionCanceledException', 'Transaction cancelled', 'TransactWriteItems')
+                error.response['CancellationReasons'] = reasons
+                raise error
+            for action in TransactItems:
+                (kind, request), = action.items()
+                table = self.tables[request['TableName']]
+                if kind == 'Put':
+                    table.put_item(Item=plain(request['Item']))
+                else:
+                    table.update_item(Key=plain(request['Key']), UpdateExpression=request['UpdateExpression'],
+                                      ExpressionAttributeNames=request.get('ExpressionAttributeNames'),
+                                      ExpressionAttributeValues=plain(request.get('ExpressionAttributeValues')))
+        return {}
+
+    def describe_table(self, TableName):
+        self.calls.add('dynamodb.describe_table')
+        self.latency.wait()
+        table = self.tables.get(TableName)
+        if table is None:
+            raise _error('ResourceNotFoundException', f'Table {TableName} not found', 'DescribeTable')
+        return {'Table': {'TableName': TableName, 'TableStatus': 'ACTIVE', 'ItemCount': table.count()}}
+
+
+class LocalSES:
+    """SES stand-in that records messages instead of sending them"""
+
+    def __init__(self, latency=None, calls=None):
+        self.latency = latency or Latency()
+        self.calls = calls if calls is not None else CallCounter()
+
+    def _call(self, operation, messages=1):
+        self.calls.add(f'ses.{operation}')
+        self.calls.add('ses.messages', messages)
+        self.latency.wait()
+        return {'MessageId': str(uuid.uuid4())}
+
+    def send_email(self, **kwargs):
+        return self._call('send_email')
+
+    def send_templated_email(self, **kwargs):
+        return self._call('send_templated_email')
+
+    def send_bulk_templated_email(self, Destinations, **kwargs):
+        self._call('send_bulk_templated_email', len(Destinations))
+        return {'Status': [{'Status': 'Success', 'MessageId': str(uuid.uuid4())} for _ in Destinations]}
+
+    def get_send_quota(self):
+        self.latency.wait()
+        return {'Max24HourSend': 50000.0, 'MaxSendRate': 14.0, 'SentLast24Hours': float(self.calls['ses.messages'])}
+
+
+class LocalSNS:
+    """SNS stand-in that records publishes"""
+
+    def __init__(self, latency=None, calls=None):
+        self.latency = latency or Latency()
+        self.calls = calls if calls is not None else CallCounter()
+
+    def publish(self, **kwargs):
+        self.calls.add('sns.publish')
+        self.latency.wait()
+        return {'MessageId': str(uuid.uuid4())}
+
+    def get_topic_attributes(self, TopicArn):
+        self.latency.wait()
+        return {'Attributes': {'TopicArn': TopicArn}}
+
+
+class LocalSTS:
+    def get_caller_identity(self):
+        return {'Account': '000000000000', 'Arn': 'arn:aws:iam::000000000000:user/local', 'UserId': 'LOCAL'}
+
+
+class LocalAWS:
+    """Every stand-in the app needs, sharing one call counter"""
+
+    def __init__(self, dynamodb_ms=0.0, ses_ms=0.0, sns_ms=0.0, jitter=0.25):
+        self.calls = CallCounter()
+        dynamodb_latency = Latency(dynamodb_ms, jitter)
+        self.tables = {
+            name: LocalTable(name, hash_key, range_key, TABLE_INDEXES.get(name),
+                             latency=dynamodb_latency, calls=self.calls)
+            for name, (hash_key, range_key) in TABLE_KEYS.items()
+        }
+        self.dynamodb = LocalDynamoDBClient(self.tables, dynamodb_latency, self.calls)
+        self.ses = LocalSES(Latency(ses_ms, jitter), self.calls)
+        self.sns = LocalSNS(Latency(sns_ms, jitter), self.calls)
+        self.sts = LocalSTS()
+
+    def install(self):
+        """Route this process's aws_clients lookups to the stand-ins"""
+        aws_clients.install(
+            clients={'dynamodb': self.dynamodb, 'ses': self.ses, 'sns': self.sns, 'sts': self.sts},
+            tables=self.tables
+        )
+        return self
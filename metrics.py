@@ -0,0 +1,113 @@
+"""
+Prometheus metrics
+Request, template and AWS call latency histograms plus retry/throttle/error
+counters; works across gunicorn workers when PROMETHEUS_MULTIPROC_DIR is set
+"""
+
+import os
+import time
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Gauge, Histogram, generate_latest
+)
+from prometheus_client import multiprocess
+
+# Most requests and AWS calls finish in 5-250 ms; the tail buckets catch timeouts
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.075, 0.1, 0.25, 0.5, 0.75, 1.0, 2.5, 5.0, 10.0)
+THROTTLE_ERRORS = {
+    'Throttling', 'ThrottlingException', 'ThrottledException', 'RequestLimitExceeded',
+    'ProvisionedThroughputExceededException', 'TooManyRequestsException', 'SlowDown'
+}
+
+REQUEST_LATENCY = Histogram(
+    'pickles_request_duration_seconds', 'HTTP request latency by endpoint',
+    ['method', 'endpoint', 'status'], buckets=LATENCY_BUCKETS
+)
+REQUESTS_IN_FLIGHT = Gauge(
+    'pickles_requests_in_flight', 'Requests currently being handled', multiprocess_mode='livesum'
+)
+TEMPLATE_LATENCY = Histogram(
+    'pickles_template_render_seconds', 'Jinja render time by template',
+    ['template'], buckets=LATENCY_BUCKETS
+)
+AWS_LATENCY = Histogram(
+    'pickles_aws_call_duration_seconds', 'AWS API call latency including retries',
+    ['service', 'operation'], buckets=LATENCY_BUCKETS
+)
+AWS_RETRIES = Counter(
+    'pickles_aws_retries_total', 'AWS API call retries', ['service', 'operation']
+)
+AWS_THROTTLES = Counter(
+    'pickles_aws_throttles_total', 'AWS API calls that ended throttled', ['service', 'operation']
+)
+AWS_ERRORS = Counter(
+    'pickles_aws_errors_total', 'AWS API calls that failed', ['service', 'operation', 'code']
+)
+ADMISSION_REJECTIONS = Counter(
+    'pickles_admission_rejections_total', 'Requests shed by admission control', ['endpoint', 'reason']
+)
+AWS_SLOT_TIMEOUTS = Counter(
+    'pickles_aws_slot_timeouts_total', 'AWS calls refused because every in-flight slot stayed busy'
+)
+WORKER_COLD_START = Histogram(
+    'pickles_worker_cold_start_seconds', 'Time from worker fork to accepting requests',
+    buckets=(0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+)
+
+# prometheus_client picks its storage when imported, so decide once here too
+MULTIPROCESS = bool(os.environ.get('PROMETHEUS_MULTIPROC_DIR'))
+
+_CALL = '_metrics_call'
+
+
+def _before_call(model, context, **kwargs):
+    context[_CALL] = (model.service_model.service_name, model.name, time.perf_counter())
+
+
+def _after_call(context, parsed, **kwargs):
+    call = context.pop(_CALL, None)
+    if call is None:
+        return
+    service, operation, start = call
+    AWS_LATENCY.labels(service, operation).observe(time.perf_counter() - start)
+    retries = parsed.get('ResponseMetadata', {}).get('RetryAttempts', 0)
+    if retries:
+        AWS_RETRIES.labels(service, operation).inc(retries)
+    code = parsed.get('Error', {}).get('Code')
+    if code:
+        AWS_ERRORS.labels(service, operation, code).inc()
+        if code in THROTTLE_ERRORS:
+            AWS_THROTTLES.labels(service, operation).inc()
+
+
+def _after_call_error(context, exception, **kwargs):
+    # Connection/timeout failures never produce a parsed response
+    call = context.pop(_CALL, None)
+    if call is None:
+        return
+    service, operation, start = call
+    AWS_LATENCY.labels(service, operation).observe(time.perf_counter() - start)
+    AWS_ERRORS.labels(service, operation, type(exception).__name__).inc()
+
+
+def instrument_aws(on_event):
+    """Record every AWS call through botocore's before-call/after-call events"""
+    on_event('before-call.*.*', _before_call)
+    on_event('after-call.*.*', _after_call)
+    on_event('after-call-error.*.*', _after_call_error)
+
+
+def render():
+    """(body, content type) for a Prometheus scrape, merged across workers if multiprocess"""
+    if MULTIPROCESS:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
+
+
+def mark_process_dead(pid):
+    """Drop a dead worker's live gauges (gunicorn child_exit hook)"""
+    if MULTIPROCESS:
+        multiprocess.mark_process_dead(pid)
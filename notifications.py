@@ -0,0 +1,329 @@
+"""
+Background notification dispatcher
+Delivers SNS/SES notifications off the request path
+"""
+
+import atexit
+import json
+import logging
+import queue
+import random
+import threading
+import time
+from datetime import datetime
+
+from botocore.exceptions import ClientError
+
+import email_templates
+from admission import TokenBucket
+
+logger = logging.getLogger(__name__)
+
+_STOP = object()
+_TEMPLATED = object()
+_GROUP = object()
+
+# SES accepts at most 50 destinations per SendBulkTemplatedEmail call
+BULK_BATCH_SIZE = 50
+
+
+class NotificationDispatcher:
+    """Bounded queue of SNS/SES sends drained by a small pool of worker threads"""
+
+    def __init__(self, sns_client, ses_client, source, topic_arn='',
+                 workers=2, max_queue_size=1000, max_retries=3, backoff_base=0.5, ses_send_rate=0):
+        self.sns = sns_client
+        self.ses = ses_client
+        self.source = source
+        self.topic_arn = topic_arn
+        self.workers = max(1, workers)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        # Pace SES sends to the account's MaxSendRate instead of tripping its throttle
+        self._ses_bucket = TokenBucket(ses_send_rate, ses_send_rate) if ses_send_rate > 0 else None
+        self._queue = queue.Queue(maxsize=max_queue_size)
+        self._threads = []
+        self._pending_retries = 0
+        self._templated = {}
+        self._lock = threading.Lock()
+        self._stats = {
+            'enqueued': 0,
+            'sent': 0,
+            'failed': 0,
+            'retried': 0,
+            'dropped': 0,
+            'send_time_total': 0.0,
+            'send_time_max': 0.0,
+        }
+
+    # Delivery -------------------------------------------------------------
+
+    def publish_sns(self, subject, message):
+        """Publish a message to the configured SNS topic"""
+        if self.topic_arn:
+            self.sns.publish(TopicArn=self.topic_arn, Message=message, Subject=subject)
+
+    def send_ses(self, to_email, subject, message):
+        """Send a plain-text email via SES"""
+        if self._ses_bucket is not None:
+            self._ses_bucket.acquire()
+        self.ses.send_email(
+            Source=self.source,
+            Destination={'ToAddresses': [to_email]},
+            Message={
+                'Subject': {'Data': subject},
+                'Body': {'Text': {'Data': message}}
+            }
+        )
+
+    def send_bulk_templated(self, template, batch):
+        """Send one SES template to up to 50 (to_email, data) destinations"""
+        if self._ses_bucket is not None:
+            self._ses_bucket.acquire(len(batch))
+        try:
+            response = self.ses.send_bulk_templated_email(
+                Source=self.source,
+                Template=template,
+                DefaultTemplateData='{}',
+                Destinations=[
+                    {
+                        'Destination': {'ToAddresses': [to_email]},
+                        'ReplacementTemplateData': json.dumps(data)
+                    }
+                    for to_email, data in batch
+                ]
+            )
+        except ClientError as e:
+            if e.response['Error']['Code'] != 'TemplateDoesNotExist':
+                raise
+            # Templates not registered yet, render locally instead
+            for to_email, data in batch:
+                subject, message = email_templates.render(template, data)
+                self.send_ses(to_email, subject, message)
+            return
+        for (to_email, _), status in zip(batch, response.get('Status', [])):
+            if status.get('Status') != 'Success':
+                logger.warning('Templated email %s to %s failed: %s',
+                               template, to_email, status.get('Error'))
+
+    def deliver(self, to_email, subject, message):
+        """Send synchronously via SNS and SES, raising on failure"""
+        self.publish_sns(subject, message)
+        self.send_ses(to_email, subject, message)
+
+    # Queueing -------------------------------------------------------------
+
+    def enqueue(self, to_email, subject, message):
+        """Queue an SNS + SES notification; returns False if the queue is full"""
+        jobs = [(self.send_ses, (to_email, subject, message))]
+        if self.topic_arn:
+            jobs.insert(0, (self.publish_sns, (subject, message)))
+        return self.submit(*jobs)
+
+    def enqueue_templated(self, to_email, template, data):
+        """Queue a templated SES email, batched with other sends of the same template"""
+        entry = (to_email, data)
+        with self._lock:
+            self._templated.setdefault(template, []).append(entry)
+        self._ensure_started()
+        try:
+            self._queue.put_nowait((_TEMPLATED, template))
+        except queue.Full:
+            with self._lock:
+                pending = self._templated.get(template, [])
+                index = next((i for i, queued in enumerate(pending) if queued is entry), None)
+                if index is not None:
+                    del pending[index]
+            if index is None:
+                # A worker draining an earlier marker already took it into a batch
+                self._bump('enqueued')
+                return True
+            self._bump('dropped')
+            logger.warning('Notification queue full, dropping %s email', template)
+            return False
+        self._bump('enqueued')
+        return True
+
+    def submit(self, *jobs):
+        """Queue (func, args) jobs, each retried independently; all are queued or none (False)"""
+        self._ensure_started()
+        # Several jobs share one queue slot, so a full queue can't take only some of them
+        entry = (jobs[0][0], jobs[0][1], 0) if len(jobs) == 1 else (_GROUP, jobs)
+        try:
+            self._queue.put_nowait(entry)
+        except queue.Full:
+            with self._lock:
+                self._stats['dropped'] += len(jobs)
+            logger.warning('Notification queue full, dropping %s', ', '.join(job[0].__name__ for job in jobs))
+            return False
+        with self._lock:
+            self._stats['enqueued'] += len(jobs)
+        return True
+
+    def _ensure_started(self):
+        if self._threads:
+            return
+        with self._lock:
+            if self._threads:
+                return
+            for i in range(self.workers):
+                thread = threading.Thread(target=self._run, name=f'notify-{i}', daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def _run(self):
+        while True:
+            job = self._queue.get()
+            try:
+                if job is _STOP:
+                    return
+                if job[0] is _TEMPLATED:
+                    self._drain_templated(job[1])
+                elif job[0] is _GROUP:
+                    for func, args in job[1]:
+                        self._execute(func, args, 0)
+                else:
+                    self._execute(*job)
+            finally:
+                self._queue.task_done()
+
+    def _drain_templated(self, template):
+        with self._lock:
+            pending = self._templated.get(template, [])
+            batch = pending[:BULK_BATCH_SIZE]
+            del pending[:BULK_BATCH_SIZE]
+        if batch:
+            self._execute(self.send_bulk_templated, (template, batch), 0)
+
+    def _execute(self, func, args, attempt):
+        started = time.perf_counter()
+        try:
+            func(*args)
+        except Exception as e:
+            if attempt >= self.max_retries:
+                self._bump('failed')
+                logger.error('Notification %s failed after %d attempts: %s',
+                             func.__name__, attempt + 1, e)
+                return
+            with self._lock:
+                self._stats['retried'] += 1
+                self._pending_retries += 1
+            delay = self.backoff_base * (2 ** attempt) * (0.5 + random.random())
+            timer = threading.Timer(delay, self._requeue, (func, args, attempt + 1))
+            timer.daemon = True
+            timer.start()
+            return
+        elapsed = time.perf_counter() - started
+        with self._lock:
+            self._stats['sent'] += 1
+            self._stats['send_time_total'] += elapsed
+            self._stats['send_time_max'] = max(self._stats['send_time_max'], elapsed)
+
+    def _requeue(self, func, args, attempt):
+        try:
+            self._queue.put_nowait((func, args, attempt))
+        except queue.Full:
+            with self._lock:
+                self._pending_retries -= 1
+            self._bump('dropped')
+            logger.warning('Notification queue full, dropping retry of %s', func.__name__)
+            return
+        with self._lock:
+            self._pending_retries -= 1
+
+    def _bump(self, key):
+        with self._lock:
+            self._stats[key] += 1
+
+    # Lifecycle ------------------------------------------------------------
+
+    def flush(self, timeout=None):
+        """Wait until queued notifications are processed; returns True if drained"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self._queue.unfinished_tasks or self._pending_retries:
+            if deadline is not None and time.monotonic() >= deadline:
+                return False
+            time.sleep(0.05)
+        return True
+
+    def shutdown(self, timeout=10):
+        """Drain the queue and stop worker threads"""
+        if not self._threads:
+            return True
+        drained = self.flush(timeout)
+        with self._lock:
+            threads, self._threads = self._threads, []
+        for _ in threads:
+            try:
+                self._queue.put(_STOP, timeout=1)
+            except queue.Full:
+                break
+        for thread in threads:
+            thread.join(timeout=1)
+        return drained
+
+    def register_shutdown(self, timeout=10):
+        """Flush pending notifications when the interpreter exits"""
+        atexit.register(self.shutdown, timeout)
+
+    def stats(self):
+        """Queue depth and send latency counters"""
+        with self._lock:
+            stats = dict(self._stats)
+        sent = stats.pop('sent')
+        total = stats.pop('send_time_total')
+        stats['sent'] = sent
+        stats['queue_depth'] = self._queue.qsize()
+        stats['workers'] = len(self._threads)
+        stats['avg_send_ms'] = round(total / sent * 1000, 2) if sent else 0.0
+        stats['max_send_ms'] = round(stats.pop('send_time_max') * 1000, 2)
+        return stats
+
+
+class AdminDigest:
+    """Coalesces admin notifications into periodic batched summaries"""
+
+    def __init__(self, dispatcher, to_email, window=60, max_items=20):
+        self.dispatcher = dispatcher
+        self.to_email = to_email
+        self.window = window
+        self.max_items = max(1, max_items)
+        self._items = []
+        self._timer = None
+        self._lock = threading.Lock()
+
+    def add(self, subject, message):
+        """Add a notification to the digest, sending immediately if digests are off"""
+        if self.window <= 0:
+            return self.dispatcher.enqueue(self.to_email, subject, message)
+        with self._lock:
+            self._items.append((datetime.utcnow().isoformat(), subject, message))
+            full = len(self._items) >= self.max_items
+            if not full and self._timer is None:
+                self._timer = threading.Timer(self.window, self.flush)
+                self._timer.daemon = True
+                self._timer.start()
+        if full:
+            self.flush()
+        return True
+
+    def flush(self):
+        """Send everything collected so far as one summary email"""
+        with self._lock:
+            items, self._items = self._items, []
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+        if not items:
+            return True
+        if len(items) == 1:
+            _, subject, message = items[0]
+            return self.dispatcher.enqueue(self.to_email, subject, message)
+        subject = f'Admin Digest - {len(items)} notifications'
+        sections = [f"[{timestamp}] {title}\n\n{body}" for timestamp, title, body in items]
+        message = f"{len(items)} notifications since {items[0][0]}\n\n" + ("\n\n" + "-" * 40 + "\n\n").join(sections)
+        return self.dispatcher.enqueue(self.to_email, subject, message)
+
+    def register_shutdown(self):
+        """Send the pending digest when the interpreter exits"""
+        atexit.register(self.flush)
@@ -0,0 +1,229 @@
+#!/usr/bin/env python3
+"""
+Order archive
+Moves old PickleOrders items in terminal states into gzipped JSONL files
+partitioned by order date, and reads them back by order_id or date range
+"""
+
+import argparse
+import gzip
+import json
+import os
+import sqlite3
+import sys
+import time
+import uuid
+from collections import defaultdict
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+from boto3.dynamodb.types import TypeSerializer
+from dotenv import load_dotenv
+
+import aws_clients
+import order_export
+
+# The only final state the app writes: /checkout orders are complete when stored, while
+# /order orders stay 'pending' (nothing moves them on), so they are never archived
+TERMINAL_STATUSES = ('checkout_completed',)
+# BatchWriteItem accepts at most 25 delete requests per call
+DELETE_BATCH_SIZE = 25
+# The index keeps each order's JSON next to its keys, so a lookup or a page of one
+# user's history reads just its own rows; the part files are the portable copy
+INDEX_SCHEMA = """
+CREATE TABLE IF NOT EXISTS orders (
+    order_id TEXT PRIMARY KEY,
+    day TEXT NOT NULL,
+    file TEXT NOT NULL,
+    user_email TEXT,
+    timestamp TEXT NOT NULL,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS orders_day ON orders (day, timestamp);
+CREATE INDEX IF NOT EXISTS orders_user ON orders (user_email, timestamp);
+"""
+
+
+def order_day(order):
+    """Partition date (YYYY-MM-DD) of an order, from its ISO timestamp"""
+    return str(order.get('timestamp', ''))[:10]
+
+
+class OrderArchive:
+    """Date-partitioned order files under `directory`, with a SQLite index that also holds each order"""
+
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self._index = sqlite3.connect(os.path.join(directory, 'index.db'), check_same_thread=False)
+        self._index.executescript(INDEX_SCHEMA)
+
+    def close(self):
+        self._index.close()
+
+    def _partition(self, day):
+        return os.path.join(self.directory, f'day={day}')
+
+    def archived(self, order_ids):
+        """The subset of order_ids already in the archive"""
+        found = set()
+        order_ids = list(order_ids)
+        for start in range(0, len(order_ids), 500):
+            chunk = order_ids[start:start + 500]
+            rows = self._index.execute(
+                f"SELECT order_id FROM orders WHERE order_id IN ({','.join('?' * len(chunk))})", chunk
+            )
+            found.update(row[0] for row in rows)
+        return found
+
+    def write(self, day, orders):
+        """Write one day's orders to a new part file and index them; returns its path"""
+        folder = self._partition(day)
+        os.makedirs(folder, exist_ok=True)
+        name = f"orders-{time.strftime('%Y%m%dT%H%M%S')}-{uuid.uuid4().hex[:8]}.jsonl.gz"
+        path = os.path.join(folder, name)
+        lines = list(order_export.to_ndjson(orders))
+        # Written under a temporary name and renamed, so readers never see a partial file
+        with open(path + '.tmp', 'wb') as raw:
+            with gzip.GzipFile(fileobj=raw, mode='wb') as f:
+                for line in lines:
+                    f.write(line.encode('utf-8'))
+            raw.flush()
+            os.fsync(raw.fileno())
+        os.replace(path + '.tmp', path)
+        relative = os.path.relpath(path, self.directory)
+        # Readers only see what the index holds: a part file renamed into place but never
+        # indexed (crash mid-write) is invisible and simply written again by the next run
+        with self._index:
+            self._index.executemany(
+                'INSERT OR REPLACE INTO orders (order_id, day, file, user_email, timestamp, data) '
+                'VALUES (?, ?, ?, ?, ?, ?)',
+                [
+                    (order['order_id'], day, relative, order.get('user_email'), str(order.get('timestamp', '')), line)
+                    for order, line in zip(orders, lines)
+                ]
+            )
+        return path
+
+    def _orders(self, sql, params=()):
+        return [json.loads(row[0], parse_float=Decimal) for row in self._index.execute(sql, params)]
+
+    def get(self, order_id):
+        """An archived order, or None"""
+        orders = self._orders('SELECT data FROM orders WHERE order_id = ?', (order_id,))
+        return orders[0] if orders else None
+
+    def for_user(self, user_email, offset=0, limit=None):
+        """One account's archived orders (by user_email), newest first, `limit` from `offset`"""
+        return self._orders(
+            'SELECT data FROM orders WHERE user_email = ? ORDER BY timestamp DESC, order_id LIMIT ? OFFSET ?',
+            (user_email, -1 if limit is None else limit, offset)
+        )
+
+    def days(self):
+        """Partition dates present in the archive, oldest first"""
+        return [row[0] for row in self._index.execute('SELECT DISTINCT day FROM orders ORDER BY day')]
+
+    def query(self, start=None, end=None, email=None):
+        """Archived orders dated start..end (inclusive YYYY-MM-DD), oldest first, optionally for one email"""
+        for day in self.days():
+            if (start and day < start) or (end and day > end):
+                continue
+            for order in self._orders('SELECT data FROM orders WHERE day = ? ORDER BY timestamp', (day,)):
+                if email is None or order.get('email') == email:
+                    yield order
+
+
+def delete_orders(client, table_name, order_ids, max_retries=8):
+    """Batch-delete orders by key, retrying UnprocessedItems and throttling with backoff"""
+    serializer = TypeSerializer()
+    order_ids = list(order_ids)
+    for start in range(0, len(order_ids), DELETE_BATCH_SIZE):
+        aws_clients.write_batch(client, table_name, [
+            {'DeleteRequest': {'Key': {'order_id': serializer.serialize(order_id)}}}
+            for order_id in order_ids[start:start + DELETE_BATCH_SIZE]
+        ], max_retries)
+
+
+def archive_orders(client, archive, table_name='PickleOrders', older_than_days=180,
+                   statuses=TERMINAL_STATUSES, segments=8, flush_every=5000, dry_run=False):
+    """Move terminal orders older than `older_than_days` from the table into the archive
+
+    Orders are written and indexed before they are deleted, and orders already
+    in the index are only deleted, so an interrupted run can simply be rerun.
+    """
+    cutoff = (datetime.utcnow() - timedelta(days=older_than_days)).isoformat()
+    statuses = set(statuses)
+    pending = defaultdict(list)
+    stats = {'scanned': 0, 'archived': 0, 'deleted': 0}
+
+    def flush(day):
+        orders = pending.pop(day)
+        if dry_run:
+            stats['archived'] += len(orders)
+            return
+        already = archive.archived(order['order_id'] for order in orders)
+        fresh = [order for order in orders if order['order_id'] not in already]
+        if fresh:
+            archive.write(day, fresh)
+            stats['archived'] += len(fresh)
+        delete_orders(client, table_name, [order['order_id'] for order in orders])
+        stats['deleted'] += len(orders)
+
+    for order in order_export.parallel_scan(client, table_name, segments=segments):
+        stats['scanned'] += 1
+        timestamp = str(order.get('timestamp', ''))
+        if order.get('status') not in statuses or not timestamp or timestamp >= cutoff:
+            continue
+        day = order_day(order)
+        pending[day].append(order)
+        if len(pending[day]) >= flush_every:
+            flush(day)
+    for day in sorted(pending):
+        flush(day)
+    return stats
+
+
+def main():
+    """Main function"""
+    load_dotenv()
+    parser = argparse.ArgumentParser(description='Archive old PickleOrders or read the archive')
+    parser.add_argument('--dir', default=os.environ.get('ARCHIVE_DIR', 'archive/orders'),
+                        help='archive directory (default: ARCHIVE_DIR or archive/orders)')
+    parser.add_argument('--older-than-days', type=int, default=int(os.environ.get('ARCHIVE_AFTER_DAYS', 180)))
+    parser.add_argument('--statuses', default=os.environ.get('ARCHIVE_STATUSES', ','.join(TERMINAL_STATUSES)),
+                        help='comma-separated terminal order statuses')
+    parser.add_argument('--segments', type=int, default=8, help='parallel scan segments (default: 8)')
+    parser.add_argument('--table', default='PickleOrders')
+    parser.add_argument('--dry-run', action='store_true', help='count what would be archived, change nothing')
+    parser.add_argument('--get', metavar='ORDER_ID', help='print one archived order')
+    parser.add_argument('--from', dest='start', metavar='YYYY-MM-DD', help='print archived orders from this date')
+    parser.add_argument('--to', dest='end', metavar='YYYY-MM-DD', help='...up to and including this date')
+    parser.add_argument('--email', help='only orders placed with this email')
+    args = parser.parse_args()
+
+    archive = OrderArchive(args.dir)
+    if args.get:
+        order = archive.get(args.get)
+        if order is None:
+            print(f"❌ Order {args.get} is not in the archive", file=sys.stderr)
+            sys.exit(1)
+        print(next(order_export.to_ndjson([order])), end='')
+        return
+    if args.start or args.end or args.email:
+        for line in order_export.to_ndjson(archive.query(args.start, args.end, args.email)):
+            sys.stdout.write(line)
+        return
+
+    statuses = [s.strip() for s in args.statuses.split(',') if s.strip()]
+    print(f"📦 Archiving {', '.join(statuses)} orders older than {args.older_than_days} days to {args.dir}"
+          + (" (dry run)" if args.dry_run else ""))
+    started = time.time()
+    stats = archive_orders(aws_clients.get_client('dynamodb'), archive, args.table, args.older_than_days,
+                           statuses, args.segments, dry_run=args.dry_run)
+    print(f"✅ Scanned {stats['scanned']:,} orders, archived {stats['archived']:,}, "
+          f"deleted {stats['deleted']:,} in {time.time() - started:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+"""
+Order export
+Streams PickleOrders out with a parallel segmented Scan as NDJSON or CSV
+"""
+
+import argparse
+import csv
+import io
+import json
+import queue
+import sys
+import threading
+from decimal import Decimal
+
+from boto3.dynamodb.types import TypeDeserializer
+from dotenv import load_dotenv
+
+import aws_clients
+
+CSV_FIELDS = [
+    'order_id', 'timestamp', 'status', 'source', 'name', 'email', 'phone', 'address',
+    'city', 'pincode', 'item', 'sku', 'quantity', 'unit_price', 'total_amount', 'items', 'notes'
+]
+# Bookkeeping attributes kept on stored orders but never handed out
+INTERNAL_FIELDS = frozenset({'write_token'})
+
+_DONE = object()
+
+
+def _json_default(value):
+    if isinstance(value, Decimal):
+        return int(value) if value == value.to_integral_value() else float(value)
+    if isinstance(value, set):
+        return sorted(value)
+    raise TypeError(f'Cannot serialize {type(value).__name__}')
+
+
+def parallel_scan(client, table_name, segments=8, fields=None, page_size=1000):
+    """Yield every item of a table, scanning `segments` segments concurrently
+
+    Pages flow through a small bounded queue, so memory stays constant no
+    matter how large the table is; closing the generator stops the workers.
+    """
+    deserializer = TypeDeserializer()
+    pages = queue.Queue(maxsize=segments * 2)
+    stop = threading.Event()
+    scan_args = {'TableName': table_name, 'TotalSegments': segments, 'Limit': page_size}
+    if fields:
+        names = {f'#f{i}': field for i, field in enumerate(fields)}
+        scan_args['ProjectionExpression'] = ', '.join(names)
+        scan_args['ExpressionAttributeNames'] = names
+
+    def put(page):
+        while not stop.is_set():
+            try:
+                pages.put(page, timeout=0.5)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def worker(segment):
+        try:
+            args = dict(scan_args, Segment=segment)
+            while not stop.is_set():
+                response = client.scan(**args)
+                if not put(response.get('Items', [])):
+                    return
+                if 'LastEvaluatedKey' not in response:
+                    break
+                args['ExclusiveStartKey'] = response['LastEvaluatedKey']
+        except Exception as e:
+            put(e)
+        finally:
+            put(_DONE)
+
+    threads = [threading.Thread(target=worker, args=(segment,), daemon=True) for segment in range(segments)]
+    for thread in threads:
+        thread.start()
+    try:
+        remaining = segments
+        while remaining:
+            page = pages.get()
+            if page is _DONE:
+                remaining -= 1
+            elif isinstance(page, Exception):
+                raise page
+            else:
+                for item in page:
+                    yield {k: deserializer.deserialize(v) for k, v in item.items()}
+    finally:
+        stop.set()
+
+
+def public(item):
+    """An order without its internal bookkeeping attributes"""
+    return {k: v for k, v in item.items() if k not in INTERNAL_FIELDS}
+
+
+def to_ndjson(items):
+    """One JSON object per line"""
+    for item in items:
+        yield json.dumps(public(item), default=_json_default, ensure_ascii=False) + '\n'
+
+
+def to_csv(items, fields=None):
+    """CSV rows with a header; nested values are written as JSON"""
+    fields = [f for f in fields or CSV_FIELDS if f not in INTERNAL_FIELDS]
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=fields, extrasaction='ignore')
+    writer.writeheader()
+    for item in items:
+        writer.writerow({
+            k: json.dumps(v, default=_json_default) if isinstance(v, (list, dict, set)) else v
+            for k, v in public(item).items()
+        })
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate(0)
+    yield buffer.getvalue()
+
+
+def export_orders(client, table_name='PickleOrders', file_format='ndjson', segments=8, fields=None):
+    """Generator of NDJSON or CSV text chunks for every order"""
+    items = parallel_scan(client, table_name, segments=segments, fields=fields)
+    return to_csv(items, fields) if file_format == 'csv' else to_ndjson(items)
+
+
+def main():
+    """Main function"""
+    load_dotenv()
+    parser = argparse.ArgumentParser(description='Export PickleOrders as NDJSON or CSV')
+    parser.add_argument('--format', choices=['ndjson', 'csv'], default='ndjson')
+    parser.add_argument('--segments', type=int, default=8, help='parallel scan segments (default: 8)')
+    parser.add_argument('--fields', help='comma-separated attributes to export (default: all)')
+    parser.add_argument('--table', default='PickleOrders')
+    parser.add_argument('--output', help='output file (default: stdout)')
+    args = parser.parse_args()
+
+    fields = [f.strip() for f in args.fields.split(',') if f.strip()] if args.fields else None
+    client = aws_clients.get_client('dynamodb')
+    out = open(args.output, 'w', encoding='utf-8', newline='') if args.output else sys.stdout
+    try:
+        for chunk in export_orders(client, args.table, args.format, args.segments, fields):
+            out.write(chunk)
+    finally:
+        if out is not sys.stdout:
+            out.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,291 @@
+"""
+Durable outbox
+Writes and notifications are committed to a local SQLite log at request time and
+pushed to DynamoDB/SNS/SES by a background drainer, in batches, with retries
+"""
+
+import json
+import logging
+import os
+import random
+import sqlite3
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS outbox (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    kind TEXT NOT NULL,
+    dedup_key TEXT UNIQUE,
+    payload TEXT NOT NULL,
+    parent_id INTEGER,
+    state TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt REAL NOT NULL DEFAULT 0,
+    claimed_until REAL NOT NULL DEFAULT 0,
+    created_at REAL NOT NULL,
+    last_error TEXT
+);
+CREATE INDEX IF NOT EXISTS outbox_ready ON outbox (state, parent_id, next_attempt);
+CREATE INDEX IF NOT EXISTS outbox_parent ON outbox (parent_id);
+"""
+
+# A handler returns one outcome per payload: DONE, DUPLICATE (the write had already
+# happened, so its follow-ups are dropped) or an Exception to retry that entry
+DONE = True
+DUPLICATE = False
+
+# Entries a drainer may claim now (parameters: now, now)
+READY = "WHERE state = 'pending' AND parent_id IS NULL AND next_attempt <= ? AND claimed_until <= ?"
+
+
+def _json_default(value):
+    # Decimals go out as JSON numbers and come back as Decimals (payloads load with parse_float=Decimal)
+    if isinstance(value, Decimal):
+        return int(value) if value == value.to_integral_value() else float(value)
+    raise TypeError(f'Cannot serialize {type(value).__name__}')
+
+
+class Outbox:
+    """SQLite-backed queue of pending side effects, drained by `drainers` threads per process"""
+
+    def __init__(self, path, batch_size=50, drainers=4, concurrency=8, poll_interval=0.5, lease=60,
+                 backoff_base=1.0, max_backoff=300, max_attempts=8):
+        self.path = path
+        self.batch_size = batch_size
+        self.drainers = drainers
+        self.concurrency = concurrency
+        self.poll_interval = poll_interval
+        self.lease = lease
+        self.backoff_base = backoff_base
+        self.max_backoff = max_backoff
+        # Only kinds registered with durable=False are given up on after max_attempts
+        self.max_attempts = max_attempts
+        self._handlers = {}
+        self._local = threading.local()
+        self._wake = threading.Event()
+        self._lock = threading.Lock()
+        # Writers in this process queue here rather than in SQLite's sleeping busy handler
+        self._write_lock = threading.Lock()
+        self._threads = []
+        self._pool = None
+        self._pid = None
+        self._stats = defaultdict(int)
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._connect().executescript(SCHEMA)
+
+    def _write(self, statements):
+        """Run statements(conn) in one immediate transaction; returns its result"""
+        conn = self._connect()
+        with self._write_lock:
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                result = statements(conn)
+                conn.execute('COMMIT')
+            except Exception:
+                conn.execute('ROLLBACK')
+                raise
+        return result
+
+    def _connect(self):
+        # One connection per thread (and per forked process)
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=FULL')
+            self._local.conn, self._local.pid = conn, os.getpid()
+        return conn
+
+    def register(self, kind, handler, durable=True):
+        """Drain entries of `kind` with handler(payloads) -> [outcome, ...]"""
+        self._handlers[kind] = (handler, durable)
+
+    def register_each(self, kind, func, durable=True):
+        """Drain entries of `kind` one payload at a time, `concurrency` at once; func returns DUPLICATE or anything else"""
+        def handler(payloads):
+            futures = [self._pool.submit(func, payload) for payload in payloads]
+            outcomes = []
+            for future in futures:
+                try:
+                    outcomes.append(DUPLICATE if future.result() is DUPLICATE else DONE)
+                except Exception as e:
+                    outcomes.append(e)
+            return outcomes
+        self.register(kind, handler, durable)
+
+    # Producing ------------------------------------------------------------
+
+    def add(self, kind, payload, dedup_key=None, children=()):
+        """Commit an entry (plus follow-ups that run once it succeeds); None if dedup_key was seen"""
+        now = time.time()
+        encoded_children = [(child_kind, json.dumps(child, default=_json_default)) for child_kind, child in children]
+        encoded = json.dumps(payload, default=_json_default)
+
+        def insert(conn):
+            cursor = conn.execute(
+                'INSERT OR IGNORE INTO outbox (kind, dedup_key, payload, created_at) VALUES (?, ?, ?, ?)',
+                (kind, dedup_key, encoded, now)
+            )
+            if cursor.rowcount == 0:
+                return None
+            entry_id = cursor.lastrowid
+            conn.executemany(
+                'INSERT INTO outbox (kind, payload, parent_id, created_at) VALUES (?, ?, ?, ?)',
+                [(child_kind, child, entry_id, now) for child_kind, child in encoded_children]
+            )
+            return entry_id
+
+        entry_id = self._write(insert)
+        if entry_id is not None:
+            self._wake.set()
+        return entry_id
+
+    # Draining -------------------------------------------------------------
+
+    def _running(self):
+        return self._pid == os.getpid() and any(thread.is_alive() for thread in self._threads)
+
+    def start(self):
+        """Start this process's drainer threads if they are not running"""
+        if self._running():
+            return
+        with self._lock:
+            if self._running():
+                return
+            self._pid = os.getpid()
+            self._pool = ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix='outbox')
+            self._threads = [
+                threading.Thread(target=self._run, name=f'outbox-drainer-{i}', daemon=True)
+                for i in range(self.drainers)
+            ]
+            for thread in self._threads:
+                thread.start()
+
+    def _run(self):
+        while True:
+            try:
+                if self.drain_once():
+                    continue
+            except Exception:
+                logger.exception('Outbox drain failed')
+            self._wake.wait(self.poll_interval)
+            self._wake.clear()
+
+    def _claim(self):
+        now = time.time()
+        # A plain read first (WAL readers never block writers), so an idle drainer doesn't
+        # take the write lock that outbox.add needs on the request path
+        ready = self._connect().execute(
+            "SELECT 1 FROM outbox " + READY + " LIMIT 1", (now, now)
+        ).fetchone()
+        if ready is None:
+            return []
+
+        def claim(conn):
+            rows = conn.execute(
+                "SELECT id, kind, payload, attempts FROM outbox " + READY + " ORDER BY id LIMIT ?",
+                (now, now, self.batch_size)
+            ).fetchall()
+            conn.executemany('UPDATE outbox SET claimed_until = ? WHERE id = ?',
+                             [(now + self.lease, row[0]) for row in rows])
+            return rows
+
+        return self._write(claim)
+
+    def drain_once(self):
+        """Process one batch of ready entries; returns how many were claimed"""
+        rows = self._claim()
+        by_kind = defaultdict(list)
+        for row in rows:
+            by_kind[row[1]].append(row)
+
+        done, duplicates, failed = [], [], []
+        for kind, entries in by_kind.items():
+            handler, durable = self._handlers.get(kind, (None, True))
+            if handler is None:
+                failed.extend((row, durable, f'No handler for {kind}') for row in entries)
+                continue
+            payloads = [json.loads(row[2], parse_float=Decimal) for row in entries]
+            try:
+                outcomes = handler(payloads)
+            except Exception as e:
+                outcomes = [e] * len(entries)
+            for row, outcome in zip(entries, outcomes):
+                if isinstance(outcome, Exception):
+                    failed.append((row, durable, f'{type(outcome).__name__}: {outcome}'))
+                elif outcome is DUPLICATE:
+                    duplicates.append(row[0])
+                else:
+                    done.append(row[0])
+        self._settle(done, duplicates, failed)
+        return len(rows)
+
+    def _settle(self, done, duplicates, failed):
+        if not (done or duplicates or failed):
+            return
+        now = time.time()
+
+        def settle(conn):
+            # Follow-ups of a completed write become ready; those of a duplicate are dropped
+            conn.executemany('UPDATE outbox SET parent_id = NULL WHERE parent_id = ?', [(i,) for i in done])
+            conn.executemany('DELETE FROM outbox WHERE parent_id = ?', [(i,) for i in duplicates])
+            conn.executemany('DELETE FROM outbox WHERE id = ?', [(i,) for i in done + duplicates])
+            for (entry_id, kind, _, attempts), durable, error in failed:
+                attempts += 1
+                if not durable and attempts >= self.max_attempts:
+                    conn.execute("UPDATE outbox SET state = 'dead', attempts = ?, last_error = ? WHERE id = ?",
+                                 (attempts, error, entry_id))
+                    logger.error('Outbox %s entry %d dead after %d attempts: %s', kind, entry_id, attempts, error)
+                    continue
+                delay = min(self.max_backoff, self.backoff_base * (2 ** (attempts - 1))) * (0.5 + random.random())
+                conn.execute(
+                    'UPDATE outbox SET attempts = ?, next_attempt = ?, claimed_until = 0, last_error = ? WHERE id = ?',
+                    (attempts, now + delay, error, entry_id)
+                )
+
+        self._write(settle)
+        with self._lock:
+            self._stats['done'] += len(done)
+            self._stats['duplicates'] += len(duplicates)
+            self._stats['retried'] += len(failed)
+
+    # Inspection -----------------------------------------------------------
+
+    def pending(self):
+        """Entries not yet delivered (dead ones excluded)"""
+        return self._connect().execute("SELECT COUNT(*) FROM outbox WHERE state = 'pending'").fetchone()[0]
+
+    def flush(self, timeout=10):
+        """Wait up to `timeout` seconds for the drainer to empty the outbox; True if it did"""
+        self.start()
+        deadline = time.monotonic() + timeout
+        while self.pending():
+            if time.monotonic() >= deadline:
+                return False
+            self._wake.set()
+            time.sleep(0.05)
+        return True
+
+    def stats(self):
+        """Backlog by kind and state, age of the oldest pending entry, drainer counters"""
+        conn = self._connect()
+        backlog = defaultdict(dict)
+        for kind, state, count in conn.execute('SELECT kind, state, COUNT(*) FROM outbox GROUP BY kind, state'):
+            backlog[state][kind] = count
+        oldest = conn.execute("SELECT MIN(created_at) FROM outbox WHERE state = 'pending'").fetchone()[0]
+        with self._lock:
+            counters = dict(self._stats)
+        return {
+            'pending': backlog.get('pending', {}),
+            'dead': backlog.get('dead', {}),
+            'oldest_pending_s': round(time.time() - oldest, 1) if oldest else 0.0,
+            'drained_by_this_process': counters,
+            'drainers_running': self._pid == os.getpid() and sum(thread.is_alive() for thread in self._threads)
+        }
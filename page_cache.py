@@ -0,0 +1,74 @@
+"""
+Rendered page cache
+Keeps rendered HTML for pages that only change on deploy and answers
+conditional requests with 304 Not Modified
+"""
+
+import hashlib
+import threading
+
+from flask import request, render_template, make_response
+
+
+class PageCache:
+    """Rendered templates keyed by template name, holding only the latest caller-supplied version"""
+
+    def __init__(self, max_age=300, enabled=True):
+        self.max_age = max_age
+        self.enabled = enabled
+        self._pages = {}
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'misses': 0, 'not_modified': 0}
+
+    def _get(self, template, key, context):
+        cached = self._pages.get(template) if self.enabled else None
+        if cached is not None and cached[0] == key:
+            self._bump('hits')
+            return cached[1]
+        body = render_template(template, **context).encode('utf-8')
+        page = (body, hashlib.sha256(body).hexdigest()[:32])
+        if self.enabled:
+            # A new version (e.g. a catalog reload) replaces the old page, so the cache
+            # never holds more than one entry per template
+            with self._lock:
+                self._pages[template] = (key, page)
+        self._bump('misses')
+        return page
+
+    def render(self, template, key=None, private=False, **context):
+        """Render (or reuse) a page, returning 304 if the client's copy is current"""
+        body, etag = self._get(template, key, context)
+        if request.if_none_match.contains(etag):
+            self._bump('not_modified')
+            response = make_response('', 304)
+        else:
+            response = make_response(body)
+            response.mimetype = 'text/html'
+        response.set_etag(etag)
+        visibility = 'private' if private else 'public'
+        response.headers['Cache-Control'] = f'{visibility}, max-age={self.max_age}'
+        return response
+
+    def render_error(self, template, status, key=None, **context):
+        """Render (or reuse) an error page body with the given status"""
+        body, _ = self._get(template, key, context)
+        response = make_response(body, status)
+        response.mimetype = 'text/html'
+        response.headers['Cache-Control'] = 'no-cache'
+        return response
+
+    def clear(self):
+        """Drop every cached page"""
+        with self._lock:
+            self._pages.clear()
+
+    def _bump(self, key):
+        with self._lock:
+            self._stats[key] += 1
+
+    def stats(self):
+        """Hit/miss counters and number of cached pages"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats['pages'] = len(self._pages)
+        return stats
@@ -0,0 +1,177 @@
+"""
+Request profiling
+Statistical stack sampling of request threads: per-request profiles written as
+collapsed stacks and speedscope JSON, plus an always-on aggregate of hot frames
+"""
+
+import json
+import os
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+
+MAX_DEPTH = 128
+
+
+def _frame_name(code):
+    return f'{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})'
+
+
+def _stack(frame):
+    """Root-to-leaf tuple of function names for a frame"""
+    names = []
+    while frame is not None and len(names) < MAX_DEPTH:
+        names.append(_frame_name(frame.f_code))
+        frame = frame.f_back
+    return tuple(reversed(names))
+
+
+class StackSampler:
+    """Samples the stacks of registered threads every `interval` seconds on one background thread"""
+
+    def __init__(self, interval=0.01, keep_totals=False, max_stacks=20000):
+        self.interval = interval
+        self.keep_totals = keep_totals
+        self.max_stacks = max_stacks
+        self.totals = Counter()
+        self.requests = 0
+        self._threads = {}
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+
+    def add(self, thread_id):
+        """Start sampling a thread"""
+        with self._lock:
+            self._threads[thread_id] = Counter()
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='stack-sampler', daemon=True)
+                self._thread.start()
+            self._wake.set()
+
+    def remove(self, thread_id):
+        """Stop sampling a thread and return its {stack: samples}"""
+        with self._lock:
+            counts = self._threads.pop(thread_id, None) or Counter()
+            if self.keep_totals and counts:
+                self.requests += 1
+                for stack, count in counts.items():
+                    # Past the cap, only stacks already seen keep counting
+                    if stack in self.totals or len(self.totals) < self.max_stacks:
+                        self.totals[stack] += count
+        return counts
+
+    def reset(self):
+        """Forget the aggregate"""
+        with self._lock:
+            self.totals = Counter()
+            self.requests = 0
+
+    def _run(self):
+        own = threading.get_ident()
+        while True:
+            with self._lock:
+                idle = not self._threads
+                if idle:
+                    self._wake.clear()
+            if idle:
+                self._wake.wait()
+                continue
+            started = time.perf_counter()
+            frames = sys._current_frames()
+            with self._lock:
+                for thread_id, counts in self._threads.items():
+                    frame = frames.get(thread_id)
+                    if frame is not None and thread_id != own:
+                        counts[_stack(frame)] += 1
+            del frames
+            time.sleep(max(0.0, self.interval - (time.perf_counter() - started)))
+
+    def snapshot(self):
+        """Copy of the aggregate {stack: samples}"""
+        with self._lock:
+            return Counter(self.totals)
+
+    def hot_frames(self, limit=25):
+        """Functions with the most samples, by self time (leaf) and total time (anywhere on the stack)"""
+        with self._lock:
+            totals = Counter(self.totals)
+            requests = self.requests
+        self_counts, total_counts = Counter(), Counter()
+        for stack, count in totals.items():
+            self_counts[stack[-1]] += count
+            for name in set(stack):
+                total_counts[name] += count
+        samples = sum(totals.values()) or 1
+        return {
+            'requests': requests,
+            'samples': sum(totals.values()),
+            'interval_ms': self.interval * 1000,
+            'self': [
+                {'frame': name, 'samples': count, 'percent': round(count * 100.0 / samples, 2)}
+                for name, count in self_counts.most_common(limit)
+            ],
+            'total': [
+                {'frame': name, 'samples': count, 'percent': round(count * 100.0 / samples, 2)}
+                for name, count in total_counts.most_common(limit)
+            ]
+        }
+
+
+def to_collapsed(counts):
+    """Brendan Gregg collapsed-stack text (flamegraph.pl, speedscope, inferno)"""
+    return ''.join(f"{';'.join(stack)} {count}\n" for stack, count in counts.most_common())
+
+
+def to_speedscope(counts, name, interval):
+    """speedscope 'sampled' profile JSON"""
+    frames, index = [], {}
+    samples, weights = [], []
+    for stack, count in counts.most_common():
+        row = []
+        for frame in stack:
+            if frame not in index:
+                index[frame] = len(frames)
+                frames.append({'name': frame})
+            row.append(index[frame])
+        samples.append(row)
+        weights.append(count * interval)
+    return {
+        '$schema': 'https://www.speedscope.app/file-format-schema.json',
+        'name': name,
+        'exporter': 'homemade-pickles profiling',
+        'shared': {'frames': frames},
+        'profiles': [{
+            'type': 'sampled',
+            'name': name,
+            'unit': 'seconds',
+            'startValue': 0,
+            'endValue': sum(weights),
+            'samples': samples,
+            'weights': weights
+        }]
+    }
+
+
+def write_profile(directory, endpoint, counts, interval, keep=50):
+    """Write one request's samples under directory/endpoint/; returns the profile ID"""
+    profile_id = f"{time.strftime('%Y%m%dT%H%M%S')}-{uuid.uuid4().hex[:8]}"
+    folder = os.path.join(directory, endpoint or 'unmatched')
+    os.makedirs(folder, exist_ok=True)
+    base = os.path.join(folder, profile_id)
+    with open(base + '.collapsed', 'w', encoding='utf-8') as f:
+        f.write(to_collapsed(counts))
+    with open(base + '.speedscope.json', 'w', encoding='utf-8') as f:
+        json.dump(to_speedscope(counts, f'{endpoint} {profile_id}', interval), f)
+
+    # Keep only the newest `keep` profiles per endpoint
+    profiles = sorted(name for name in os.listdir(folder) if name.endswith('.collapsed'))
+    for name in profiles[:-keep] if keep else []:
+        for suffix in ('.collapsed', '.speedscope.json'):
+            try:
+                os.remove(os.path.join(folder, name[:-len('.collapsed')] + suffix))
+            except OSError:
+                pass
+    return profile_id
@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+"""
+Sales aggregates
+Pre-aggregated order/quantity/revenue counters in PickleAggregates, keyed by
+dimension (total, day, item, city, pincode) and bucket, so reports never scan orders
+"""
+
+import argparse
+import os
+import time
+from collections import defaultdict
+from decimal import Decimal
+
+from boto3.dynamodb.conditions import Key
+from boto3.dynamodb.types import TypeSerializer
+from botocore.exceptions import ClientError
+from dotenv import load_dotenv
+
+import aws_clients
+from order_archive import OrderArchive
+from order_export import parallel_scan
+
+AGGREGATES_TABLE = 'PickleAggregates'
+DIMENSIONS = ('total', 'day', 'item', 'city', 'pincode')
+# Marker items (dimension 'applied#<order_id>') record which increments have landed, so a
+# retried increment is never counted twice; they expire (TTL) long after any retry could run
+APPLIED_PREFIX = 'applied#'
+APPLIED_TTL_DAYS = 30
+TRANSACTION_COUNTERS = 99
+
+_serializer = TypeSerializer()
+
+
+def order_contributions(order):
+    """(dimension, bucket, orders, quantity, revenue) increments for one order"""
+    revenue = Decimal(str(order.get('total_amount', 0)))
+    # Checkout orders carry line items; order-form orders are a single item
+    lines = [
+        (line.get('name'), int(line.get('quantity', 0)), Decimal(str(line.get('unit_price', 0))) * int(line.get('quantity', 0)))
+        for line in order.get('items') or []
+    ] or [(order.get('item'), int(order.get('quantity', 0)), revenue)]
+    quantity = sum(line_quantity for _, line_quantity, _ in lines)
+    contributions = [
+        ('total', 'all', 1, quantity, revenue),
+        ('day', str(order.get('timestamp', ''))[:10] or 'unknown', 1, quantity, revenue)
+    ]
+    for dimension in ('city', 'pincode'):
+        if order.get(dimension):
+            contributions.append((dimension, str(order[dimension]).strip().lower(), 1, quantity, revenue))
+    for name, line_quantity, line_revenue in lines:
+        if name:
+            contributions.append(('item', name, 1, line_quantity, line_revenue))
+    return contributions
+
+
+def apply_contribution(table, dimension, bucket, orders, quantity, revenue):
+    """Atomically ADD one increment to a counter"""
+    table.update_item(
+        Key={'dimension': dimension, 'bucket': bucket},
+        UpdateExpression='ADD #orders :o, #quantity :q, #revenue :r',
+        ExpressionAttributeNames={'#orders': 'orders', '#quantity': 'quantity', '#revenue': 'revenue'},
+        ExpressionAttributeValues={':o': orders, ':q': quantity, ':r': revenue}
+    )
+
+
+def record_order(table, order):
+    """Apply an order to every counter it touches"""
+    for contribution in order_contributions(order):
+        apply_contribution(table, *contribution)
+
+
+def apply_order_once(client, order_id, contributions):
+    """ADD all of one order's increments and put its marker in one transaction; False if already applied"""
+    # A transaction may touch each item once, so repeated counters (two lines of one item) are merged
+    merged = defaultdict(lambda: [0, 0, Decimal(0)])
+    for dimension, bucket, orders, quantity, revenue in contributions:
+        totals = merged[(dimension, bucket)]
+        totals[0] += orders
+        totals[1] += quantity
+        totals[2] += revenue
+    counters = list(merged.items())
+    expires_at = int(time.time()) + APPLIED_TTL_DAYS * 86400
+    applied = False
+    # TransactWriteItems takes at most 100 items: one marker plus up to 99 counters per part
+    for part, start in enumerate(range(0, len(counters), TRANSACTION_COUNTERS)):
+        marker = {'dimension': f'{APPLIED_PREFIX}{order_id}', 'bucket': f'part#{part}', 'expires_at': expires_at}
+        items = [{'Put': {
+            'TableName': AGGREGATES_TABLE,
+            'Item': {k: _serializer.serialize(v) for k, v in marker.items()},
+            'ConditionExpression': 'attribute_not_exists(dimension)'
+        }}]
+        for (dimension, bucket), (orders, quantity, revenue) in counters[start:start + TRANSACTION_COUNTERS]:
+            values = {':o': orders, ':q': quantity, ':r': revenue}
+            items.append({'Update': {
+                'TableName': AGGREGATES_TABLE,
+                'Key': {'dimension': _serializer.serialize(dimension), 'bucket': _serializer.serialize(bucket)},
+                'UpdateExpression': 'ADD #orders :o, #quantity :q, #revenue :r',
+                'ExpressionAttributeNames': {'#orders': 'orders', '#quantity': 'quantity', '#revenue': 'revenue'},
+                'ExpressionAttributeValues': {k: _serializer.serialize(v) for k, v in values.items()}
+            }})
+        try:
+            client.transact_write_items(TransactItems=items)
+            applied = True
+        except ClientError as e:
+            reasons = e.response.get('CancellationReasons') or [{}]
+            if e.response['Error']['Code'] != 'TransactionCanceledException' \
+                    or reasons[0].get('Code') != 'ConditionalCheckFailed':
+                raise
+    return applied
+
+
+def read_dimension(table, dimension):
+    """Every bucket of one dimension"""
+    items, kwargs = [], {'KeyConditionExpression': Key('dimension').eq(dimension)}
+    while True:
+        response = table.query(**kwargs)
+        items.extend(response.get('Items', []))
+        if 'LastEvaluatedKey' not in response:
+            return items
+        kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+
+def rebuild(resource, client, orders_table='PickleOrders', segments=8, archive=None):
+    """Recompute every counter from a full scan of the orders table plus the order archive"""
+    totals = defaultdict(lambda: [0, 0, Decimal(0)])
+    seen = set()
+
+    def add(order):
+        seen.add(order.get('order_id'))
+        for dimension, bucket, orders, quantity, revenue in order_contributions(order):
+            counter = totals[(dimension, bucket)]
+            counter[0] += orders
+            counter[1] += quantity
+            counter[2] += revenue
+
+    for order in parallel_scan(client, orders_table, segments=segments):
+        add(order)
+    if archive is not None:
+        # An interrupted archive run can leave an order in both places; count it once
+        for order in archive.query():
+            if order.get('order_id') not in seen:
+                add(order)
+    scanned = len(seen)
+
+    table = resource.Table(AGGREGATES_TABLE)
+    stale = [
+        (item['dimension'], item['bucket'])
+        for dimension in DIMENSIONS
+        for item in read_dimension(table, dimension)
+        if (item['dimension'], item['bucket']) not in totals
+    ]
+    with table.batch_writer() as batch:
+        for (dimension, bucket), (orders, quantity, revenue) in totals.items():
+            batch.put_item(Item={
+                'dimension': dimension, 'bucket': bucket,
+                'orders': orders, 'quantity': quantity, 'revenue': revenue
+            })
+        for dimension, bucket in stale:
+            batch.delete_item(Key={'dimension': dimension, 'bucket': bucket})
+    return scanned, len(totals)
+
+
+def main():
+    """Main function"""
+    load_dotenv()
+    parser = argparse.ArgumentParser(description='Maintain PickleAggregates sales counters')
+    parser.add_argument('--rebuild', action='store_true', help='recompute all counters from a full order scan')
+    parser.add_argument('--segments', type=int, default=8, help='parallel scan segments (default: 8)')
+    parser.add_argument('--archive-dir', default=os.environ.get('ARCHIVE_DIR', 'archive/orders'),
+                        help='order archive to include (default: ARCHIVE_DIR or archive/orders)')
+    args = parser.parse_args()
+    if not args.rebuild:
+        parser.print_help()
+        return
+
+    resource = aws_clients.get_resource('dynamodb')
+    print("📊 Rebuilding sales aggregates (run during a quiet period; live ADDs during the scan can be overwritten)")
+    archive = OrderArchive(args.archive_dir) if os.path.isdir(args.archive_dir) else None
+    if archive is None:
+        print(f"⚠️  No order archive at {args.archive_dir}; counting live orders only")
+    scanned, buckets = rebuild(resource, resource.meta.client, segments=args.segments, archive=archive)
+    print(f"✅ {scanned:,} orders aggregated into {buckets:,} counters")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+Production server
+Runs the app under gunicorn with forked workers, a thread pool per worker,
+a preloaded app, request timeouts and graceful worker reload on SIGHUP
+(workers fork from the preloaded app, so new code needs a full restart)
+"""
+
+import multiprocessing
+import os
+import shutil
+
+from dotenv import load_dotenv
+from gunicorn.app.base import BaseApplication
+
+
+def _post_fork(server, worker):
+    import startup
+    startup.forked()
+
+
+def _post_worker_init(worker):
+    import metrics
+    from app import boot
+    ms = boot.worker_phase('ready')
+    if ms is not None:
+        metrics.WORKER_COLD_START.observe(ms / 1000)
+
+
+def _child_exit(server, worker):
+    import metrics
+    metrics.mark_process_dead(worker.pid)
+
+
+def prepare_metrics_dir():
+    """Fresh PROMETHEUS_MULTIPROC_DIR so /metrics merges every worker's samples"""
+    path = os.environ.setdefault('PROMETHEUS_MULTIPROC_DIR', '/tmp/pickles-metrics')
+    shutil.rmtree(path, ignore_errors=True)
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def build_options():
+    """gunicorn settings from WEB_* environment settings"""
+    workers = int(os.environ.get('WEB_WORKERS', 0)) or multiprocessing.cpu_count() * 2 + 1
+    max_requests = int(os.environ.get('WEB_MAX_REQUESTS', 0))
+    return {
+        'bind': f"{os.environ.get('WEB_HOST', '0.0.0.0')}:{os.environ.get('PORT', 5000)}",
+        'workers': workers,
+        # gthread: each worker serves WEB_THREADS requests at once, so requests
+        # blocked on DynamoDB/SES don't hold up the whole worker
+        'worker_class': 'gthread',
+        'threads': int(os.environ.get('WEB_THREADS', 4)),
+        # Import the app once in the master; workers fork from it with the catalog,
+        # templates and manifests already loaded (AWS clients are rebuilt per worker)
+        'preload_app': os.environ.get('WEB_PRELOAD', 'True').lower() == 'true',
+        'timeout': int(os.environ.get('WEB_TIMEOUT', 30)),
+        'graceful_timeout': int(os.environ.get('WEB_GRACEFUL_TIMEOUT', 30)),
+        'keepalive': int(os.environ.get('WEB_KEEPALIVE', 5)),
+        'max_requests': max_requests,
+        'max_requests_jitter': max_requests // 10,
+        'backlog': int(os.environ.get('WEB_BACKLOG', 2048)),
+        'forwarded_allow_ips': os.environ.get('WEB_FORWARDED_ALLOW_IPS', '127.0.0.1'),
+        'accesslog': os.environ.get('WEB_ACCESS_LOG') or None,
+        'errorlog': '-',
+        'loglevel': os.environ.get('WEB_LOG_LEVEL', 'info'),
+        'proc_name': 'pickles-app',
+        'post_fork': _post_fork,
+        'post_worker_init': _post_worker_init,
+        'child_exit': _child_exit
+    }
+
+
+class PicklesServer(BaseApplication):
+    """gunicorn application that serves app.app with options from build_options()"""
+
+    def __init__(self, options=None):
+        self.options = options or {}
+        super().__init__()
+
+    def load_config(self):
+        for key, value in self.options.items():
+            if key in self.cfg.settings and value is not None:
+                self.cfg.set(key, value)
+
+    def load(self):
+        from app import app
+        # Preloaded into the master: parse the AWS service models once, so every worker
+        # forks with them loaded (without preload, clients are built lazily per worker)
+        if self.cfg.preload_app and os.environ.get('AWS_WARM_CLIENTS', 'True').lower() == 'true':
+            import aws_clients
+            aws_clients.warm(['dynamodb', 'sns', 'ses', 'sts'])
+        return app
+
+
+def main():
+    """Main function"""
+    load_dotenv()
+    # Must be set before the app (and prometheus_client) is imported
+    prepare_metrics_dir()
+    options = build_options()
+    print(f"🚀 Serving on {options['bind']} with {options['workers']} workers x {options['threads']} threads")
+    PicklesServer(options).run()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""
+Startup timing
+Phase-by-phase timing of the app import, each worker's boot after fork and its
+first request, logged at debug level once per process and served at /startup
+"""
+
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+_forked_at = None
+
+
+def forked():
+    """Mark this process as a freshly forked worker (gunicorn post_fork hook)"""
+    global _forked_at
+    _forked_at = time.perf_counter()
+
+
+class StartupTimer:
+    """Records how long each startup phase took in this process"""
+
+    def __init__(self):
+        self.phases = []
+        self.worker = {}
+        self._last = time.perf_counter()
+        self._started = self._last
+        self._lock = threading.Lock()
+
+    def mark(self, phase):
+        """End the current phase, naming it"""
+        now = time.perf_counter()
+        self.phases.append((phase, round((now - self._last) * 1000, 2)))
+        self._last = now
+
+    def finish(self):
+        """Log the import breakdown"""
+        total = round((time.perf_counter() - self._started) * 1000, 2)
+        self.phases.append(('total', total))
+        breakdown = ', '.join(f'{name} {ms:.1f}' for name, ms in self.phases[:-1])
+        logger.debug('App import took %.1f ms (%s)', total, breakdown)
+        return total
+
+    def worker_phase(self, phase):
+        """Milliseconds from fork to a worker milestone (first call wins); None outside a worker"""
+        if _forked_at is None or phase in self.worker:
+            return None
+        with self._lock:
+            if phase in self.worker:
+                return None
+            ms = round((time.perf_counter() - _forked_at) * 1000, 2)
+            self.worker[phase] = ms
+        logger.debug('Worker %d %s %.1f ms after fork', os.getpid(), phase, ms)
+        return ms
+
+    def first_request(self, ms):
+        """Record how long this process's first request took (cold caches, pools, clients)"""
+        with self._lock:
+            if 'first_request' in self.worker:
+                return
+            self.worker['first_request'] = round(ms, 2)
+        logger.debug('Process %d first request took %.1f ms', os.getpid(), ms)
+
+    def report(self):
+        """Import phases, worker boot milestones and first request time for this process"""
+        return {
+            'pid': os.getpid(),
+            'import_ms': dict(self.phases),
+            'worker_ms': dict(self.worker)
+        }
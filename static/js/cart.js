@@ -1,5 +1,70 @@
 // cart.js
-// Handles cart add/remove and undo functionality using localStorage
+// Handles cart add/remove and undo functionality against the /api/cart endpoints
+
+(function() {
+  // Cart API: every call resolves to the priced cart {items, count, total}
+  function request(method, url, body) {
+    return fetch(url, {
+      method: method,
+      credentials: 'same-origin',
+      headers: body ? { 'Content-Type': 'application/json' } : {},
+      body: body ? JSON.stringify(body) : undefined
+    }).then(function(response) {
+      return response.json().then(function(data) {
+        if (!response.ok) {
+          const error = new Error(data.error || ('Cart request failed: ' + response.status));
+          error.status = response.status;
+          throw error;
+        }
+        return data;
+      });
+    });
+  }
+
+  const cartApi = {
+    get: function() { return request('GET', '/api/cart'); },
+    add: function(sku, quantity) { return request('POST', '/api/cart/items', { sku: sku, quantity: quantity || 1 }); },
+    remove: function(sku) { return request('DELETE', '/api/cart/items/' + encodeURIComponent(sku)); },
+    update: function(quantities) { return request('PATCH', '/api/cart', { items: quantities }); }
+  };
+  window.cartApi = cartApi;
+
+  // Carts saved by the old localStorage implementation are moved to the server once
+  function migrateLocalCart() {
+    const legacy = JSON.parse(localStorage.getItem('cart') || '[]');
+    if (!legacy.length) {
+      return Promise.resolve(null);
+    }
+    const quantities = {};
+    legacy.forEach(function(item) { quantities[item.name] = item.quantity || 1; });
+    // One line at a time, so an item no longer sold only drops that line; lines that
+    // failed for any other reason (offline, conflict, server error) stay for the next page load
+    const kept = [];
+    return Object.keys(quantities).reduce(function(previous, name) {
+      return previous.then(function(cart) {
+        const line = {};
+        line[name] = quantities[name];
+        return cartApi.update(line).catch(function(error) {
+          if (error.status !== 400) {
+            kept.push(name);
+          }
+          return cart;
+        });
+      });
+    }, Promise.resolve(null)).then(function(cart) {
+      const remaining = legacy.filter(function(item) { return kept.indexOf(item.name) !== -1; });
+      if (remaining.length) {
+        localStorage.setItem('cart', JSON.stringify(remaining));
+      } else {
+        localStorage.removeItem('cart');
+      }
+      return cart;
+    });
+  }
+  window.cartReady = new Promise(function(resolve) {
+    document.addEventListener('DOMContentLoaded', function() { migrateLocalCart().then(resolve); });
+  });
+})();
 
 document.addEventListener('DOMContentLoaded', function() {
   // Add to Cart buttons
@@ -12,14 +77,13 @@ document.addEventListener('DOMContentLoaded', function() {
     btn.addEventListener('click', function() {
       const itemDiv = btn.closest('.pickle-item') || btn.closest('.snack-item');
       const name = itemDiv.querySelector('h3').innerText;
-      const price = itemDiv.querySelector('.price').innerText;
-      addToCart({ name, price });
-      showUndo(name);
+      const sku = itemDiv.dataset.sku;
+      addToCart(sku).then(function() { showUndo(name, sku); });
     });
   });
 
   // Undo button (dynamically created)
-  function showUndo(itemName) {
+  function showUndo(itemName, sku) {
     let undoDiv = document.getElementById('undo-div');
     if (!undoDiv) {
       undoDiv = document.createElement('div');
@@ -34,38 +98,23 @@ document.addEventListener('DOMContentLoaded', function() {
       undoDiv.style.boxShadow = '2px 2px 10px #b0e0e6';
       document.body.appendChild(undoDiv);
     }
-    undoDiv.innerHTML = `Added <b>${itemName}</b> to cart. <button id="undo-btn" style="margin-left:1rem;background:#2E8B57;color:white;border:none;padding:0.3rem 1rem;border-radius:5px;cursor:pointer;">Undo</button>`;
+    undoDiv.innerHTML = `Added <b></b> to cart. <button id="undo-btn" style="margin-left:1rem;background:#2E8B57;color:white;border:none;padding:0.3rem 1rem;border-radius:5px;cursor:pointer;">Undo</button>`;
+    undoDiv.querySelector('b').textContent = itemName;
     document.getElementById('undo-btn').onclick = function() {
-      removeFromCart(itemName);
+      removeFromCart(sku);
       undoDiv.remove();
     };
     setTimeout(() => { if (undoDiv) undoDiv.remove(); }, 5000);
   }
 
   // Cart functions
-  function getCart() {
-    return JSON.parse(localStorage.getItem('cart') || '[]');
+  function addToCart(sku) {
+    return window.cartApi.add(sku, 1).catch(function(error) { alert(error.message); });
   }
-  function setCart(cart) {
-    localStorage.setItem('cart', JSON.stringify(cart));
-  }
-  function addToCart(item) {
-    const cart = getCart();
-    const existingItem = cart.find(i => i.name === item.name);
-    if (!existingItem) {
-      cart.push(item);
-      setCart(cart);
-    }
+  function removeFromCart(sku) {
+    return window.cartApi.remove(sku).catch(function(error) { alert(error.message); });
   }
-  function removeFromCart(itemName) {
-    let cart = getCart();
-    cart = cart.filter(i => i.name !== itemName);
-    setCart(cart);
-    if (window.location.pathname.includes('cart')) {
-      location.reload();
-    }
-  }
-  
+
   // Make functions globally available
   window.addToCart = addToCart;
   window.removeFromCart = removeFromCart;
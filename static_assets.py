@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+Static asset fingerprinting
+Copies everything under static/ to static/dist with a content hash in the name,
+writes precompressed .gz/.br siblings and a manifest used to rewrite url_for('static')
+"""
+
+import gzip
+import hashlib
+import json
+import os
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+STATIC_DIR = os.path.join(BASE_DIR, 'static')
+DIST_NAME = 'dist'
+DIST_DIR = os.path.join(STATIC_DIR, DIST_NAME)
+MANIFEST_PATH = os.path.join(DIST_DIR, 'manifest.json')
+
+# Already-compressed formats (images) gain nothing from gzip/brotli
+COMPRESSIBLE = ('.js', '.css', '.svg', '.json', '.html', '.txt', '.map')
+MIN_COMPRESS_SIZE = 256
+
+
+def hashed_name(relative_path, digest):
+    """images/a b.jpg -> images/a b.<hash>.jpg"""
+    root, ext = os.path.splitext(relative_path)
+    return f'{root}.{digest[:10]}{ext}'
+
+
+def compress(path, data, brotli):
+    """Write .gz (and .br when brotli is available) next to path"""
+    with open(path + '.gz', 'wb') as f:
+        f.write(gzip.compress(data, compresslevel=9, mtime=0))
+    if brotli is not None:
+        with open(path + '.br', 'wb') as f:
+            f.write(brotli.compress(data, quality=11))
+
+
+def build():
+    """Fingerprint and precompress every static file, then write the manifest"""
+    try:
+        import brotli
+    except ImportError:
+        brotli = None
+        print("⚠️  brotli not installed, writing .gz only (pip3 install brotli)")
+
+    # Old fingerprinted files are left in place so pages rendered before a
+    # deploy keep resolving; hashed names never collide with new content
+    manifest = {}
+    compressed = 0
+    for root, dirs, files in os.walk(STATIC_DIR):
+        dirs[:] = sorted(d for d in dirs if os.path.join(root, d) != DIST_DIR)
+        for name in sorted(files):
+            source = os.path.join(root, name)
+            relative = os.path.relpath(source, STATIC_DIR).replace(os.sep, '/')
+            with open(source, 'rb') as f:
+                data = f.read()
+            target_name = hashed_name(relative, hashlib.sha256(data).hexdigest())
+            target = os.path.join(DIST_DIR, *target_name.split('/'))
+            manifest[relative] = f'{DIST_NAME}/{target_name}'
+            if os.path.exists(target):
+                continue
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            with open(target, 'wb') as f:
+                f.write(data)
+            if name.lower().endswith(COMPRESSIBLE) and len(data) >= MIN_COMPRESS_SIZE:
+                compress(target, data, brotli)
+                compressed += 1
+
+    os.makedirs(DIST_DIR, exist_ok=True)
+    with open(MANIFEST_PATH, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    print(f"✅ {len(manifest)} assets fingerprinted, {compressed} newly precompressed")
+    return manifest
+
+
+def load_manifest(path=MANIFEST_PATH):
+    """Load the asset manifest, or an empty one if the build step hasn't run"""
+    try:
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def main():
+    """Main function"""
+    print("📦 Static Asset Build")
+    print("=" * 50)
+    build()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,190 @@
+"""
+Notification dispatcher tests
+Run with: python -m pytest tests
+"""
+
+import os
+import sys
+import threading
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from notifications import NotificationDispatcher  # noqa: E402
+
+
+class StubSES:
+    """Records sends; the first `failures` plain sends raise, and `gate` (if set) holds them"""
+
+    def __init__(self, failures=0):
+        self.failures = failures
+        self.sent = []
+        self.bulk = []
+        self.gate = None
+        self.started = threading.Event()
+        self._lock = threading.Lock()
+
+    def send_email(self, **kwargs):
+        self.started.set()
+        if self.gate is not None:
+            self.gate.wait(5)
+        with self._lock:
+            self.sent.append(kwargs['Destination']['ToAddresses'][0])
+            if self.failures:
+                self.failures -= 1
+                raise RuntimeError('ses down')
+
+    def send_bulk_templated_email(self, Destinations, **kwargs):
+        with self._lock:
+            self.bulk.append([d['Destination']['ToAddresses'][0] for d in Destinations])
+        return {'Status': [{'Status': 'Success'} for _ in Destinations]}
+
+
+class StubSNS:
+    def __init__(self, failures=0):
+        self.failures = failures
+        self.published = []
+        self._lock = threading.Lock()
+
+    def publish(self, **kwargs):
+        with self._lock:
+            self.published.append(kwargs['Subject'])
+            if self.failures:
+                self.failures -= 1
+                raise RuntimeError('sns down')
+
+
+def dispatcher(ses, sns=None, topic_arn='', **kwargs):
+    kwargs.setdefault('backoff_base', 0.01)
+    return NotificationDispatcher(sns or StubSNS(), ses, 'shop@example.com', topic_arn, **kwargs)
+
+
+def block_worker(ses, box):
+    """Park the only worker inside a send so queued entries stay queued"""
+    ses.gate = threading.Event()
+    box.enqueue('blocker@x', 'Blocker', 'held')
+    assert ses.started.wait(5)
+    return ses.gate
+
+
+def test_retries_until_sent():
+    ses = StubSES(failures=2)
+    box = dispatcher(ses, max_retries=3)
+    assert box.enqueue('a@x', 'Hi', 'body')
+    # flush also waits out the retry timers, not just the queue
+    assert box.flush(timeout=5)
+
+    assert ses.sent == ['a@x'] * 3
+    stats = box.stats()
+    assert (stats['sent'], stats['retried'], stats['failed']) == (1, 2, 0)
+    box.shutdown()
+
+
+def test_gives_up_after_max_retries():
+    ses = StubSES(failures=10)
+    box = dispatcher(ses, max_retries=2)
+    box.enqueue('a@x', 'Hi', 'body')
+    assert box.flush(timeout=5)
+
+    assert len(ses.sent) == 3
+    stats = box.stats()
+    assert (stats['sent'], stats['retried'], stats['failed']) == (0, 2, 1)
+    box.shutdown()
+
+
+def test_grouped_jobs_retry_independently():
+    ses, sns = StubSES(), StubSNS(failures=1)
+    box = dispatcher(ses, sns, topic_arn='arn:topic')
+    assert box.enqueue('a@x', 'Hi', 'body')
+    assert box.flush(timeout=5)
+
+    # Only the failed SNS publish is retried; the email goes out once
+    assert sns.published == ['Hi', 'Hi']
+    assert ses.sent == ['a@x']
+    assert box.stats()['retried'] == 1
+    box.shutdown()
+
+
+def test_grouped_submit_is_all_or_nothing_when_full():
+    ses, sns = StubSES(), StubSNS()
+    box = dispatcher(ses, sns, topic_arn='arn:topic', workers=1, max_queue_size=1)
+    gate = block_worker(ses, box)
+    assert sns.published == ['Blocker']
+    assert box.submit((box.send_ses, ('b@x', 'Queued', 'body')))
+
+    # Queue full: neither the SNS nor the SES half of the notification is queued
+    assert not box.enqueue('c@x', 'Dropped', 'body')
+    assert box.stats()['dropped'] == 2
+    gate.set()
+    assert box.flush(timeout=5)
+
+    assert sns.published == ['Blocker']
+    assert ses.sent == ['blocker@x', 'b@x']
+    box.shutdown()
+
+
+def test_enqueue_templated_rolls_back_when_full():
+    ses = StubSES()
+    box = dispatcher(ses, workers=1, max_queue_size=1)
+    gate = block_worker(ses, box)
+    assert box.enqueue_templated('a@x', 'welcome', {'name': 'A'})
+
+    # Only the rejected destination is taken back out of the pending batch
+    assert not box.enqueue_templated('b@x', 'welcome', {'name': 'B'})
+    assert box._templated['welcome'] == [('a@x', {'name': 'A'})]
+    assert box.stats()['dropped'] == 1
+    gate.set()
+    assert box.flush(timeout=5)
+
+    assert ses.bulk == [['a@x']]
+    box.shutdown()
+
+
+def test_templated_sends_share_a_bulk_call():
+    ses = StubSES()
+    box = dispatcher(ses, workers=1)
+    gate = block_worker(ses, box)
+    for n in range(3):
+        box.enqueue_templated(f'{n}@x', 'welcome', {'n': n})
+    gate.set()
+    assert box.flush(timeout=5)
+
+    # The first marker drains the whole batch; the later markers find it empty
+    assert ses.bulk == [['0@x', '1@x', '2@x']]
+    box.shutdown()
+
+
+def test_flush_times_out_while_a_send_is_stuck():
+    ses = StubSES()
+    box = dispatcher(ses, workers=1)
+    gate = block_worker(ses, box)
+    assert not box.flush(timeout=0.1)
+    gate.set()
+    assert box.flush(timeout=5)
+    box.shutdown()
+
+
+def test_shutdown_drains_and_stops_workers():
+    ses = StubSES(failures=1)
+    box = dispatcher(ses, workers=2)
+    for n in range(5):
+        box.enqueue(f'{n}@x', 'Hi', 'body')
+    threads = list(box._threads)
+    assert box.shutdown(timeout=5)
+
+    assert sorted(set(ses.sent)) == [f'{n}@x' for n in range(5)]
+    assert box.stats()['sent'] == 5
+    assert box.stats()['workers'] == 0
+    assert not any(thread.is_alive() for thread in threads)
+
+
+@pytest.mark.parametrize('workers', [1, 4])
+def test_every_notification_is_sent_once(workers):
+    ses = StubSES()
+    box = dispatcher(ses, workers=workers)
+    for n in range(50):
+        box.enqueue(f'{n}@x', 'Hi', 'body')
+    assert box.flush(timeout=5)
+    assert sorted(ses.sent) == sorted(f'{n}@x' for n in range(50))
+    box.shutdown()
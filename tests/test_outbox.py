@@ -0,0 +1,182 @@
+"""
+Outbox tests
+Run with: python -m pytest tests
+"""
+
+import multiprocessing
+import os
+import sqlite3
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from outbox import DONE, DUPLICATE, Outbox  # noqa: E402
+
+
+@pytest.fixture
+def outbox(tmp_path):
+    return Outbox(str(tmp_path / 'outbox.db'), batch_size=10, lease=30, backoff_base=10, max_attempts=3)
+
+
+def rows(box):
+    """id -> (kind, state, parent_id, attempts) for every stored entry"""
+    conn = sqlite3.connect(box.path)
+    try:
+        return {
+            row[0]: row[1:]
+            for row in conn.execute('SELECT id, kind, state, parent_id, attempts FROM outbox ORDER BY id')
+        }
+    finally:
+        conn.close()
+
+
+def test_add_dedups_on_key(outbox):
+    assert outbox.add('order', {'n': 1}, dedup_key='k') is not None
+    assert outbox.add('order', {'n': 2}, dedup_key='k') is None
+    assert outbox.pending() == 1
+
+
+def test_claim_leases_entries(outbox):
+    outbox.add('order', {'n': 1})
+    assert len(outbox._claim()) == 1
+    # Leased: no other drainer can claim it until the lease runs out
+    assert outbox._claim() == []
+    conn = outbox._connect()
+    conn.execute('UPDATE outbox SET claimed_until = ?', (time.time() - 1,))
+    assert len(outbox._claim()) == 1
+
+
+def test_idle_claim_does_not_take_the_write_lock(outbox):
+    other = sqlite3.connect(outbox.path, timeout=0, isolation_level=None)
+    other.execute('BEGIN IMMEDIATE')
+    try:
+        started = time.monotonic()
+        assert outbox._claim() == []
+        # Would have waited out the 10 s busy timeout had it tried to write
+        assert time.monotonic() - started < 1
+    finally:
+        other.execute('ROLLBACK')
+        other.close()
+
+
+def test_children_wait_for_parent_then_run(outbox):
+    seen = []
+    outbox.register('order', lambda payloads: [DONE] * len(payloads))
+    outbox.register('email', lambda payloads: seen.extend(payloads) or [DONE] * len(payloads))
+    outbox.add('order', {'n': 1}, children=[('email', {'to': 'a'}), ('email', {'to': 'b'})])
+
+    # Only the parent is ready at first
+    assert outbox.drain_once() == 1
+    assert seen == []
+    assert outbox.drain_once() == 2
+    assert sorted(p['to'] for p in seen) == ['a', 'b']
+    assert outbox.pending() == 0
+
+
+def test_duplicate_drops_children(outbox):
+    outbox.register('order', lambda payloads: [DUPLICATE] * len(payloads))
+    outbox.add('order', {'n': 1}, children=[('email', {'to': 'a'})])
+    outbox.drain_once()
+    assert rows(outbox) == {}
+
+
+def test_failure_backs_off(outbox):
+    outbox.register('order', lambda payloads: [RuntimeError('boom')] * len(payloads))
+    entry_id = outbox.add('order', {'n': 1})
+    outbox.drain_once()
+
+    assert rows(outbox)[entry_id] == ('order', 'pending', None, 1)
+    next_attempt, error = outbox._connect().execute(
+        'SELECT next_attempt, last_error FROM outbox WHERE id = ?', (entry_id,)
+    ).fetchone()
+    assert next_attempt > time.time() + 1
+    assert error == 'RuntimeError: boom'
+    # Not ready again until the backoff has passed
+    assert outbox.drain_once() == 0
+
+
+def test_handler_exception_fails_whole_batch(outbox):
+    def handler(payloads):
+        raise ValueError('bad batch')
+    outbox.register('order', handler)
+    outbox.add('order', {'n': 1})
+    outbox.add('order', {'n': 2})
+    outbox.drain_once()
+    assert [row[3] for row in rows(outbox).values()] == [1, 1]
+
+
+def test_non_durable_kinds_go_dead(outbox):
+    outbox.register('email', lambda payloads: [RuntimeError('ses down')] * len(payloads), durable=False)
+    outbox.register('order', lambda payloads: [RuntimeError('ddb down')] * len(payloads))
+    email_id = outbox.add('email', {'to': 'a'})
+    order_id = outbox.add('order', {'n': 1})
+    for _ in range(outbox.max_attempts + 1):
+        outbox._connect().execute('UPDATE outbox SET next_attempt = 0')
+        outbox.drain_once()
+
+    stored = rows(outbox)
+    assert stored[email_id][1] == 'dead'
+    assert stored[email_id][3] == outbox.max_attempts
+    # Durable writes keep retrying
+    assert stored[order_id][1] == 'pending'
+    assert stored[order_id][3] == outbox.max_attempts + 1
+    assert outbox.pending() == 1
+    assert outbox.stats()['dead'] == {'email': 1}
+
+
+def test_unregistered_kind_is_retried(outbox):
+    entry_id = outbox.add('mystery', {})
+    outbox.drain_once()
+    assert rows(outbox)[entry_id][3] == 1
+
+
+def test_register_each_maps_outcomes(outbox):
+    def func(payload):
+        if payload['n'] == 2:
+            raise RuntimeError('no')
+        return DUPLICATE if payload['n'] == 3 else None
+    outbox.register_each('order', func)
+    # The pool start() would create, without the background drainers
+    outbox._pool = ThreadPoolExecutor(max_workers=2)
+    ids = [outbox.add('order', {'n': n}, children=[('email', {'n': n})]) for n in (1, 2, 3)]
+    outbox.drain_once()
+    outbox._pool.shutdown()
+
+    stored = rows(outbox)
+    assert ids[0] not in stored and ids[2] not in stored
+    assert stored[ids[1]][3] == 1
+    # The first order's email is released, the failed order's held, the duplicate's dropped
+    emails = sorted((row[2] or 0) for row in stored.values() if row[0] == 'email')
+    assert emails == [0, ids[1]]
+
+
+def _drain_in_process(path, results):
+    box = Outbox(path, batch_size=5, lease=30)
+    claimed = []
+    box.register('job', lambda payloads: claimed.extend(p['n'] for p in payloads) or [DONE] * len(payloads))
+    while box.drain_once():
+        pass
+    results.put(claimed)
+
+
+def test_processes_never_claim_the_same_entry(tmp_path):
+    path = str(tmp_path / 'outbox.db')
+    box = Outbox(path)
+    for n in range(200):
+        box.add('job', {'n': n})
+
+    context = multiprocessing.get_context('spawn')
+    results = context.Queue()
+    workers = [context.Process(target=_drain_in_process, args=(path, results)) for _ in range(4)]
+    for worker in workers:
+        worker.start()
+    claimed = [n for _ in workers for n in results.get(timeout=60)]
+    for worker in workers:
+        worker.join(timeout=10)
+
+    assert sorted(claimed) == list(range(200))
+    assert box.pending() == 0
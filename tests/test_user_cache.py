@@ -0,0 +1,152 @@
+"""
+User cache tests
+Run with: python -m pytest tests
+"""
+
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from user_cache import UserCache  # noqa: E402
+
+
+class Loader:
+    """Counts lookups, reading users[email] up front; `gate` (if set) holds the result until released"""
+
+    def __init__(self, users=None, error=None):
+        self.users = users or {}
+        self.error = error
+        self.calls = 0
+        self.gate = None
+        self.started = threading.Event()
+
+    def __call__(self, email):
+        self.calls += 1
+        item = self.users.get(email)
+        self.started.set()
+        if self.gate is not None:
+            self.gate.wait(5)
+        if self.error is not None:
+            raise self.error
+        return item
+
+
+def wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, 'timed out'
+        time.sleep(0.01)
+
+
+def in_threads(cache, email, count):
+    """Start `count` concurrent get()s; returns (threads, results) where results fill as they finish"""
+    results = []
+
+    def lookup():
+        try:
+            results.append(cache.get(email))
+        except Exception as e:
+            results.append(e)
+    threads = [threading.Thread(target=lookup) for _ in range(count)]
+    for thread in threads:
+        thread.start()
+    return threads, results
+
+
+def test_hit_after_miss():
+    loader = Loader({'a@x': {'email': 'a@x'}})
+    cache = UserCache(loader)
+    assert cache.get('a@x') == {'email': 'a@x'}
+    assert cache.get('a@x') == {'email': 'a@x'}
+    assert loader.calls == 1
+    assert (cache.stats()['misses'], cache.stats()['hits']) == (1, 1)
+
+
+def test_concurrent_misses_share_one_load():
+    loader = Loader({'a@x': {'email': 'a@x'}})
+    loader.gate = threading.Event()
+    cache = UserCache(loader)
+    threads, results = in_threads(cache, 'a@x', 5)
+    wait_for(lambda: cache.stats()['coalesced'] == 4)
+    loader.gate.set()
+    for thread in threads:
+        thread.join(5)
+
+    assert results == [{'email': 'a@x'}] * 5
+    assert loader.calls == 1
+    assert cache.stats()['misses'] == 1
+
+
+def test_loader_error_reaches_every_waiter_and_is_not_cached():
+    error = RuntimeError('dynamodb down')
+    loader = Loader(error=error)
+    loader.gate = threading.Event()
+    cache = UserCache(loader)
+    threads, results = in_threads(cache, 'a@x', 3)
+    wait_for(lambda: cache.stats()['coalesced'] == 2)
+    loader.gate.set()
+    for thread in threads:
+        thread.join(5)
+
+    assert results == [error] * 3
+    assert loader.calls == 1
+    # The failed flight is gone, so the next lookup tries again
+    loader.error, loader.gate = None, None
+    loader.users['a@x'] = {'email': 'a@x'}
+    assert cache.get('a@x') == {'email': 'a@x'}
+    assert loader.calls == 2
+
+
+def test_invalidate_during_load_does_not_cache_the_stale_read():
+    loader = Loader({'a@x': {'name': 'old'}})
+    loader.gate = threading.Event()
+    cache = UserCache(loader)
+    threads, results = in_threads(cache, 'a@x', 1)
+    assert loader.started.wait(5)
+
+    # A write lands while the lookup is still reading the old item
+    loader.users['a@x'] = {'name': 'new'}
+    cache.invalidate('a@x')
+    loader.gate.set()
+    threads[0].join(5)
+
+    assert results == [{'name': 'old'}]
+    loader.gate = None
+    assert cache.get('a@x') == {'name': 'new'}
+    assert loader.calls == 2
+
+
+def test_missing_users_are_cached_for_the_negative_ttl():
+    loader = Loader()
+    cache = UserCache(loader, ttl=60, negative_ttl=0.1)
+    assert cache.get('ghost@x') is None
+    assert cache.get('ghost@x') is None
+    assert loader.calls == 1
+    assert cache.stats()['negative_hits'] == 1
+
+    # Callers that must see a brand-new user skip negative entries
+    assert cache.get('ghost@x', use_negative=False) is None
+    assert loader.calls == 2
+
+    time.sleep(0.15)
+    loader.users['ghost@x'] = {'email': 'ghost@x'}
+    assert cache.get('ghost@x') == {'email': 'ghost@x'}
+    assert loader.calls == 3
+
+
+def test_least_recently_used_entry_is_evicted():
+    loader = Loader({email: {'email': email} for email in ('a@x', 'b@x', 'c@x')})
+    cache = UserCache(loader, max_size=2)
+    cache.get('a@x')
+    cache.get('b@x')
+    cache.get('a@x')
+    cache.get('c@x')
+
+    assert cache.stats()['evictions'] == 1
+    cache.get('a@x')
+    assert loader.calls == 3
+    cache.get('b@x')
+    assert loader.calls == 4
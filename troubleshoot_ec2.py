@@ -1,93 +1,104 @@
 #!/usr/bin/env python3
 """
 EC2 Troubleshooting Script
-Diagnoses common issues with Flask app deployment on EC2
+Diagnoses common issues with Flask app deployment on EC2: checks run
+concurrently with timeouts, an optional latency probe, and JSON output
 """
 
-import subprocess
-import socket
-import requests
+import argparse
+import http.client
+import json
 import os
+import socket
+import subprocess
 import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from importlib import metadata
+from urllib.parse import urlsplit
+
+# Seconds any single shell command may take
+COMMAND_TIMEOUT = 5
+PACKAGES = ['flask', 'boto3', 'python-dotenv', 'gunicorn', 'prometheus_client']
+TABLES = ['PickleUsers', 'PickleOrders', 'PickleContacts', 'PickleCarts', 'PickleAggregates']
+PROBE_PATHS = ['/health', '/login', '/static/js/cart.js', '/static/images/lemon.jpg']
 
-def run_command(command):
-    """Run a shell command and return output"""
+def run_command(command, timeout=COMMAND_TIMEOUT):
+    """Run a shell command and return (ok, stdout, stderr), giving up after `timeout` seconds"""
     try:
-        result = subprocess.run(command, shell=True, capture_output=True, text=True)
+        result = subprocess.run(command, shell=True, capture_output=True, text=True, timeout=timeout)
         return result.returncode == 0, result.stdout, result.stderr
+    except subprocess.TimeoutExpired:
+        return False, "", f"timed out after {timeout}s"
     except Exception as e:
         return False, "", str(e)
 
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, int(round(pct / 100.0 * len(sorted_values))))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+# Each check returns (ok, [findings]); a finding is a status (ok/warn/fail), a message
+# for the text report and machine-readable fields for --json
+
+ICONS = {'ok': '✅', 'warn': '⚠️ ', 'fail': '❌'}
+
+def finding(status, message, **fields):
+    """One result line of a check"""
+    return {'status': status, 'message': message, **fields}
+
+def render(item):
+    """A finding as a text report line"""
+    return f"{ICONS[item['status']]} {item['message']}"
+
 def check_python():
     """Check Python installation"""
-    print("🐍 Checking Python...")
     success, stdout, stderr = run_command("python3 --version")
     if success:
-        print(f"✅ Python: {stdout.strip()}")
-        return True
-    else:
-        print("❌ Python 3 not installed")
-        return False
+        return True, [finding('ok', f"Python: {stdout.strip()}", version=stdout.split()[-1])]
+    return False, [finding('fail', "Python 3 not installed", version=None)]
 
 def check_pip():
     """Check pip installation"""
-    print("📦 Checking pip...")
     success, stdout, stderr = run_command("pip3 --version")
     if success:
-        print(f"✅ pip: {stdout.strip()}")
-        return True
-    else:
-        print("❌ pip3 not installed")
-        return False
+        return True, [finding('ok', f"pip: {stdout.strip()}", version=stdout.split()[1])]
+    return False, [finding('fail', "pip3 not installed", version=None)]
 
 def check_dependencies():
-    """Check required Python packages"""
-    print("📚 Checking dependencies...")
-    packages = ['flask', 'boto3', 'python-dotenv']
-    all_installed = True
-    
-    for package in packages:
-        success, stdout, stderr = run_command(f"pip3 show {package}")
-        if success:
-            print(f"✅ {package}: installed")
-        else:
-            print(f"❌ {package}: not installed")
+    """Check required Python packages (one metadata lookup each, no subprocesses)"""
+    findings, all_installed = [], True
+    for package in PACKAGES:
+        try:
+            version = metadata.version(package)
+            findings.append(finding('ok', f"{package}: {version}", package=package, version=version))
+        except metadata.PackageNotFoundError:
+            findings.append(finding('fail', f"{package}: not installed", package=package, version=None))
             all_installed = False
-    
-    return all_installed
+    return all_installed, findings
 
-def check_port(port=5000):
+def check_port(port=None):
     """Check if port is available"""
-    print(f"🔌 Checking port {port}...")
+    port = port or int(os.environ.get('PORT', 5000))
     try:
-        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        result = sock.connect_ex(('localhost', port))
-        sock.close()
-        
-        if result == 0:
-            print(f"✅ Port {port}: in use (app might be running)")
-            return True
-        else:
-            print(f"⚠️  Port {port}: available (app not running)")
-            return False
+        with socket.create_connection(('localhost', port), timeout=2):
+            return True, [finding('ok', f"Port {port}: in use (app might be running)", port=port, in_use=True)]
+    except (ConnectionRefusedError, socket.timeout):
+        return False, [finding('warn', f"Port {port}: available (app not running)", port=port, in_use=False)]
     except Exception as e:
-        print(f"❌ Port check failed: {e}")
-        return False
+        return False, [finding('fail', f"Port check failed: {e}", port=port, error=str(e))]
 
 def check_firewall():
     """Check firewall settings"""
-    print("🔥 Checking firewall...")
-    success, stdout, stderr = run_command("sudo firewall-cmd --list-ports")
+    success, stdout, stderr = run_command("sudo -n firewall-cmd --list-ports")
     if success:
         if "5000/tcp" in stdout:
-            print("✅ Firewall: Port 5000 is open")
-            return True
-        else:
-            print("❌ Firewall: Port 5000 is not open")
-            return False
-    else:
-        print("⚠️  Could not check firewall (might not be running)")
-        return True
+            return True, [finding('ok', "Firewall: Port 5000 is open", port=5000, open=True)]
+        return False, [finding('fail', "Firewall: Port 5000 is not open", port=5000, open=False)]
+    return True, [finding('warn', "Could not check firewall (might not be running)", port=5000, open=None)]
 
 def check_security_group():
     """Check EC2 security group"""
@@ -99,110 +110,194 @@ def check_security_group():
 
 def check_aws_credentials():
     """Check AWS credentials"""
-    print("🔑 Checking AWS credentials...")
     try:
-        import boto3
-        sts = boto3.client('sts')
-        identity = sts.get_caller_identity()
-        print(f"✅ AWS Account: {identity['Account']}")
-        return True
+        import aws_clients
+        identity = aws_clients.get_client('sts').get_caller_identity()
+        return True, [finding('ok', f"AWS Account: {identity['Account']}", account=identity['Account'])]
     except Exception as e:
-        print(f"❌ AWS credentials error: {e}")
-        return False
+        return False, [finding('fail', f"AWS credentials error: {e}", error=str(e))]
 
 def check_dynamodb_tables():
-    """Check DynamoDB tables"""
-    print("🗄️  Checking DynamoDB tables...")
+    """Check DynamoDB tables (described concurrently)"""
     try:
-        import boto3
-        dynamodb = boto3.resource('dynamodb', region_name='us-east-1')
-        
-        tables = ['PickleUsers', 'PickleOrders', 'PickleContacts']
-        all_exist = True
-        
-        for table_name in tables:
-            try:
-                table = dynamodb.Table(table_name)
-                table.describe_table()
-                print(f"✅ Table {table_name}: exists")
-            except Exception as e:
-                print(f"❌ Table {table_name}: missing")
-                all_exist = False
-        
-        return all_exist
+        import aws_clients
+        client = aws_clients.get_client('dynamodb')
     except Exception as e:
-        print(f"❌ DynamoDB check failed: {e}")
-        return False
+        return False, [finding('fail', f"DynamoDB check failed: {e}", error=str(e))]
+
+    def describe(table_name):
+        try:
+            status = client.describe_table(TableName=table_name)['Table']['TableStatus'].lower()
+            return True, finding('ok', f"Table {table_name}: {status}", table=table_name, table_status=status)
+        except Exception as e:
+            code = getattr(e, 'response', {}).get('Error', {}).get('Code')
+            if code == 'ResourceNotFoundException':
+                return False, finding('fail', f"Table {table_name}: missing", table=table_name, table_status='missing')
+            return False, finding('fail', f"Table {table_name}: {e}", table=table_name, table_status=None, error=str(e))
+
+    with ThreadPoolExecutor(max_workers=len(TABLES)) as pool:
+        results = list(pool.map(describe, TABLES))
+    return all(ok for ok, _ in results), [item for _, item in results]
 
 def check_service_status():
     """Check systemd service status"""
-    print("⚙️  Checking service status...")
-    success, stdout, stderr = run_command("sudo systemctl status pickles-app")
+    success, stdout, stderr = run_command("systemctl is-active pickles-app")
+    state = stdout.strip() or stderr.strip()
     if success:
-        if "active (running)" in stdout:
-            print("✅ Service: running")
-            return True
-        else:
-            print("❌ Service: not running")
-            print("Service output:", stdout)
-            return False
-    else:
-        print("❌ Service: not found or error")
-        return False
+        return True, [finding('ok', "Service: running", state='active')]
+    if state in ('inactive', 'failed', 'activating', 'deactivating'):
+        return False, [finding('fail', f"Service: not running ({state})", state=state)]
+    return False, [finding('fail', f"Service: not found or error ({state})", state=state or None)]
 
 def check_logs():
-    """Check application logs"""
-    print("📋 Checking logs...")
-    success, stdout, stderr = run_command("sudo journalctl -u pickles-app --no-pager -n 20")
+    """Recent application log lines, or (None, error) if they can't be read"""
+    success, stdout, stderr = run_command("sudo -n journalctl -u pickles-app --no-pager -n 20")
     if success:
-        print("Recent logs:")
-        print(stdout)
-    else:
-        print("❌ Could not retrieve logs")
+        return stdout.splitlines(), None
+    return None, stderr.strip()
 
-def test_application():
+def connect(base_url, timeout=5):
+    """HTTP(S) connection to the app (standard library only, so it works on a half-installed box)"""
+    url = urlsplit(base_url)
+    connection_class = http.client.HTTPSConnection if url.scheme == 'https' else http.client.HTTPConnection
+    return connection_class(url.netloc, timeout=timeout), url.path.rstrip('/')
+
+def get(connection, path):
+    """GET a path on an open connection; returns the status code"""
+    connection.request('GET', path)
+    response = connection.getresponse()
+    response.read()
+    return response.status
+
+def test_application(base_url):
     """Test application endpoints"""
-    print("🧪 Testing application...")
     try:
-        response = requests.get('http://localhost:5000', timeout=5)
-        print(f"✅ App responds: Status {response.status_code}")
-        return True
+        connection, prefix = connect(base_url)
+        try:
+            status = get(connection, prefix + '/')
+        finally:
+            connection.close()
+        return True, [finding('ok', f"App responds: Status {status}", http_status=status)]
     except Exception as e:
-        print(f"❌ App not responding: {e}")
-        return False
+        return False, [finding('fail', f"App not responding: {e}", error=str(e))]
+
+def probe_latency(base_url, paths=PROBE_PATHS, count=20, timeout=5, budget=30):
+    """GET each path `count` times over a kept-alive connection (paths in parallel); p50/p99 in ms per path
+
+    The whole probe stops after `budget` seconds; paths cut short report timed_out.
+    """
+    deadline = time.monotonic() + budget
+
+    def probe(path):
+        connection, prefix = connect(base_url, timeout)
+        timings, statuses, errors, timed_out = [], {}, 0, False
+        for _ in range(count):
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                timed_out = True
+                break
+            # No single request may run past the deadline either
+            connection.timeout = min(timeout, remaining)
+            if connection.sock is not None:
+                connection.sock.settimeout(connection.timeout)
+            started = time.perf_counter()
+            try:
+                status = get(connection, prefix + path)
+                statuses[str(status)] = statuses.get(str(status), 0) + 1
+                if status >= 500:
+                    errors += 1
+            except Exception:
+                errors += 1
+                # Start the next attempt on a fresh connection
+                connection.close()
+            timings.append((time.perf_counter() - started) * 1000)
+        connection.close()
+        timings.sort()
+        return path, {
+            'count': len(timings),
+            'timed_out': timed_out,
+            'errors': errors,
+            'statuses': statuses,
+            'p50_ms': round(percentile(timings, 50), 2),
+            'p99_ms': round(percentile(timings, 99), 2),
+            'max_ms': round(timings[-1], 2) if timings else 0.0
+        }
+
+    with ThreadPoolExecutor(max_workers=len(paths)) as pool:
+        return dict(pool.map(probe, paths))
+
+def run_checks(checks, timeout):
+    """Run every check at once; each gets `timeout` seconds measured from the start"""
+    results = {}
+
+    def run(name, check_func):
+        started = time.perf_counter()
+        try:
+            ok, lines = check_func()
+        except Exception as e:
+            ok, lines = False, [finding('fail', f"Check crashed: {e}", error=str(e))]
+        results[name] = {'ok': ok, 'details': lines, 'duration_ms': round((time.perf_counter() - started) * 1000, 1)}
+
+    # Daemon threads, so a check stuck on a hung call can't keep the script alive
+    threads = [threading.Thread(target=run, args=check, daemon=True) for check in checks]
+    for thread in threads:
+        thread.start()
+    deadline = time.monotonic() + timeout
+    for thread in threads:
+        thread.join(max(0.0, deadline - time.monotonic()))
+    for name, _ in checks:
+        if name not in results:
+            results[name] = {'ok': False, 'details': [finding('fail', f"Timed out after {timeout}s")],
+                             'duration_ms': timeout * 1000, 'timed_out': True}
+    return {name: results[name] for name, _ in checks}
 
 def provide_solutions():
     """Provide common solutions"""
     print("\n" + "="*50)
     print("🔧 COMMON SOLUTIONS:")
     print("="*50)
-    
+
     print("\n1. Install missing dependencies:")
-    print("   pip3 install --user flask boto3 python-dotenv")
-    
+    print("   pip3 install --user flask boto3 python-dotenv gunicorn prometheus_client")
+
     print("\n2. Create DynamoDB tables:")
     print("   python3 create_dynamodb_tables.py")
-    
+
+    print("\n   Register SES email templates:")
+    print("   python3 email_templates.py")
+
     print("\n3. Open firewall port:")
     print("   sudo firewall-cmd --permanent --add-port=5000/tcp")
     print("   sudo firewall-cmd --reload")
-    
+
     print("\n4. Start the service:")
     print("   sudo systemctl start pickles-app")
     print("   sudo systemctl enable pickles-app")
-    
+    print("   sudo systemctl restart pickles-app  # after deploying new code")
+    print("   sudo systemctl reload pickles-app   # graceful worker restart; config only, code stays preloaded")
+
     print("\n5. Check service logs:")
     print("   sudo journalctl -u pickles-app -f")
-    
+
     print("\n6. Run app manually for debugging:")
     print("   cd /path/to/your/app")
-    print("   python3 home/app.py")
+    print("   python3 home/app.py     # Flask dev server, single process")
+    print("   python3 home/serve.py   # production server (gunicorn)")
 
 def main():
     """Main troubleshooting function"""
-    print("🔍 EC2 Flask App Troubleshooting")
-    print("="*50)
-    
+    parser = argparse.ArgumentParser(description='Diagnose the Flask app deployment on this EC2 instance')
+    parser.add_argument('--json', action='store_true', help='print one JSON report (exit status 1 if a check fails)')
+    parser.add_argument('--timeout', type=float, default=10, help='seconds allowed for all checks (default: 10)')
+    parser.add_argument('--probe', type=int, default=0, metavar='N',
+                        help='also GET /health, /login and static assets N times each and report p50/p99')
+    parser.add_argument('--probe-timeout', type=float, default=30,
+                        help='seconds allowed for the whole latency probe (default: 30)')
+    parser.add_argument('--url', default=f"http://localhost:{os.environ.get('PORT', 5000)}",
+                        help='app base URL for the response test and probe (default: http://localhost:PORT)')
+    args = parser.parse_args()
+    base_url = args.url.rstrip('/')
+
     checks = [
         ("Python Installation", check_python),
         ("Pip Installation", check_pip),
@@ -212,34 +307,68 @@ def main():
         ("AWS Credentials", check_aws_credentials),
         ("DynamoDB Tables", check_dynamodb_tables),
         ("Service Status", check_service_status),
-        ("Application Response", test_application),
+        ("Application Response", lambda: test_application(base_url)),
     ]
-    
-    results = []
-    for name, check_func in checks:
+
+    if not args.json:
+        print("🔍 EC2 Flask App Troubleshooting")
+        print("="*50)
+
+    started = time.perf_counter()
+    results = run_checks(checks, args.timeout)
+    probe = probe_latency(base_url, count=args.probe, budget=args.probe_timeout) if args.probe > 0 else None
+    logs, logs_error = check_logs() if not results["Service Status"]['ok'] else (None, None)
+    failed_checks = [name for name, result in results.items() if not result['ok']]
+
+    if args.json:
+        report = {
+            'passed': not failed_checks,
+            'failed': failed_checks,
+            'duration_ms': round((time.perf_counter() - started) * 1000, 1),
+            'checks': results
+        }
+        if probe is not None:
+            report['probe'] = {'url': base_url, 'paths': probe}
+        if logs is not None:
+            report['logs'] = logs
+        if logs_error is not None:
+            report['logs_error'] = logs_error
+        print(json.dumps(report, indent=2, ensure_ascii=False))
+        sys.exit(1 if failed_checks else 0)
+
+    for name, result in results.items():
         print(f"\n{name}:")
-        result = check_func()
-        results.append((name, result))
-    
+        for item in result['details']:
+            print(render(item))
+
     # Show security group info
     print(f"\nSecurity Group:")
     check_security_group()
-    
+
     # Show logs if service is not working
-    if not any(result for name, result in results if "Service" in name):
-        check_logs()
-    
+    if logs is not None:
+        print("\n📋 Recent logs:")
+        print("\n".join(logs))
+    elif logs_error is not None:
+        print(f"\n❌ Could not retrieve logs: {logs_error}")
+
+    if probe is not None:
+        print(f"\n⏱️  Latency probe ({args.probe} requests per path against {base_url}):")
+        for path, stats in probe.items():
+            print(f"   {path:<28} p50={stats['p50_ms']:.1f} p99={stats['p99_ms']:.1f} max={stats['max_ms']:.1f} ms"
+                  f"  errors={stats['errors']}  statuses={stats['statuses']}"
+                  + (f"  (cut short after {stats['count']} requests)" if stats['timed_out'] else ""))
+
     # Summary
     print("\n" + "="*50)
     print("📊 SUMMARY:")
     print("="*50)
-    
-    for name, result in results:
-        status = "✅ PASS" if result else "❌ FAIL"
-        print(f"{status} {name}")
-    
-    failed_checks = [name for name, result in results if not result]
-    
+
+    for name, result in results.items():
+        status = "✅ PASS" if result['ok'] else "❌ FAIL"
+        print(f"{status} {name} ({result['duration_ms']:.0f} ms)")
+    print(f"\n⏱️  Diagnosis took {time.perf_counter() - started:.1f}s")
+
     if failed_checks:
         print(f"\n⚠️  Failed checks: {len(failed_checks)}")
         provide_solutions()
@@ -247,4 +376,4 @@ def main():
         print("\n🎉 All checks passed! Your app should be working.")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
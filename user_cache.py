@@ -0,0 +1,103 @@
+"""
+Read-through user cache
+In-process LRU + TTL cache for PickleUsers lookups with single-flight loading
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+
+class _Flight:
+    """A lookup in progress that concurrent callers wait on"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.invalidated = False
+
+
+class UserCache:
+    """LRU + TTL cache keyed by email; None results are cached as negative entries"""
+
+    def __init__(self, loader, max_size=1024, ttl=60, negative_ttl=10):
+        self.loader = loader
+        self.max_size = max_size
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self._entries = OrderedDict()
+        self._flights = {}
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'negative_hits': 0, 'misses': 0, 'coalesced': 0, 'evictions': 0}
+
+    def get(self, email, use_negative=True):
+        """Return the user item for email, or None if the user does not exist"""
+        with self._lock:
+            entry = self._entries.get(email)
+            if entry is not None:
+                item, expires = entry
+                if time.monotonic() < expires and (item is not None or use_negative):
+                    self._entries.move_to_end(email)
+                    self._stats['hits' if item is not None else 'negative_hits'] += 1
+                    return item
+            flight = self._flights.get(email)
+            if flight is not None:
+                self._stats['coalesced'] += 1
+                leader = False
+            else:
+                flight = self._flights[email] = _Flight()
+                self._stats['misses'] += 1
+                leader = True
+
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result
+
+        try:
+            flight.result = self.loader(email)
+            if not flight.invalidated:
+                self.put(email, flight.result)
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                self._flights.pop(email, None)
+            flight.done.set()
+        return flight.result
+
+    def put(self, email, item):
+        """Store a user item (or None for a known-missing user)"""
+        ttl = self.ttl if item is not None else self.negative_ttl
+        with self._lock:
+            self._entries[email] = (item, time.monotonic() + ttl)
+            self._entries.move_to_end(email)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self._stats['evictions'] += 1
+
+    def invalidate(self, email):
+        """Drop any cached entry for email"""
+        with self._lock:
+            self._entries.pop(email, None)
+            flight = self._flights.get(email)
+            if flight is not None:
+                # A write raced the lookup; don't cache what it read
+                flight.invalidated = True
+
+    def clear(self):
+        """Drop every cached entry"""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        """Hit/miss counters and current size"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats['size'] = len(self._entries)
+        lookups = stats['hits'] + stats['negative_hits'] + stats['misses'] + stats['coalesced']
+        stats['hit_ratio'] = round((stats['hits'] + stats['negative_hits']) / lookups, 3) if lookups else 0.0
+        return stats